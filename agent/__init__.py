@@ -1,6 +1,132 @@
-from .input_understanding import InputUnderstanding
-from .state_tracker import StateTracker
-from .task_planner import TaskPlanner
-from .output_generator import OutputGenerator
+import importlib
+from typing import TYPE_CHECKING
 
-__all__ = ["InputUnderstanding", "StateTracker", "TaskPlanner", "OutputGenerator"]
+# Where each public name is defined. Submodules are imported on first use, so
+# the pure-Python parts (TaskPlanner, StateTracker, ...) load without the Groq
+# SDK and its HTTP stack, or numpy.
+_EXPORTS = {
+    "get_client": "client",
+    "pool_stats": "client",
+    "HistoryStore": "history_store",
+    "Turn": "history_store",
+    "InputUnderstanding": "input_understanding",
+    "get_input_understanding": "input_understanding",
+    "StateTracker": "state_tracker",
+    "TaskPlanner": "task_planner",
+    "get_task_planner": "task_planner",
+    "OutputGenerator": "output_generator",
+    "get_output_generator": "output_generator",
+    "Backend": "backend_pool",
+    "BackendPool": "backend_pool",
+    "get_backend_pool": "backend_pool",
+    "ModelRouter": "model_router",
+    "get_model_router": "model_router",
+    "Priority": "rate_limiter",
+    "RateLimiter": "rate_limiter",
+    "RateLimitTimeout": "rate_limiter",
+    "get_rate_limiter": "rate_limiter",
+    "rate_limiter_stats": "rate_limiter",
+    "SingleFlight": "singleflight",
+    "get_single_flight": "singleflight",
+    "ResponseCache": "response_cache",
+    "get_response_cache": "response_cache",
+    "SimilarityIndex": "similarity_index",
+    "get_similarity_index": "similarity_index",
+    "Trace": "tracing",
+    "Tracer": "tracing",
+    "get_tracer": "tracing",
+    "TrafficRecorder": "traffic",
+    "get_traffic_recorder": "traffic",
+    "read_traffic": "traffic",
+    "Prefetcher": "prefetcher",
+    "prefetch_stats": "prefetcher",
+    "QuestionBank": "quiz",
+    "Quiz": "quiz",
+    "QuizEngine": "quiz",
+    "get_question_bank": "quiz",
+    "QueryPipeline": "pipeline",
+    "QueryStream": "pipeline",
+    "CancelToken": "cancellation",
+    "QueryCancelled": "cancellation",
+}
+
+if TYPE_CHECKING:
+    from .client import get_client, pool_stats
+    from .history_store import HistoryStore, Turn
+    from .input_understanding import InputUnderstanding, get_input_understanding
+    from .state_tracker import StateTracker
+    from .task_planner import TaskPlanner, get_task_planner
+    from .output_generator import OutputGenerator, get_output_generator
+    from .backend_pool import Backend, BackendPool, get_backend_pool
+    from .model_router import ModelRouter, get_model_router
+    from .rate_limiter import Priority, RateLimiter, RateLimitTimeout, get_rate_limiter, rate_limiter_stats
+    from .singleflight import SingleFlight, get_single_flight
+    from .response_cache import ResponseCache, get_response_cache
+    from .similarity_index import SimilarityIndex, get_similarity_index
+    from .tracing import Trace, Tracer, get_tracer
+    from .traffic import TrafficRecorder, get_traffic_recorder, read_traffic
+    from .prefetcher import Prefetcher, prefetch_stats
+    from .quiz import QuestionBank, Quiz, QuizEngine, get_question_bank
+    from .pipeline import QueryPipeline, QueryStream
+    from .cancellation import CancelToken, QueryCancelled
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    # Later lookups find it directly, without coming back here
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
+
+
+__all__ = [
+    "InputUnderstanding",
+    "get_input_understanding",
+    "StateTracker",
+    "TaskPlanner",
+    "get_task_planner",
+    "OutputGenerator",
+    "get_output_generator",
+    "QueryPipeline",
+    "QueryStream",
+    "CancelToken",
+    "QueryCancelled",
+    "Prefetcher",
+    "prefetch_stats",
+    "QuizEngine",
+    "Quiz",
+    "QuestionBank",
+    "get_question_bank",
+    "ResponseCache",
+    "get_response_cache",
+    "SimilarityIndex",
+    "get_similarity_index",
+    "Backend",
+    "BackendPool",
+    "get_backend_pool",
+    "ModelRouter",
+    "get_model_router",
+    "get_client",
+    "pool_stats",
+    "Priority",
+    "RateLimiter",
+    "RateLimitTimeout",
+    "get_rate_limiter",
+    "rate_limiter_stats",
+    "SingleFlight",
+    "get_single_flight",
+    "HistoryStore",
+    "Turn",
+    "Trace",
+    "Tracer",
+    "get_tracer",
+    "TrafficRecorder",
+    "get_traffic_recorder",
+    "read_traffic",
+]
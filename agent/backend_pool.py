@@ -0,0 +1,393 @@
+import contextvars
+import queue
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional
+
+from groq import Groq
+
+from config import Config
+from .cancellation import CancelToken, QueryCancelled, activate_token, current_token
+from .client import create_chat_completion, get_account_limiter, get_client
+from .rate_limiter import Priority, RateLimitTimeout, rate_limiter_stats
+from .retry import RETRYABLE_ERRORS
+from .tracing import current_trace
+
+
+# Latency samples kept for the hedge threshold and per-backend percentiles
+SAMPLE_WINDOW = 500
+
+# Samples needed before the percentile replaces HEDGE_INITIAL_DELAY
+MIN_SAMPLES = 20
+
+# Weight of the newest sample in a backend's moving-average latency
+LATENCY_ALPHA = 0.2
+
+
+def is_backend_failure(error: BaseException) -> bool:
+    """Whether an error says the backend is unhealthy: network trouble, timeouts, 429s and 5xx responses.
+
+    A request the API rejected (a 400 or a prompt over the context length) would fail anywhere.
+    """
+    return isinstance(error, RETRYABLE_ERRORS)
+
+
+def _percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))] if ordered else 0.0
+
+
+class Backend:
+    """One upstream: a Groq client (API key and base URL) and its health."""
+
+    def __init__(self, name: str, client: Groq, models: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.client = client
+        # Model names differ on OpenAI-compatible local servers
+        self.models = dict(models or {})
+        self.requests = 0
+        self.errors = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.hedges_won = 0
+        self.down_until = 0.0
+        self.latency: Optional[float] = None
+        self.samples: deque = deque(maxlen=SAMPLE_WINDOW)
+
+    @classmethod
+    def from_config(cls, spec: Dict) -> "Backend":
+        client = get_client(spec.get("api_key"), spec.get("base_url"))
+        # A backend's own "rpm"/"tpm" (0 for none, e.g. a local server) replace RATE_LIMIT_RPM/RATE_LIMIT_TPM
+        get_account_limiter(client, spec.get("rpm"), spec.get("tpm"))
+        return cls(spec["name"], client, spec.get("models"))
+
+
+class _Attempt:
+    """One request to one backend, run until its first token (or whole response, if not streamed).
+
+    The rest of a stream is read by whoever wins. An attempt that loses a
+    race closes its stream as soon as its blocking read returns, which makes
+    the upstream stop generating.
+    """
+
+    def __init__(
+        self,
+        pool: "BackendPool",
+        backend: Backend,
+        priority: int,
+        request: Dict,
+        results: queue.Queue,
+        threaded: bool,
+        token: Optional[CancelToken] = None
+    ):
+        self.pool = pool
+        self.token = token
+        self.backend = backend
+        self.priority = priority
+        self.threaded = threaded
+        self.request = {**request, "model": backend.models.get(request.get("model"), request.get("model"))}
+        self.results = results
+        self.result: Any = None
+        self.first: Any = None
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self.abandoned = False
+        self.released = False
+        self.lock = threading.Lock()
+
+    def run(self):
+        start = time.monotonic()
+        try:
+            with activate_token(self.token):
+                self.result = create_chat_completion(self.backend.client, self.priority, **self.request)
+                if self.request.get("stream"):
+                    self.first = next(self.result, None)
+        except Exception as e:
+            self.error = e
+        self.pool._observe(self, time.monotonic() - start)
+        with self.lock:
+            self.done = True
+            abandoned = self.abandoned
+        if abandoned or self.error is not None or not self.request.get("stream"):
+            self.release()
+        self.results.put(self)
+
+    def output(self) -> Any:
+        if not self.request.get("stream"):
+            return self.result
+        return self._chain()
+
+    def abandon(self):
+        with self.lock:
+            self.abandoned = True
+            done = self.done
+        # Still blocked on the backend: `run` closes the stream when the read returns
+        if done:
+            self.release()
+
+    def release(self):
+        with self.lock:
+            if self.released:
+                return
+            self.released = True
+        if self.abandoned and self.request.get("stream") and self.result is not None:
+            self.result.close()
+        self.pool._release(self.backend)
+
+    def _chain(self) -> Iterator[Any]:
+        try:
+            if self.first is not None:
+                yield self.first
+            yield from self.result
+        finally:
+            self.result.close()
+            self.release()
+
+
+class BackendPool:
+    """Spreads chat completions over several backends and hedges slow ones.
+
+    Each request goes to the healthy backend with the lowest moving-average
+    latency, weighted by how many requests it already has in flight. A
+    backend that fails `failure_threshold` times in a row (see
+    `is_backend_failure`) is skipped for `cooldown` seconds, and a request
+    whose backend fails is retried once on another.
+
+    Interactive requests are hedged: if the first token (or, without
+    streaming, the response) hasn't arrived within the `hedge_percentile`
+    latency of recent requests, a duplicate goes to a second backend. The
+    first to answer wins and the other is cancelled. At most `hedge_max_ratio`
+    of requests are hedged, and none while the rate limiter is queueing, since
+    a duplicate would only queue behind it.
+
+    Inside a query with a `CancelToken`, attempts always run on their own
+    threads so the caller can walk away: when the query is stopped, or no
+    first token arrives within its "first_token" budget, every attempt is
+    abandoned (closing its connection) and `QueryCancelled` is raised.
+    """
+
+    def __init__(
+        self,
+        backends: Optional[List[Backend]] = None,
+        hedge: Optional[bool] = None,
+        hedge_percentile: Optional[float] = None,
+        hedge_initial_delay: Optional[float] = None,
+        hedge_min_delay: Optional[float] = None,
+        hedge_max_ratio: Optional[float] = None,
+        failure_threshold: Optional[int] = None,
+        cooldown: Optional[float] = None
+    ):
+        self.backends = backends or [Backend.from_config(spec) for spec in Config.BACKENDS]
+        self.hedge = hedge if hedge is not None else Config.HEDGE_ENABLED
+        self.hedge_percentile = hedge_percentile or Config.HEDGE_PERCENTILE
+        self.hedge_initial_delay = hedge_initial_delay if hedge_initial_delay is not None else Config.HEDGE_INITIAL_DELAY
+        self.hedge_min_delay = hedge_min_delay if hedge_min_delay is not None else Config.HEDGE_MIN_DELAY
+        self.hedge_max_ratio = hedge_max_ratio if hedge_max_ratio is not None else Config.HEDGE_MAX_RATIO
+        self.failure_threshold = failure_threshold or Config.BACKEND_FAILURE_THRESHOLD
+        self.cooldown = cooldown if cooldown is not None else Config.BACKEND_COOLDOWN
+        self._lock = threading.Lock()
+        # Time to first token for streams and time to response otherwise are kept apart
+        self._samples = {True: deque(maxlen=SAMPLE_WINDOW), False: deque(maxlen=SAMPLE_WINDOW)}
+        self._counters = {"requests": 0, "hedges": 0, "hedges_won": 0, "failovers": 0}
+
+    @classmethod
+    def single(cls, client: Groq) -> "BackendPool":
+        """A pool of just `client`: no balancing and no hedging."""
+        return cls([Backend("client", client)], hedge=False)
+
+    def complete(self, priority: int = Priority.INTERACTIVE, **request: Any) -> Any:
+        """Create a chat completion on the best backend, as `create_chat_completion` would.
+
+        Returns the completion, or an iterator of chunks when `stream=True`.
+        """
+        stream = bool(request.get("stream"))
+        results: queue.Queue = queue.Queue()
+        with self._lock:
+            self._counters["requests"] += 1
+        token = current_token()
+        # Until the first token (or, without streaming, the response) arrives
+        wait_token = token.stage("first_token") if token is not None and stream else token
+        # A cancel wakes the wait below instead of waiting for the next tick
+        remove_callback = wait_token.add_callback(lambda: results.put(None)) if wait_token is not None else None
+        attempts: List[_Attempt] = []
+        try:
+            threaded = token is not None or self._can_hedge(priority)
+            attempts.append(self._start(self._pick([]), priority, request, results, threaded, wait_token))
+            can_hedge = threaded and self._can_hedge(priority)
+            hedge_at = time.monotonic() + self.hedge_delay(stream) if can_hedge else None
+            pending = len(attempts)
+            hedged = False
+            error: Optional[BaseException] = None
+            while pending:
+                timeout = None if hedge_at is None else max(0.0, hedge_at - time.monotonic())
+                if wait_token is not None:
+                    tick = wait_token.tick()
+                    timeout = tick if timeout is None else min(timeout, tick)
+                try:
+                    attempt = results.get(timeout=timeout)
+                except queue.Empty:
+                    if hedge_at is None or time.monotonic() < hedge_at:
+                        continue
+                    # The first token is late: race a duplicate on another backend
+                    hedge_at = None
+                    backend = self._pick([a.backend for a in attempts], healthy_only=True)
+                    if backend is not None and self._take_hedge():
+                        attempts.append(self._start(backend, priority, request, results, True, wait_token))
+                        pending += 1
+                        hedged = True
+                    continue
+                if attempt is None:
+                    continue
+                pending -= 1
+                if attempt.error is None:
+                    for other in attempts:
+                        if other is not attempt:
+                            other.abandon()
+                    self._won(attempt, hedged=hedged, hedge_won=hedged and attempt is not attempts[0])
+                    return attempt.output()
+                error = attempt.error
+                if isinstance(error, QueryCancelled):
+                    break
+                if not pending and len(attempts) == 1 and is_backend_failure(error):
+                    # Failed before any hedge: fail over to another backend right away
+                    backend = self._pick([attempt.backend], healthy_only=True)
+                    if backend is not None:
+                        with self._lock:
+                            self._counters["failovers"] += 1
+                        attempts.append(self._start(backend, priority, request, results, threaded, wait_token))
+                        pending += 1
+                        hedge_at = None
+            raise error
+        except BaseException:
+            # Stopped, timed out or interrupted: nobody will read these, so free their connections now
+            for attempt in attempts:
+                attempt.abandon()
+            raise
+        finally:
+            if remove_callback is not None:
+                remove_callback()
+
+    def hedge_delay(self, stream: bool) -> float:
+        """Seconds to wait for the first token before hedging: a recent latency percentile."""
+        with self._lock:
+            samples = list(self._samples[stream])
+        if len(samples) < MIN_SAMPLES:
+            return self.hedge_initial_delay
+        return max(self.hedge_min_delay, _percentile(samples, self.hedge_percentile))
+
+    def stats(self) -> Dict:
+        """Return hedging counters and each backend's health and latency."""
+        now = time.monotonic()
+        with self._lock:
+            stats = dict(self._counters)
+            backends = [
+                {
+                    "name": backend.name,
+                    "healthy": backend.down_until <= now,
+                    "in_flight": backend.in_flight,
+                    "requests": backend.requests,
+                    "errors": backend.errors,
+                    "hedges_won": backend.hedges_won,
+                    "latency_ms_avg": round(backend.latency * 1000, 1) if backend.latency is not None else None,
+                    "latency_ms_p50": round(_percentile(backend.samples, 0.5) * 1000, 1),
+                    "latency_ms_p95": round(_percentile(backend.samples, 0.95) * 1000, 1)
+                }
+                for backend in self.backends
+            ]
+        stats["hedge_rate"] = round(stats["hedges"] / stats["requests"], 3) if stats["requests"] else 0.0
+        stats["hedge_delay_ms"] = round(self.hedge_delay(True) * 1000, 1)
+        stats["backends"] = backends
+        return stats
+
+    def _start(
+        self,
+        backend: Backend,
+        priority: int,
+        request: Dict,
+        results: queue.Queue,
+        threaded: bool,
+        token: Optional[CancelToken] = None
+    ) -> _Attempt:
+        attempt = _Attempt(self, backend, priority, request, results, threaded, token)
+        with self._lock:
+            backend.requests += 1
+            backend.in_flight += 1
+        if threaded:
+            # Copy the context so the attempt's Groq call lands in the caller's trace
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run, args=(attempt.run,), daemon=True, name="hedge").start()
+        else:
+            attempt.run()
+        return attempt
+
+    def _pick(self, exclude: List[Backend], healthy_only: bool = False) -> Optional[Backend]:
+        now = time.monotonic()
+        with self._lock:
+            candidates = [backend for backend in self.backends if backend not in exclude]
+            healthy = [backend for backend in candidates if backend.down_until <= now]
+            if not healthy:
+                if healthy_only or not candidates:
+                    return None
+                # Everything is cooling down; the one that failed longest ago is the best bet
+                return min(candidates, key=lambda backend: backend.down_until)
+            random.shuffle(healthy)
+            return min(healthy, key=lambda backend: (backend.latency or 0.0) * (backend.in_flight + 1))
+
+    def _can_hedge(self, priority: int) -> bool:
+        if not self.hedge or priority != Priority.INTERACTIVE or len(self.backends) < 2:
+            return False
+        return rate_limiter_stats()["queue_depth"] == 0
+
+    def _take_hedge(self) -> bool:
+        with self._lock:
+            # One hedge of burst allowance, then at most `hedge_max_ratio` of requests
+            if self._counters["hedges"] >= self.hedge_max_ratio * self._counters["requests"] + 1:
+                return False
+            self._counters["hedges"] += 1
+            return True
+
+    def _observe(self, attempt: _Attempt, seconds: float):
+        backend = attempt.backend
+        with self._lock:
+            if attempt.error is None:
+                backend.failures = 0
+                backend.samples.append(seconds)
+                backend.latency = seconds if backend.latency is None else (
+                    LATENCY_ALPHA * seconds + (1 - LATENCY_ALPHA) * backend.latency
+                )
+                self._samples[bool(attempt.request.get("stream"))].append(seconds)
+            elif not attempt.abandoned and not isinstance(attempt.error, (RateLimitTimeout, QueryCancelled)):
+                # Waiting for rate-limit capacity, or failing once nobody waits, says nothing about the backend
+                backend.errors += 1
+                if is_backend_failure(attempt.error):
+                    backend.failures += 1
+                    if backend.failures >= self.failure_threshold:
+                        backend.down_until = time.monotonic() + self.cooldown
+
+    def _release(self, backend: Backend):
+        with self._lock:
+            backend.in_flight -= 1
+
+    def _won(self, attempt: _Attempt, hedged: bool, hedge_won: bool):
+        if hedge_won:
+            with self._lock:
+                attempt.backend.hedges_won += 1
+                self._counters["hedges_won"] += 1
+        trace = current_trace()
+        if trace is not None:
+            trace.set(backend=attempt.backend.name, hedged=hedged)
+
+
+_shared_pool: Optional[BackendPool] = None
+_shared_lock = threading.Lock()
+
+
+def get_backend_pool() -> BackendPool:
+    """Return the process-wide backend pool, so backend health is shared by every session."""
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = BackendPool()
+        return _shared_pool
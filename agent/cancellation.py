@@ -0,0 +1,141 @@
+import contextlib
+import contextvars
+import threading
+import time
+from typing import Callable, Iterator, List, Optional
+
+from config import Config
+
+
+# How often a waiting consumer wakes up to look for a cancel or report that it is alive
+TICK_SECONDS = 0.25
+
+
+class QueryCancelled(Exception):
+    """Raised inside a query that was stopped or ran out of its time budget."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Query {reason}")
+        self.reason = reason
+
+
+class CancelToken:
+    """Deadline and stop switch of one query, shared by every thread working on it.
+
+    `timeout` is the query's latency budget in seconds (`None` for no
+    deadline). `stage` gives a stage its configured share of that budget as a
+    child token, which is cancelled along with its parent. Consumers waiting
+    on the query call `tick` between waits; threads working for it sleep with
+    `wait`, which returns as soon as the query is cancelled.
+
+    `on_idle` is called by `tick` on the thread that created the token, so a
+    UI can redraw (and notice a stop button) while nothing is arriving.
+    """
+
+    def __init__(
+        self,
+        timeout: Optional[float] = None,
+        parent: Optional["CancelToken"] = None,
+        on_idle: Optional[Callable[[], None]] = None
+    ):
+        self.started = time.monotonic()
+        self.timeout = timeout
+        self.deadline = self.started + timeout if timeout else None
+        if parent is not None and parent.deadline is not None:
+            self.deadline = parent.deadline if self.deadline is None else min(self.deadline, parent.deadline)
+        self.on_idle = on_idle or (parent.on_idle if parent is not None else None)
+        self.owner = parent.owner if parent is not None else threading.get_ident()
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+        self.budget = parent.budget if parent is not None else timeout
+        if parent is not None:
+            parent.add_callback(lambda: self.cancel(parent.reason or "stopped"))
+
+    @classmethod
+    def for_query(cls, on_idle: Optional[Callable[[], None]] = None) -> "CancelToken":
+        """A token with the configured query budget, `Config.QUERY_TIMEOUT` (0 for none)."""
+        return cls(Config.QUERY_TIMEOUT or None, on_idle=on_idle)
+
+    def stage(self, name: str) -> "CancelToken":
+        """A child token bounded by stage `name`'s share of the query budget, from now."""
+        share = Config.QUERY_STAGE_BUDGETS.get(name)
+        return CancelToken(self.budget * share if self.budget and share else None, parent=self)
+
+    def cancel(self, reason: str = "stopped"):
+        """Stop the query; `reason` is "stopped" or "timeout"."""
+        with self._lock:
+            if self.reason is not None:
+                return
+            self.reason = reason
+            callbacks, self._callbacks = self._callbacks, []
+        self._event.set()
+        for callback in callbacks:
+            callback()
+
+    @property
+    def cancelled(self) -> bool:
+        if self.reason is None and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("timeout")
+        return self.reason is not None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, or `None` without one."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self):
+        """Raise `QueryCancelled` if the query was stopped or is past its deadline."""
+        if self.cancelled:
+            raise QueryCancelled(self.reason)
+
+    def add_callback(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Call `callback` when the query is cancelled (now, if it already is); return a remover."""
+        with self._lock:
+            if self.reason is None:
+                self._callbacks.append(callback)
+                return lambda: self._remove_callback(callback)
+        callback()
+        return lambda: None
+
+    def tick(self) -> float:
+        """Check for cancellation and report the query alive; return how long to wait until the next tick."""
+        self.check()
+        if self.on_idle is not None and threading.get_ident() == self.owner:
+            self.on_idle()
+            self.check()
+        remaining = self.remaining()
+        return TICK_SECONDS if remaining is None else min(TICK_SECONDS, remaining)
+
+    def wait(self, seconds: float) -> bool:
+        """Sleep up to `seconds`, waking early if the query is cancelled; return whether it was."""
+        remaining = self.remaining()
+        if remaining is not None:
+            seconds = min(seconds, remaining)
+        self._event.wait(max(0.0, seconds))
+        return self.cancelled
+
+    def _remove_callback(self, callback: Callable[[], None]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+_current_token: contextvars.ContextVar = contextvars.ContextVar("cancel_token", default=None)
+
+
+@contextlib.contextmanager
+def activate_token(token: Optional[CancelToken]) -> Iterator[Optional[CancelToken]]:
+    """Make `token` bound every upstream call made in this context."""
+    previous = _current_token.get()
+    _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.set(previous)
+
+
+def current_token() -> Optional[CancelToken]:
+    return _current_token.get()
@@ -0,0 +1,218 @@
+import hashlib
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+import httpx
+import groq
+from groq import Groq
+
+from config import Config
+from .cancellation import current_token
+from .context_builder import MESSAGE_OVERHEAD, estimate_tokens
+from .rate_limiter import DEFAULT_ACCOUNT, Priority, RateLimiter, get_rate_limiter
+from .retry import call_with_retry
+from .tracing import get_tracer
+
+
+class _CountingTransport(httpx.HTTPTransport):
+    """HTTP transport that counts requests waiting for response headers."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        with self.lock:
+            self.requests += 1
+            self.in_flight += 1
+        try:
+            return super().handle_request(request)
+        except Exception:
+            with self.lock:
+                self.errors += 1
+            raise
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+class _PooledClient:
+    """A Groq client over a keep-alive HTTP connection pool."""
+
+    def __init__(self, api_key: Optional[str], base_url: Optional[str]):
+        # Names the upstream account in rate-limiter stats without revealing its key
+        digest = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:8]
+        self.account = f"{base_url or 'groq'} key-{digest}"
+        self.transport = _CountingTransport(
+            limits=httpx.Limits(
+                max_connections=Config.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=Config.HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=Config.HTTP_KEEPALIVE_EXPIRY
+            )
+        )
+        self.http_client = httpx.Client(transport=self.transport, timeout=Config.HTTP_TIMEOUT)
+        # Retries are handled by `create_chat_completion`, which also knows about the rate limiter
+        self.groq = Groq(api_key=api_key, base_url=base_url, http_client=self.http_client, max_retries=0)
+
+    def stats(self) -> Dict:
+        connections = list(self.transport._pool.connections)
+        idle = sum(1 for connection in connections if connection.is_idle())
+        with self.transport.lock:
+            requests, errors, in_flight = self.transport.requests, self.transport.errors, self.transport.in_flight
+        return {
+            "requests": requests,
+            "errors": errors,
+            "in_flight": in_flight,
+            "connections": len(connections),
+            "idle_connections": idle,
+            "active_connections": len(connections) - idle
+        }
+
+
+_clients: Dict[Tuple[Optional[str], Optional[str]], _PooledClient] = {}
+_accounts: Dict[int, str] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key: Optional[str] = None, base_url: Optional[str] = None) -> Groq:
+    """Return the process-wide Groq client for an API key and base URL.
+
+    Every caller with the same key and URL shares one connection pool, so
+    sessions reuse warm keep-alive connections instead of opening their own.
+    """
+    key = (api_key or Config.GROQ_API_KEY, base_url or Config.GROQ_BASE_URL)
+    with _clients_lock:
+        pooled = _clients.get(key)
+        if pooled is None:
+            pooled = _clients[key] = _PooledClient(*key)
+            _accounts[id(pooled.groq)] = pooled.account
+        return pooled.groq
+
+
+def get_account_limiter(client: Groq, rpm: Optional[int] = None, tpm: Optional[int] = None) -> RateLimiter:
+    """Return the rate limiter of the account (API key and base URL) a shared client sends requests to.
+
+    Clients not made by `get_client` share the default limiter.
+    """
+    with _clients_lock:
+        account = _accounts.get(id(client), DEFAULT_ACCOUNT)
+    return get_rate_limiter(account, rpm, tpm)
+
+
+def pool_stats() -> Dict:
+    """Return connection pool statistics summed over every shared client."""
+    with _clients_lock:
+        pooled_clients = list(_clients.values())
+    totals = {
+        "clients": len(pooled_clients),
+        "max_connections": Config.HTTP_MAX_CONNECTIONS * len(pooled_clients),
+        "requests": 0,
+        "errors": 0,
+        "in_flight": 0,
+        "connections": 0,
+        "idle_connections": 0,
+        "active_connections": 0
+    }
+    for pooled in pooled_clients:
+        for name, value in pooled.stats().items():
+            totals[name] += value
+    return totals
+
+
+def estimate_request_tokens(request: Dict) -> int:
+    """Tokens a chat completion request may use: the prompt plus the completion cap."""
+    prompt = sum(estimate_tokens(str(message.get("content", ""))) + MESSAGE_OVERHEAD for message in request["messages"])
+    return prompt + request.get("max_tokens", Config.MAX_TOKENS)
+
+
+def create_chat_completion(
+    client: Groq,
+    priority: int = Priority.INTERACTIVE,
+    deadline: Optional[float] = None,
+    **request: Any
+) -> Any:
+    """Create a chat completion through its account's rate limiter, retrying transient errors.
+
+    Returns the parsed completion, or an iterator of chunks when
+    `stream=True`. `deadline` is a `time.monotonic()` timestamp bounding
+    queueing and retries; it defaults to `Config.REQUEST_QUEUE_TIMEOUT`
+    from now. Inside a query with a `CancelToken`, its deadline also bounds
+    each HTTP request, and a stopped query gives up between attempts.
+    """
+    started = time.monotonic()
+    limiter = get_account_limiter(client)
+    reserved = estimate_request_tokens(request)
+    token = current_token()
+    if deadline is None:
+        deadline = time.monotonic() + Config.REQUEST_QUEUE_TIMEOUT
+    if token is not None and token.deadline is not None:
+        deadline = min(deadline, token.deadline)
+    # Queueing time and retries over every attempt, for the active trace
+    accounting = {"queue_seconds": 0.0, "retries": 0}
+
+    def attempt():
+        check = token.check if token is not None else None
+        accounting["queue_seconds"] += limiter.acquire(reserved, priority, deadline, check=check)
+        try:
+            if check is not None:
+                check()
+            # The connection is given up once the query's time runs out, not after HTTP_TIMEOUT
+            timeout = token.remaining() if token is not None else None
+            options = {"timeout": max(timeout, 0.01)} if timeout is not None else {}
+            raw = client.chat.completions.with_raw_response.create(**request, **options)
+        except Exception:
+            # The provider didn't count a failed request, so don't either
+            limiter.settle(reserved, 0)
+            raise
+        limiter.update_from_headers(raw.headers)
+        return raw.parse()
+
+    def on_retry(error: Exception, delay: float):
+        accounting["retries"] += 1
+        limiter.record_retry()
+        response = getattr(error, "response", None)
+        if response is not None:
+            limiter.update_from_headers(response.headers)
+        if isinstance(error, groq.RateLimitError):
+            limiter.pause(delay)
+
+    def settle(usage: Any):
+        limiter.settle(reserved, getattr(usage, "total_tokens", None))
+        get_tracer().record_call(
+            getattr(usage, "prompt_tokens", None),
+            getattr(usage, "completion_tokens", None),
+            accounting["queue_seconds"],
+            accounting["retries"],
+            # Streams settle after their last chunk, so this is the whole generation
+            time.monotonic() - started
+        )
+
+    sleep = token.wait if token is not None else time.sleep
+    result = call_with_retry(attempt, deadline=deadline, on_retry=on_retry, sleep=sleep)
+    if request.get("stream"):
+        return _settle_stream(result, settle)
+    settle(completion_usage(result))
+    return result
+
+
+def _settle_stream(stream: Any, settle: Callable[[Any], None]) -> Iterator[Any]:
+    usage = None
+    try:
+        for chunk in stream:
+            usage = completion_usage(chunk) or usage
+            yield chunk
+    finally:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+        settle(usage)
+
+
+def completion_usage(completion: Any) -> Any:
+    """Return the usage of a completion or stream chunk, if it carries any."""
+    # Streams report usage on the last chunk, under x_groq
+    return getattr(completion, "usage", None) or getattr(getattr(completion, "x_groq", None), "usage", None)
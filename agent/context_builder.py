@@ -0,0 +1,109 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+
+
+_PIECES = re.compile(r"\w+|[^\w\s]")
+
+# Chat formatting adds a few tokens around every message
+MESSAGE_OVERHEAD = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a text without a tokenizer.
+
+    Words count as one token per six characters (rounded up) and every
+    punctuation mark as one token, which tracks BPE tokenizers closely
+    enough for budgeting English prompts.
+    """
+    tokens = 0
+    for piece in _PIECES.findall(text):
+        tokens += 1 + (len(piece) - 1) // 6
+    return tokens
+
+
+def clip_to_tokens(text: str, max_tokens: int) -> str:
+    """Shorten a text to roughly `max_tokens` tokens, marking the cut."""
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    keep = int(len(text) * max_tokens / tokens)
+    return text[:keep].rstrip() + " …"
+
+
+class ContextBuilder:
+    """Assembles chat messages for a request within a fixed prompt token budget.
+
+    The system prompt and the current request are always sent. The rolling
+    summary of older turns comes next, then the recent turns, each within an
+    equal share of what is left; responses over their share are clipped.
+    """
+
+    def __init__(self, budget: Optional[int] = None, summary_budget: Optional[int] = None):
+        self.budget = budget or Config.CONTEXT_TOKEN_BUDGET
+        self.summary_budget = summary_budget or Config.CONTEXT_SUMMARY_TOKENS
+
+    def build(
+        self,
+        system_prompt: str,
+        request: str,
+        context: Optional[List] = None,
+        summary: Optional[str] = None
+    ) -> Tuple[List[Dict], Dict]:
+        """Return the messages to send and a report of where the tokens went."""
+        system_tokens = estimate_tokens(system_prompt) + MESSAGE_OVERHEAD
+        request_tokens = estimate_tokens(request) + MESSAGE_OVERHEAD
+        remaining = self.budget - system_tokens - request_tokens
+
+        summary_message = None
+        summary_tokens = 0
+        if summary and remaining > MESSAGE_OVERHEAD:
+            summary_text = clip_to_tokens(summary, min(self.summary_budget, remaining - MESSAGE_OVERHEAD))
+            if summary_text:
+                summary_message = {"role": "system", "content": f"Earlier in this session:\n{summary_text}"}
+                summary_tokens = estimate_tokens(summary_message["content"]) + MESSAGE_OVERHEAD
+                remaining -= summary_tokens
+
+        turns: List[Tuple[str, str]] = []
+        turn_tokens = 0
+        clipped = 0
+        entries = list(reversed(context or []))
+        for i, entry in enumerate(entries):
+            # Each remaining turn gets an equal share; whatever a turn leaves unused goes to older ones
+            share = remaining // (len(entries) - i)
+            user_input, response = entry.user_input, entry.response
+            user_cost = estimate_tokens(user_input) + MESSAGE_OVERHEAD
+            response_cost = estimate_tokens(response) + MESSAGE_OVERHEAD
+            if user_cost + response_cost > share:
+                room = share - user_cost - MESSAGE_OVERHEAD
+                if room < Config.CONTEXT_MIN_CLIP_TOKENS:
+                    break
+                response = clip_to_tokens(response, room)
+                response_cost = estimate_tokens(response) + MESSAGE_OVERHEAD
+                clipped += 1
+            turns.append((user_input, response))
+            remaining -= user_cost + response_cost
+            turn_tokens += user_cost + response_cost
+
+        messages: List[Dict] = [{"role": "system", "content": system_prompt}]
+        if summary_message:
+            messages.append(summary_message)
+        for user_input, response in reversed(turns):
+            messages.append({"role": "user", "content": user_input})
+            messages.append({"role": "assistant", "content": response})
+        messages.append({"role": "user", "content": request})
+
+        report = {
+            "budget": self.budget,
+            "prompt_tokens": system_tokens + summary_tokens + turn_tokens + request_tokens,
+            "system_tokens": system_tokens,
+            "summary_tokens": summary_tokens,
+            "context_tokens": turn_tokens,
+            "request_tokens": request_tokens,
+            "turns_sent": len(turns),
+            "turns_clipped": clipped
+        }
+        return messages, report
@@ -0,0 +1,178 @@
+import json
+import os
+import struct
+import tempfile
+import threading
+import uuid
+import weakref
+import zlib
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from config import Config
+
+
+class Turn:
+    """One interaction in a session, stored compactly."""
+
+    __slots__ = ("timestamp", "user_input", "response", "intent", "topic", "difficulty", "source")
+
+    def __init__(
+        self,
+        user_input: str,
+        response: str,
+        timestamp: float,
+        intent: Optional[str] = None,
+        topic: Optional[str] = None,
+        difficulty: Optional[str] = None,
+        source: Optional[str] = None
+    ):
+        self.timestamp = timestamp
+        self.user_input = user_input
+        self.response = response
+        self.intent = intent
+        self.topic = topic
+        self.difficulty = difficulty
+        self.source = source
+
+    def set_parsed(self, parsed: Optional[Dict]):
+        """Keep the structured fields of a `parse_input` result, not the raw text it repeats."""
+        if not parsed:
+            return
+        self.intent = parsed.get("intent", self.intent)
+        self.topic = parsed.get("topic", self.topic)
+        self.difficulty = parsed.get("difficulty", self.difficulty)
+        self.source = parsed.get("source", self.source)
+
+    def to_dict(self) -> Dict:
+        return {
+            "timestamp": datetime.fromtimestamp(self.timestamp).isoformat(),
+            "user_input": self.user_input,
+            "response": self.response,
+            "intent": self.intent,
+            "topic": self.topic,
+            "difficulty": self.difficulty,
+            "source": self.source
+        }
+
+    def to_row(self) -> List:
+        return [self.timestamp, self.user_input, self.response, self.intent, self.topic, self.difficulty, self.source]
+
+    @classmethod
+    def from_row(cls, row: List) -> "Turn":
+        timestamp, user_input, response, intent, topic, difficulty, source = row
+        return cls(user_input, response, timestamp, intent, topic, difficulty, source)
+
+
+_HEADER = struct.Struct(">II")  # compressed length, number of turns
+
+
+class HistoryStore:
+    """Append-only file of zlib-compressed blocks of turns.
+
+    Turns are written in batches so each block compresses well. Only block
+    offsets stay in memory; blocks are read back lazily on iteration.
+    """
+
+    def __init__(self, path: Optional[str] = None, batch_size: Optional[int] = None):
+        if path is None:
+            directory = Config.HISTORY_SPILL_DIR or os.path.join(tempfile.gettempdir(), "study-buddy-history")
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{uuid.uuid4().hex}.bin")
+        self.path = path
+        self.batch_size = batch_size or Config.HISTORY_SPILL_BATCH
+        self.pending: List[Turn] = []
+        self.blocks: List[int] = []
+        self.block_turns: List[int] = []
+        self.count = 0
+        self.bytes_written = 0
+        self._lock = threading.Lock()
+        self._finalizer = weakref.finalize(self, _remove_file, path)
+
+    def append(self, turn: Turn):
+        """Queue a turn for spilling; a block is written once a batch is full."""
+        with self._lock:
+            self.pending.append(turn)
+            self.count += 1
+            if len(self.pending) >= self.batch_size:
+                self._flush()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[Turn]:
+        """Yield every stored turn, oldest first, reading one block at a time."""
+        return self.slice(0, None)
+
+    def slice(self, start: int, stop: Optional[int]) -> Iterator[Turn]:
+        """Yield turns `start` to `stop` (exclusive), oldest first, reading only the blocks that hold them."""
+        with self._lock:
+            blocks = list(zip(self.blocks, self.block_turns))
+            pending = list(self.pending)
+            stop = self.count if stop is None else min(stop, self.count)
+        position = 0
+        for offset, turns in blocks:
+            if position >= stop:
+                return
+            if position + turns > start:
+                for row in self._read_block(offset)[max(0, start - position):stop - position]:
+                    yield Turn.from_row(row)
+            position += turns
+        yield from pending[max(0, start - position):max(0, stop - position)]
+
+    def turns_at(self, positions: List[int]) -> List[Turn]:
+        """Return the turns at ascending `positions`, reading each block that holds any of them once."""
+        with self._lock:
+            blocks = list(zip(self.blocks, self.block_turns))
+            pending = list(self.pending)
+            count = self.count
+        turns = []
+        index = 0
+        position = 0
+        for offset, size in blocks:
+            wanted = []
+            while index < len(positions) and positions[index] < position + size:
+                wanted.append(positions[index] - position)
+                index += 1
+            if wanted:
+                rows = self._read_block(offset)
+                turns.extend(Turn.from_row(rows[i]) for i in wanted)
+            position += size
+        while index < len(positions) and positions[index] < count:
+            turns.append(pending[positions[index] - position])
+            index += 1
+        return turns
+
+    def close(self):
+        """Delete the backing file."""
+        with self._lock:
+            self.pending = []
+            self.blocks = []
+            self.block_turns = []
+            self.count = 0
+        self._finalizer()
+
+    def _read_block(self, offset: int) -> List:
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            size, _ = _HEADER.unpack(f.read(_HEADER.size))
+            return json.loads(zlib.decompress(f.read(size)).decode("utf-8"))
+
+    def _flush(self):
+        rows = [turn.to_row() for turn in self.pending]
+        data = zlib.compress(json.dumps(rows, ensure_ascii=False).encode("utf-8"), Config.HISTORY_COMPRESSION_LEVEL)
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            f.write(_HEADER.pack(len(data), len(rows)))
+            f.write(data)
+        self.blocks.append(offset)
+        self.block_turns.append(len(rows))
+        self.bytes_written += _HEADER.size + len(data)
+        self.pending = []
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -1,13 +1,42 @@
+import json
+import re
+import threading
+from typing import Optional
+
 from groq import Groq
 from config import Config
+from .client import create_chat_completion, get_client
+from .query_parser import LocalQueryParser
+from .rate_limiter import Priority
+from .singleflight import SingleFlight, get_single_flight, request_fingerprint
 
 
 class InputUnderstanding:
-    def __init__(self):
-        self.client = Groq(api_key=Config.GROQ_API_KEY)
+    def __init__(self, client: Optional[Groq] = None, flights: Optional[SingleFlight] = None):
+        self.client = client or get_client()
+        self.flights = flights or get_single_flight()
+        self.parser = LocalQueryParser()
+    
+    def parse_input(self, user_input: str, priority: int = Priority.INTERACTIVE) -> dict:
+        """Parse user input to extract intent and entities.
+        
+        The local parser handles most queries; the LLM is only asked when its
+        confidence is below `Config.PARSER_CONFIDENCE_THRESHOLD`.
+        """
+        local = self.parser.parse(user_input)
+        if local["confidence"] >= Config.PARSER_CONFIDENCE_THRESHOLD:
+            return {
+                "raw_input": user_input,
+                "parsed": json.dumps(local),
+                "source": "local",
+                **local
+            }
+        return self.parse_with_llm(user_input, fallback=local, priority=priority)
     
-    def parse_input(self, user_input: str) -> dict:
-        """Parse user input to extract intent and entities."""
+    def parse_with_llm(
+        self, user_input: str, fallback: Optional[dict] = None, priority: int = Priority.INTERACTIVE
+    ) -> dict:
+        """Parse user input with an LLM call."""
         prompt = f"""Analyze the following study-related query and extract:
 1. intent (e.g., explain, summarize, quiz, define, compare)
 2. topic (the main subject)
@@ -18,33 +47,59 @@ User query: {user_input}
 
 Respond in JSON format only."""
 
-        response = self.client.chat.completions.create(
-            model=Config.MODEL_NAME,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=500,
-            temperature=0.3
+        request = {
+            "model": Config.MODEL_NAME,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": 500,
+            "temperature": 0.3
+        }
+        response = self.flights.do(
+            request_fingerprint(**request), lambda: create_chat_completion(self.client, priority, **request)
         )
         
+        content = response.choices[0].message.content or ""
+        result = dict(fallback or self.parser.parse(user_input))
+        result.update(self._extract_fields(content))
         return {
             "raw_input": user_input,
-            "parsed": response.choices[0].message.content
+            "parsed": content,
+            "source": "llm",
+            **result
         }
     
+    @staticmethod
+    def _extract_fields(content: str) -> dict:
+        """Pull intent, topic and difficulty out of the LLM's JSON answer, if it is valid."""
+        match = re.search(r"\{.*\}", content, re.DOTALL)
+        try:
+            data = json.loads(match.group(0)) if match else {}
+        except json.JSONDecodeError:
+            return {}
+        if not isinstance(data, dict):
+            return {}
+        
+        fields = {}
+        if isinstance(data.get("intent"), str):
+            fields["intent"] = data["intent"].lower()
+        if isinstance(data.get("topic"), str):
+            fields["topic"] = data["topic"]
+        if data.get("difficulty_level") in ["beginner", "intermediate", "advanced"]:
+            fields["difficulty"] = data["difficulty_level"]
+        return fields
+    
     def classify_intent(self, user_input: str) -> str:
         """Classify the primary intent of the user."""
-        intents = ["explain", "summarize", "quiz", "define", "compare", "practice", "general"]
-        
-        input_lower = user_input.lower()
-        if "explain" in input_lower or "how" in input_lower:
-            return "explain"
-        elif "summarize" in input_lower or "summary" in input_lower:
-            return "summarize"
-        elif "quiz" in input_lower or "test" in input_lower:
-            return "quiz"
-        elif "define" in input_lower or "what is" in input_lower:
-            return "define"
-        elif "compare" in input_lower or "difference" in input_lower:
-            return "compare"
-        elif "practice" in input_lower or "exercise" in input_lower:
-            return "practice"
-        return "general"
+        return self.parser.classify_intent(user_input)
+
+
+_shared_handler: Optional[InputUnderstanding] = None
+_shared_lock = threading.Lock()
+
+
+def get_input_understanding() -> InputUnderstanding:
+    """Return the process-wide input handler over the shared client; it keeps no per-session state."""
+    global _shared_handler
+    with _shared_lock:
+        if _shared_handler is None:
+            _shared_handler = InputUnderstanding()
+        return _shared_handler
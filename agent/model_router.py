@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import Config
+from .cancellation import current_token
+from .retry import RETRYABLE_ERRORS
+
+
+# Weight of the newest call in a tier's running latency-to-target ratio
+SLOWNESS_ALPHA = 0.3
+
+# Latencies kept per route for percentiles
+LATENCY_WINDOW = 200
+
+
+def is_tier_failure(error: BaseException) -> bool:
+    """Whether a failed call says its model is unhealthy: throttled, unreachable or failing server-side.
+
+    A rejected request (400, 404, ...) is the request's fault, and a call cut
+    short because its query was stopped or ran out of time says nothing
+    about the model.
+    """
+    token = current_token()
+    if token is not None and token.cancelled:
+        return False
+    return isinstance(error, RETRYABLE_ERRORS)
+
+
+class ModelRouter:
+    """Chooses the model for each plan and falls back when a tier misbehaves.
+
+    Plans name a model tier (`TaskPlanner` takes it from `Config.MODEL_ROUTES`).
+    A tier is taken out of rotation for `cooldown` seconds when a call to it
+    fails after its retries with an error that says the model is unhealthy
+    (see `is_tier_failure`), or when its calls run, on a moving average, more
+    than `slow_ratio` times over their plans' latency targets. Plans for a
+    tier out of rotation go to the other tier; once the cooldown passes the
+    tier gets traffic again.
+
+    Latency and token spend are recorded per route, a (task type, tier) pair,
+    so the routing table can be tuned from real traffic.
+    """
+
+    def __init__(
+        self,
+        tiers: Optional[Dict[str, str]] = None,
+        slow_ratio: Optional[float] = None,
+        cooldown: Optional[float] = None,
+        fallback: Optional[bool] = None
+    ):
+        self.tiers = dict(tiers or Config.MODEL_TIERS)
+        self.slow_ratio = slow_ratio or Config.MODEL_SLOW_RATIO
+        self.cooldown = cooldown if cooldown is not None else Config.MODEL_FALLBACK_COOLDOWN
+        self.fallback = fallback if fallback is not None else Config.MODEL_FALLBACK
+        self._lock = threading.Lock()
+        self._slowness = {tier: 0.0 for tier in self.tiers}
+        self._down_until = {tier: 0.0 for tier in self.tiers}
+        self._routes: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    def preferred(self, plan: Dict) -> str:
+        """The tier a plan asks for (the first tier if it names none or an unknown one)."""
+        tier = plan.get("model_tier")
+        return tier if tier in self.tiers else next(iter(self.tiers))
+
+    def choose(self, plan: Dict) -> List[str]:
+        """Return the tiers to try for a plan, in order: the planned tier, or a healthy fallback first."""
+        preferred = self.preferred(plan)
+        if not self.fallback:
+            return [preferred]
+        now = time.monotonic()
+        with self._lock:
+            healthy = [tier for tier in self.tiers if self._down_until[tier] <= now]
+        others = [tier for tier in healthy if tier != preferred]
+        if preferred in healthy or not others:
+            return [preferred] + others[:1]
+        return [others[0], preferred]
+
+    def model(self, tier: str) -> str:
+        return self.tiers[tier]
+
+    def record(
+        self,
+        plan: Dict,
+        tier: str,
+        seconds: float,
+        usage: Any = None,
+        error: Optional[BaseException] = None,
+        fallback: bool = False
+    ):
+        """Record one call on a route and update the tier's health."""
+        now = time.monotonic()
+        with self._lock:
+            route = self._route(plan["task_type"], tier)
+            route["calls"] += 1
+            route["fallbacks"] += int(fallback)
+            if error is not None:
+                route["errors"] += 1
+                if is_tier_failure(error):
+                    self._down_until[tier] = now + self.cooldown
+                return
+            route["latencies"].append(seconds)
+            route["prompt_tokens"] += getattr(usage, "prompt_tokens", None) or 0
+            route["completion_tokens"] += getattr(usage, "completion_tokens", None) or 0
+
+            target = plan.get("latency_target")
+            if target:
+                ratio = seconds / target
+                slowness = self._slowness[tier] = SLOWNESS_ALPHA * ratio + (1 - SLOWNESS_ALPHA) * self._slowness[tier]
+                if slowness > self.slow_ratio:
+                    # Start afresh after the cooldown, so one slow spell isn't held against the tier forever
+                    self._down_until[tier] = now + self.cooldown
+                    self._slowness[tier] = 0.0
+                    route["slow_trips"] += 1
+
+    def stats(self) -> Dict:
+        """Return per-route latency and token spend, and which tiers are out of rotation."""
+        now = time.monotonic()
+        with self._lock:
+            routes = []
+            for (task_type, tier), route in sorted(self._routes.items()):
+                latencies = sorted(route["latencies"])
+                successes = route["calls"] - route["errors"]
+                routes.append({
+                    "task_type": task_type,
+                    "tier": tier,
+                    "model": self.tiers[tier],
+                    "calls": route["calls"],
+                    "errors": route["errors"],
+                    "fallbacks": route["fallbacks"],
+                    "slow_trips": route["slow_trips"],
+                    "latency_ms_p50": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else 0.0,
+                    "latency_ms_p95": round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else 0.0,
+                    "prompt_tokens": route["prompt_tokens"],
+                    "completion_tokens": route["completion_tokens"],
+                    "completion_tokens_avg": round(route["completion_tokens"] / successes, 1) if successes else 0.0
+                })
+            tiers = {
+                tier: {
+                    "model": model,
+                    "available": self._down_until[tier] <= now,
+                    "slowness": round(self._slowness[tier], 2)
+                }
+                for tier, model in self.tiers.items()
+            }
+        return {"routes": routes, "tiers": tiers}
+
+    def _route(self, task_type: str, tier: str) -> Dict[str, Any]:
+        route = self._routes.get((task_type, tier))
+        if route is None:
+            route = self._routes[(task_type, tier)] = {
+                "calls": 0,
+                "errors": 0,
+                "fallbacks": 0,
+                "slow_trips": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "latencies": deque(maxlen=LATENCY_WINDOW)
+            }
+        return route
+
+
+_shared_router: Optional[ModelRouter] = None
+_shared_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    """Return the process-wide model router, so tier health is shared by every session."""
+    global _shared_router
+    with _shared_lock:
+        if _shared_router is None:
+            _shared_router = ModelRouter()
+        return _shared_router
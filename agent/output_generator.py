@@ -1,12 +1,45 @@
+import functools
+import re
+import threading
+import time
+
+import groq
 from groq import Groq
 from groq.types.chat import ChatCompletionMessageParam
 from config import Config
-from typing import Dict, List, Optional, cast
+from .backend_pool import BackendPool, get_backend_pool
+from .client import completion_usage
+from .context_builder import ContextBuilder
+from .model_router import ModelRouter, get_model_router
+from .response_cache import ResponseCache, get_response_cache
+from .rate_limiter import Priority
+from .similarity_index import SimilarityIndex, get_similarity_index
+from .singleflight import SingleFlight, get_single_flight, request_fingerprint
+from .tracing import current_trace
+from typing import Dict, Iterator, List, Optional, Tuple, cast
+
+
+# Topics that point back into the conversation ("explain it again") mean different things in every session
+_REFERENTIAL = re.compile(r"\b(it|this|that|these|those|they|them|again)\b", re.IGNORECASE)
 
 
 class OutputGenerator:
-    def __init__(self):
-        self.client = Groq(api_key=Config.GROQ_API_KEY)
+    def __init__(
+        self,
+        client: Optional[Groq] = None,
+        cache: Optional[ResponseCache] = None,
+        flights: Optional[SingleFlight] = None,
+        index: Optional[SimilarityIndex] = None,
+        router: Optional[ModelRouter] = None,
+        backends: Optional[BackendPool] = None
+    ):
+        # An explicit client pins every request to it; otherwise requests are spread over the configured backends
+        self.backends = backends or (BackendPool.single(client) if client is not None else get_backend_pool())
+        self.cache = cache or get_response_cache()
+        self.flights = flights or get_single_flight()
+        self.index = index or get_similarity_index()
+        self.router = router or get_model_router()
+        self.context_builder = ContextBuilder()
         self.system_prompt = """You are an AI Study Buddy, a helpful and encouraging educational assistant. 
 Your goal is to help students learn effectively by:
 - Explaining concepts clearly and concisely
@@ -17,30 +50,188 @@ Your goal is to help students learn effectively by:
 
 Always be accurate, helpful, and engaging."""
 
-    def generate_response(self, plan: Dict, context: Optional[List] = None) -> str:
+    def generate_response(
+        self,
+        plan: Dict,
+        context: Optional[List] = None,
+        summary: Optional[str] = None,
+        priority: int = Priority.INTERACTIVE
+    ) -> str:
         """Generate a response based on the task plan."""
-        messages: List[ChatCompletionMessageParam] = [{"role": "system", "content": self.system_prompt}]
+        messages = self._build_messages(plan, context, summary)
+        request = self._request(plan, messages)
+        cache_key = self._cache_key(plan, request)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self._answered_from("cache")
+                return cached
+        similar_key = self._similar_key(plan)
+        if similar_key:
+            similar = self.index.lookup(*similar_key)
+            if similar is not None:
+                self._answered_from("similar")
+                return similar
         
-        # Add conversation context if available
-        if context:
-            for entry in context[-3:]:  # Last 3 interactions
-                messages.append({"role": "user", "content": entry.get("user_input", "")})
-                messages.append({"role": "assistant", "content": entry.get("response", "")})
+        self._answered_from("llm")
+        preferred = self.router.preferred(plan)
+        tiers = self.router.choose(plan)
+        for attempt, tier in enumerate(tiers):
+            routed = self._route(request, tier, fallback=tier != preferred)
+            usage: Dict = {}
+            start = time.monotonic()
+            try:
+                # Identical requests already in flight (e.g. a whole class asking the same thing) share one call
+                response = self.flights.do(
+                    request_fingerprint(**routed), functools.partial(self._create, routed, priority, usage)
+                )
+            except groq.APIError as e:
+                self.router.record(plan, tier, time.monotonic() - start, error=e, fallback=tier != preferred)
+                if attempt == len(tiers) - 1:
+                    raise
+                continue
+            self.router.record(plan, tier, time.monotonic() - start, usage.get("usage"), fallback=tier != preferred)
+            break
         
-        # Add the current request
-        messages.append({"role": "user", "content": plan["prompt_template"]})
+        content = response.choices[0].message.content or ""
+        if tier == preferred:
+            # A fallback model's answer isn't stored under the planned model's key
+            self._store(cache_key, similar_key, content)
+        return content
+    
+    def stream_response(
+        self,
+        plan: Dict,
+        context: Optional[List] = None,
+        summary: Optional[str] = None,
+        priority: int = Priority.INTERACTIVE
+    ) -> Iterator[str]:
+        """Generate a response based on the task plan, yielding text deltas as they arrive."""
+        messages = self._build_messages(plan, context, summary)
+        request = self._request(plan, messages)
+        cache_key = self._cache_key(plan, request)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self._answered_from("cache")
+                yield cached
+                return
+        similar_key = self._similar_key(plan)
+        if similar_key:
+            similar = self.index.lookup(*similar_key)
+            if similar is not None:
+                self._answered_from("similar")
+                yield similar
+                return
         
-        response = self.client.chat.completions.create(
-            model=Config.MODEL_NAME,
-            messages=messages,
-            max_tokens=Config.MAX_TOKENS,
-            temperature=Config.TEMPERATURE
-        )
+        self._answered_from("llm")
+        pieces = []
+        preferred = self.router.preferred(plan)
+        tiers = self.router.choose(plan)
+        for attempt, tier in enumerate(tiers):
+            routed = self._route(request, tier, fallback=tier != preferred)
+            usage: Dict = {}
+            start = time.monotonic()
+            try:
+                for delta in self.flights.stream(
+                    request_fingerprint(stream=True, **routed), functools.partial(self._deltas, routed, priority, usage)
+                ):
+                    pieces.append(delta)
+                    yield delta
+            except groq.APIError as e:
+                self.router.record(plan, tier, time.monotonic() - start, error=e, fallback=tier != preferred)
+                # Once text has been shown, another model's answer can't be spliced onto it
+                if pieces or attempt == len(tiers) - 1:
+                    raise
+                continue
+            self.router.record(plan, tier, time.monotonic() - start, usage.get("usage"), fallback=tier != preferred)
+            break
         
-        return response.choices[0].message.content or ""
+        if tier == preferred:
+            self._store(cache_key, similar_key, "".join(pieces))
+    
+    def _request(self, plan: Dict, messages: List[ChatCompletionMessageParam]) -> Dict:
+        return {
+            "messages": messages,
+            "max_tokens": plan.get("max_tokens", Config.MAX_TOKENS),
+            "temperature": Config.TEMPERATURE
+        }
+    
+    def _route(self, request: Dict, tier: str, fallback: bool) -> Dict:
+        model = self.router.model(tier)
+        trace = current_trace()
+        if trace is not None:
+            trace.set(model=model, model_tier=tier, model_fallback=fallback)
+        return {**request, "model": model}
+    
+    def _create(self, request: Dict, priority: int, usage: Dict):
+        response = self.backends.complete(priority, **request)
+        # Only the call that actually went upstream reports usage; coalesced callers spent nothing
+        usage["usage"] = completion_usage(response)
+        return response
+    
+    def _deltas(self, request: Dict, priority: int, usage: Dict) -> Iterator[str]:
+        stream = self.backends.complete(priority, stream=True, **request)
+        try:
+            for chunk in stream:
+                usage["usage"] = completion_usage(chunk) or usage.get("usage")
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+    
+    def _cache_key(self, plan: Dict, request: Dict) -> Optional[str]:
+        if self.cache is None:
+            return None
+        # The current request is keyed on the normalized prompt; everything before it is context.
+        # Only answers from the planned model are stored, so the key names that model
+        params = {name: value for name, value in request.items() if name != "messages"}
+        params["model"] = self.router.model(self.router.preferred(plan))
+        return self.cache.make_key(plan["prompt_template"], cast(List[Dict], request["messages"][:-1]), params)
+    
+    def _similar_key(self, plan: Dict) -> Optional[Tuple[str, str, str]]:
+        if self.index is None or plan["task_type"] == "general" or not plan.get("topic"):
+            return None
+        # Keyed on the whole question: the index drops its request phrasing but keeps numbers and qualifiers
+        query = plan["topic"]
+        if _REFERENTIAL.search(query):
+            return None
+        return plan["task_type"], plan.get("difficulty") or "", query
+    
+    def _store(self, cache_key: Optional[str], similar_key: Optional[Tuple[str, str, str]], content: str):
+        if not content:
+            return
+        if cache_key:
+            self.cache.set(cache_key, content)
+        if similar_key:
+            self.index.add(*similar_key, content)
+    
+    @staticmethod
+    def _answered_from(source: str):
+        trace = current_trace()
+        if trace is not None:
+            trace.set(answer_source=source)
+    
+    def prompt_report(self, plan: Dict, context: Optional[List] = None, summary: Optional[str] = None) -> Dict:
+        """Report the estimated prompt tokens a request with this context would send."""
+        return self.context_builder.build(self.system_prompt, plan["prompt_template"], context, summary)[1]
+    
+    def _build_messages(
+        self, plan: Dict, context: Optional[List] = None, summary: Optional[str] = None
+    ) -> List[ChatCompletionMessageParam]:
+        # Recent turns verbatim and older ones as a summary, within the prompt token budget
+        messages, _ = self.context_builder.build(self.system_prompt, plan["prompt_template"], context, summary)
+        return cast(List[ChatCompletionMessageParam], messages)
     
     def format_response(self, response: str, task_type: str) -> str:
         """Format the response based on task type."""
+        prefix, suffix = self.response_frame(task_type)
+        return f"{prefix}{response}{suffix}"
+    
+    def response_frame(self, task_type: str) -> Tuple[str, str]:
+        """Return the text that goes before and after a response of this task type."""
         headers = {
             "explanation": "📚 Explanation",
             "summary": "📝 Summary",
@@ -52,4 +243,21 @@ Always be accurate, helpful, and engaging."""
         }
         
         header = headers.get(task_type, "💡 Response")
-        return f"\n{header}\n{'='*40}\n{response}\n"
+        return f"\n{header}\n{'='*40}\n", "\n"
+
+
+_shared_generator: Optional[OutputGenerator] = None
+_shared_lock = threading.Lock()
+
+
+def get_output_generator() -> OutputGenerator:
+    """Return the process-wide generator over the shared backends, caches and router.
+
+    A generator keeps no per-session state (the conversation comes in with
+    each call), so sessions share one instead of each building its own.
+    """
+    global _shared_generator
+    with _shared_lock:
+        if _shared_generator is None:
+            _shared_generator = OutputGenerator()
+        return _shared_generator
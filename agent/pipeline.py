@@ -0,0 +1,356 @@
+import contextvars
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
+
+from config import Config
+from .cancellation import CancelToken, QueryCancelled, activate_token
+from .rate_limiter import Priority
+from .tracing import Trace, Tracer, activate, get_tracer
+from .traffic import TrafficRecorder, get_traffic_recorder, new_session_id
+
+
+PARSE_MODES = ["sequential", "concurrent", "deferred", "skip"]
+
+# Appended to an answer cut short, by the reason it was cut
+TRUNCATION_NOTES = {
+    "stopped": "\n\n⏹️ *Stopped: this answer is incomplete.*",
+    "timeout": "\n\n⏱️ *Out of time: this answer is incomplete.*"
+}
+
+# Shared by every pipeline in the process so background parses from many
+# sessions don't each spin up their own threads.
+_executor = ThreadPoolExecutor(
+    max_workers=Config.PIPELINE_WORKERS,
+    thread_name_prefix="study-buddy"
+)
+
+
+class QueryPipeline:
+    """Runs the agent components for one query, tracing each stage.
+
+    Every query gets a `Trace` with a span per component plus the token
+    usage and queueing time of its Groq calls; the trace is exported to the
+    tracer's metrics (and trace log, if configured) when the query finishes.
+
+    Parse modes:
+    - sequential: parse, then generate (the original behaviour)
+    - concurrent: parse and generate at the same time, wait for both
+    - deferred: generate right away, parse in the background and attach
+      the result to the conversation history when it arrives
+    - skip: never call the parser
+
+    With a `prefetcher`, a query that matches a follow-up speculatively
+    generated after the previous answer is served from that prefetch, and
+    each answer schedules prefetches of its likely follow-ups.
+
+    With a `quiz` engine, quiz requests get structured questions from it,
+    and a reply with numbered answers to its unfinished quiz is graded
+    locally, without parsing, planning or calling the model. Questions
+    about the session itself ("what have I studied on photosynthesis?") are
+    answered from the state's topic index the same way.
+
+    Every query runs under a `CancelToken` holding its latency budget
+    (`Config.QUERY_TIMEOUT`). A parse over its share of the budget is
+    dropped rather than waited for. A query that is stopped or runs out of
+    time keeps the answer streamed so far, marked as incomplete, in the
+    history; the result's "truncated" is then "stopped" or "timeout".
+
+    With a `recorder` (by default when `TRAFFIC_RECORD_PATH` is set), every
+    query is also written to an anonymized traffic file for replaying.
+    """
+
+    def __init__(
+        self,
+        input_handler,
+        state,
+        planner,
+        generator,
+        parse_mode: Optional[str] = None,
+        tracer: Optional[Tracer] = None,
+        prefetcher=None,
+        quiz=None,
+        recorder: Optional[TrafficRecorder] = None,
+        session_id: Optional[str] = None
+    ):
+        self.input_handler = input_handler
+        self.state = state
+        self.planner = planner
+        self.generator = generator
+        self.tracer = tracer or get_tracer()
+        self.prefetcher = prefetcher
+        self.quiz = quiz
+        self.recorder = recorder or get_traffic_recorder()
+        # A UI that builds a pipeline per query passes the id it made for the browser session
+        self.session_id = session_id or new_session_id()
+        self.parse_mode = parse_mode or Config.PARSE_MODE
+        if self.parse_mode not in PARSE_MODES:
+            raise ValueError(f"Unknown parse mode: {self.parse_mode}")
+
+    def run(self, user_input: str, token: Optional[CancelToken] = None) -> Dict:
+        """Process a query and return the response with intermediate results."""
+        token = token or CancelToken.for_query()
+        trace = self.tracer.start_trace(parse_mode=self.parse_mode)
+        query = None
+        with activate(trace), activate_token(token):
+            try:
+                query = self._start(user_input, trace, token)
+
+                # Step 4: Generate response
+                if query["prefetched"] is not None:
+                    response = self._timed(trace, "output_generator", "".join, query["prefetched"].replay())
+                elif query["quiz"]:
+                    response = self._timed(trace, "output_generator", "".join, self._quiz_deltas(query))
+                elif query["studied"] is not None:
+                    response = self._timed(trace, "state_tracker", self.state.study_report, query["studied"])
+                else:
+                    response = self._timed(
+                        trace, "output_generator",
+                        self.generator.generate_response, query["plan"], query["context"], query["summary"]
+                    )
+                return self._finish(query, response)
+            except BaseException as e:
+                reason = self._cut_short(token, e) if query is not None else None
+                if reason is None:
+                    self._fail(trace, e, user_input)
+                    raise
+                result = self._finish(query, "", truncated=reason)
+                if not isinstance(e, Exception):
+                    raise
+                return result
+
+    def stream(self, user_input: str, token: Optional[CancelToken] = None) -> "QueryStream":
+        """Process a query, yielding the formatted response as it is generated."""
+        return QueryStream(self, user_input, token)
+
+    def _start(self, user_input: str, trace: Trace, token: CancelToken) -> Dict:
+        quiz_answers = self.quiz.answers(user_input) if self.quiz is not None else None
+        studied = self.state.history_question(user_input) if quiz_answers is None else None
+        local = quiz_answers is not None or studied is not None
+
+        # Step 1: Understand input (answers to a quiz and questions about the session need no parsing)
+        parsed = None
+        parse_future = None
+        parse_mode = "skip" if local else self.parse_mode
+        if parse_mode == "sequential":
+            parsed = self._parse(trace, token.stage("input_understanding"), user_input, Priority.INTERACTIVE)
+        elif parse_mode in ("concurrent", "deferred"):
+            # Nobody waits on a deferred parse, so it queues behind interactive requests
+            priority = Priority.BACKGROUND if parse_mode == "deferred" else Priority.INTERACTIVE
+            # Run in a copy of this context so the parse's Groq call lands in this query's trace
+            parse_future = _executor.submit(
+                contextvars.copy_context().run,
+                self._parse, trace, token.stage("input_understanding"), user_input, priority
+            )
+        if quiz_answers is not None:
+            intent = "quiz"
+        elif studied is not None:
+            intent = "history"
+            trace.set(answer_source="topic_index")
+        else:
+            intent = self.input_handler.classify_intent(user_input)
+        trace.set(intent=intent)
+        prefetched = self.prefetcher.claim(intent, user_input) if self.prefetcher and not local else None
+        if prefetched is not None:
+            trace.set(answer_source="prefetch")
+
+        # Step 2: Update state; answers to a quiz stay on the quiz's topic, questions about the session on theirs
+        if not local:
+            with trace.span("state_tracker"):
+                self.state.set_topic(user_input)
+
+        # Step 3: Create plan
+        plan = self._timed(
+            trace, "task_planner", self.planner.create_plan,
+            intent=intent, topic=user_input, difficulty=self.state.difficulty_level
+        )
+
+        with trace.span("state_tracker"):
+            context = self.state.get_context()
+            summary = self.state.summary
+        return {
+            "user_input": user_input,
+            "trace": trace,
+            "parsed": parsed,
+            "parse_future": parse_future,
+            "intent": intent,
+            "plan": plan,
+            "context": context,
+            "summary": summary,
+            "prefetched": prefetched,
+            "quiz": self.quiz is not None and (quiz_answers is not None or intent == "quiz"),
+            "quiz_answers": quiz_answers,
+            "studied": studied,
+            "prompt": self.generator.prompt_report(plan, context, summary)
+        }
+
+    def _finish(self, query: Dict, response: str, truncated: Optional[str] = None) -> Dict:
+        user_input = query["user_input"]
+        parsed = query["parsed"]
+        parse_future = query["parse_future"]
+        trace = query["trace"]
+        if truncated:
+            response += TRUNCATION_NOTES[truncated]
+            trace.set(truncated=truncated)
+
+        # Step 5: Update state with response (a stopped query doesn't wait for its parse)
+        if parse_future is not None and ((self.parse_mode == "concurrent" and not truncated) or parse_future.done()):
+            parsed = parse_future.result()
+            parse_future = None
+        with trace.span("state_tracker"):
+            entry = self.state.update_state(
+                user_input, parsed or self._pending(user_input), response, indexed=query["studied"] is None
+            )
+        if parse_future is not None:
+            self._attach_when_done(parse_future, entry)
+        # Whoever gave up on this answer isn't likely to ask its follow-ups next
+        if self.prefetcher is not None and query["quiz_answers"] is None and query["studied"] is None and not truncated:
+            self.prefetcher.schedule(query["intent"], user_input)
+
+        record = trace.finish()
+        if self.recorder is not None:
+            topic = query["studied"] if query["studied"] is not None else self.state.current_topic
+            self.recorder.record(
+                record, self.session_id, user_input, None if query["quiz_answers"] is not None else topic, response
+            )
+        return {
+            "response": self.generator.format_response(response, query["plan"]["task_type"]),
+            "raw_response": response,
+            "intent": query["intent"],
+            "parsed": parsed,
+            "plan": query["plan"],
+            "context": query["context"],
+            "prompt": query["prompt"],
+            "parse_mode": self.parse_mode,
+            "timings": record["timings"],
+            "usage": record["usage"],
+            "answer_source": record["attributes"].get("answer_source"),
+            "model": record["attributes"].get("model"),
+            "truncated": truncated,
+            "trace_id": record["trace_id"]
+        }
+
+    def _quiz_deltas(self, query: Dict) -> Iterator[str]:
+        if query["quiz_answers"] is not None:
+            return iter([self.quiz.grade(query["quiz_answers"])])
+        return self.quiz.stream(query["plan"], query["context"], query["summary"])
+
+    def _parse(self, trace: Trace, token: CancelToken, user_input: str, priority: int) -> Optional[Dict]:
+        # The parse only annotates the history, so one over its share of the budget is dropped
+        try:
+            with activate_token(token):
+                return self._timed(trace, "input_understanding", self.input_handler.parse_input, user_input, priority)
+        except QueryCancelled:
+            return None
+
+    @staticmethod
+    def _cut_short(token: CancelToken, error: BaseException) -> Optional[str]:
+        """Why a query ended early ("stopped" or "timeout"), or `None` if `error` is a real failure."""
+        if not isinstance(error, Exception):
+            # Ctrl-C, a closed stream or a Streamlit rerun stopped the query from outside
+            token.cancel("stopped")
+        if isinstance(error, QueryCancelled):
+            return error.reason
+        # e.g. the HTTP timeout of a call that ran into the query's deadline
+        return token.reason if token.cancelled else None
+
+    def _fail(self, trace: Trace, error: BaseException, user_input: str):
+        # GeneratorExit means a streaming caller stopped reading, not that something broke
+        trace.set(error="cancelled" if isinstance(error, GeneratorExit) else type(error).__name__)
+        record = trace.finish()
+        if self.recorder is not None:
+            self.recorder.record(record, self.session_id, user_input)
+
+    def _attach_when_done(self, future: Future, entry: Dict):
+        def attach(done: Future):
+            if done.exception() is None:
+                self.state.attach_parsed(entry, done.result())
+        future.add_done_callback(attach)
+
+    @staticmethod
+    def _timed(trace: Trace, stage: str, fn: Callable, *args, **kwargs):
+        with trace.span(stage):
+            return fn(*args, **kwargs)
+
+    @staticmethod
+    def _pending(user_input: str) -> Dict:
+        return {"raw_input": user_input, "parsed": None}
+
+
+class QueryStream:
+    """Iterable of formatted response deltas for one query.
+
+    The header from `OutputGenerator.response_frame` is yielded first. Once
+    the stream is exhausted the state has been updated and `result` holds the
+    same dict `QueryPipeline.run` returns.
+
+    `cancel` (from any thread) stops the query at its next delta or wait: the
+    truncation note is yielded and the stream ends normally. Closing the
+    stream early, or an exception thrown into it (Ctrl-C, a Streamlit rerun),
+    also records the partial answer and sets `result` before propagating.
+    """
+
+    def __init__(self, pipeline: QueryPipeline, user_input: str, token: Optional[CancelToken] = None):
+        self.pipeline = pipeline
+        self.user_input = user_input
+        self.token = token or CancelToken.for_query()
+        self.result: Optional[Dict] = None
+
+    def cancel(self):
+        """Stop the query, keeping what was streamed so far."""
+        self.token.cancel("stopped")
+
+    def __iter__(self) -> Iterator[str]:
+        pipeline = self.pipeline
+        token = self.token
+        trace = pipeline.tracer.start_trace(parse_mode=pipeline.parse_mode, stream=True)
+        query = None
+        pieces: List[str] = []
+        suffix = ""
+        with activate(trace), activate_token(token):
+            try:
+                query = pipeline._start(self.user_input, trace, token)
+
+                prefix, suffix = pipeline.generator.response_frame(query["plan"]["task_type"])
+                yield prefix
+
+                # Step 4: Generate response
+                start = time.perf_counter()
+                if query["prefetched"] is not None:
+                    deltas = query["prefetched"].replay()
+                elif query["quiz"]:
+                    deltas = pipeline._quiz_deltas(query)
+                elif query["studied"] is not None:
+                    deltas = iter([pipeline.state.study_report(query["studied"])])
+                else:
+                    deltas = pipeline.generator.stream_response(query["plan"], query["context"], query["summary"])
+                with trace.span("output_generator"):
+                    try:
+                        for delta in deltas:
+                            if not pieces:
+                                trace.end_span("time_to_first_token", start)
+                            pieces.append(delta)
+                            yield delta
+                            token.check()
+                    finally:
+                        # Leave a shared upstream stream now rather than when the generator is collected
+                        close = getattr(deltas, "close", None)
+                        if close is not None:
+                            close()
+
+                yield suffix
+                self.result = pipeline._finish(query, "".join(pieces))
+            except Exception as e:
+                reason = pipeline._cut_short(token, e) if query is not None else None
+                if reason is None:
+                    pipeline._fail(trace, e, self.user_input)
+                    raise
+                self.result = pipeline._finish(query, "".join(pieces), truncated=reason)
+                yield TRUNCATION_NOTES[reason] + suffix
+            except BaseException as e:
+                if query is None:
+                    pipeline._fail(trace, e, self.user_input)
+                else:
+                    pipeline._cut_short(token, e)
+                    self.result = pipeline._finish(query, "".join(pieces), truncated="stopped")
+                raise
@@ -0,0 +1,296 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config import Config
+from .cancellation import current_token
+from .context_builder import estimate_tokens
+from .query_parser import LocalQueryParser
+from .rate_limiter import Priority, rate_limiter_stats
+from .task_planner import TaskPlanner
+from .tracing import activate, get_tracer
+
+
+# How often each intent tends to follow another before any transitions are observed
+PRIOR_TRANSITIONS = {
+    "explain": {"quiz": 0.35, "practice": 0.3, "summarize": 0.15, "define": 0.1, "compare": 0.1},
+    "define": {"explain": 0.45, "quiz": 0.2, "practice": 0.15, "compare": 0.1, "summarize": 0.1},
+    "summarize": {"quiz": 0.45, "explain": 0.25, "practice": 0.2, "define": 0.1},
+    "quiz": {"practice": 0.4, "explain": 0.4, "summarize": 0.2},
+    "practice": {"quiz": 0.45, "explain": 0.4, "summarize": 0.15},
+    "compare": {"explain": 0.4, "quiz": 0.35, "summarize": 0.25},
+    "general": {"explain": 0.5, "quiz": 0.25, "summarize": 0.25}
+}
+
+# Observed transitions outweigh the prior once an intent has been followed this many times
+PRIOR_WEIGHT = 10
+
+
+class IntentTransitions:
+    """Counts which intent follows which, smoothed towards `PRIOR_TRANSITIONS`."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def observe(self, previous: str, intent: str):
+        with self._lock:
+            following = self._counts.setdefault(previous, {})
+            following[intent] = following.get(intent, 0) + 1
+
+    def predict(self, intent: str, count: int, min_probability: float) -> List[Tuple[str, float]]:
+        """Return up to `count` (intent, probability) follow-ups of `intent`, most likely first."""
+        with self._lock:
+            observed = dict(self._counts.get(intent, {}))
+        prior = PRIOR_TRANSITIONS.get(intent, PRIOR_TRANSITIONS["general"])
+        total = sum(observed.values())
+        candidates = set(prior) | set(observed)
+        scores = {
+            candidate: (observed.get(candidate, 0) + PRIOR_WEIGHT * prior.get(candidate, 0.0)) / (total + PRIOR_WEIGHT)
+            for candidate in candidates
+            # Repeating the same request on the same topic is never worth speculating on
+            if candidate != intent and candidate in TaskPlanner.FOLLOW_UP_PROMPTS
+        }
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return [(candidate, round(p, 3)) for candidate, p in ranked[:count] if p >= min_probability]
+
+
+class _Prefetch:
+    """One speculative answer, generated on a worker thread and replayable while in progress."""
+
+    def __init__(self, key: Tuple, intent: str):
+        self.key = key
+        self.intent = intent
+        self.created = time.monotonic()
+        self.pieces: List[str] = []
+        self.done = False
+        self.cancelled = False
+        self.served = False
+        self.accounted = False
+        self.error: Optional[BaseException] = None
+        self.tokens = 0
+        self.cond = threading.Condition()
+
+    @property
+    def started(self) -> bool:
+        with self.cond:
+            return bool(self.pieces) or (self.done and self.error is None)
+
+    def replay(self) -> Iterator[str]:
+        index = 0
+        token = current_token()
+        while True:
+            with self.cond:
+                while index >= len(self.pieces) and not self.done:
+                    self.cond.wait(timeout=token.tick() if token is not None else None)
+                if index < len(self.pieces):
+                    piece = self.pieces[index]
+                    index += 1
+                elif self.error is not None:
+                    raise self.error
+                else:
+                    return
+            yield piece
+
+
+_stats_lock = threading.Lock()
+_stats = {
+    "scheduled": 0,
+    "served": 0,
+    "cancelled": 0,
+    "expired": 0,
+    "failed": 0,
+    "skipped_busy": 0,
+    "used_tokens": 0,
+    "wasted_tokens": 0,
+    "scheduled_quizzes": 0,
+    "quiz_questions": 0,
+    "quiz_tokens": 0
+}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_transitions = IntentTransitions()
+
+
+def prefetch_stats() -> Dict:
+    """Return process-wide prefetch counters, hit rate and token spend."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["hit_rate"] = round(stats["served"] / stats["scheduled"], 3) if stats["scheduled"] else 0.0
+    spent = stats["used_tokens"] + stats["wasted_tokens"]
+    stats["wasted_share"] = round(stats["wasted_tokens"] / spent, 3) if spent else 0.0
+    return stats
+
+
+def _count(name: str, amount: int = 1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _stats_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=Config.PREFETCH_WORKERS, thread_name_prefix="prefetch")
+        return _executor
+
+
+class Prefetcher:
+    """Speculatively answers the follow-ups a session is likely to ask next.
+
+    After each answer, `schedule` predicts the most likely next intents for
+    the same topic and generates them in the background at the lowest
+    limiter priority, unless queries are already queueing for rate-limit
+    capacity.
+    `claim` hands a matching prefetch to the next query (even one still
+    streaming) and cancels the rest, since the user has moved on. A
+    prefetch only matches while the conversation is unchanged, because it
+    was generated with the context as it stood when it was scheduled.
+
+    With a `quiz` engine, a likely quiz is prefetched as questions in the
+    shared question bank instead, which the quiz then draws from.
+    """
+
+    def __init__(self, planner: TaskPlanner, generator, state, quiz=None):
+        self.planner = planner
+        self.generator = generator
+        self.state = state
+        self.quiz = quiz
+        self.parser = LocalQueryParser()
+        self.last_intent: Optional[str] = None
+        self._lock = threading.Lock()
+        self._buffer: Dict[Tuple, _Prefetch] = {}
+
+    def claim(self, intent: str, user_input: str) -> Optional[_Prefetch]:
+        """Return the prefetch answering this query, if any, and cancel all others."""
+        if self.last_intent is not None:
+            _transitions.observe(self.last_intent, intent)
+        self.last_intent = intent
+
+        key = self._key(intent, self._topic(user_input))
+        with self._lock:
+            entries, self._buffer = self._buffer, {}
+        match = entries.pop(key, None)
+        for entry in entries.values():
+            self._cancel(entry, "expired" if self._expired(entry) else "cancelled")
+        if match is None:
+            return None
+        if self._expired(match) or not match.started:
+            # Still queued behind other work: a fresh interactive request will be quicker
+            self._cancel(match, "expired" if self._expired(match) else "cancelled")
+            return None
+        with match.cond:
+            match.served = True
+        _count("served")
+        self._settle(match)
+        return match
+
+    def schedule(self, intent: str, user_input: str):
+        """Start prefetching the likely follow-ups to the query just answered."""
+        topic = self._topic(user_input)
+        if not topic:
+            return
+        predictions = _transitions.predict(intent, Config.PREFETCH_COUNT, Config.PREFETCH_MIN_PROBABILITY)
+        if predictions and rate_limiter_stats()["queue_depth"]:
+            # Requests are already waiting for capacity; a guess would only take it from them
+            _count("skipped_busy")
+            return
+        context = self.state.get_context()
+        summary = self.state.summary
+        for follow_up, _ in predictions:
+            if follow_up == "quiz" and self.quiz is not None:
+                plan = self.planner.create_plan(intent=follow_up, topic=topic, difficulty=self.state.difficulty_level)
+                _count("scheduled_quizzes")
+                _get_executor().submit(self._warm, plan)
+                continue
+            key = self._key(follow_up, topic)
+            entry = _Prefetch(key, follow_up)
+            with self._lock:
+                if key in self._buffer:
+                    continue
+                self._buffer[key] = entry
+            query = f"{TaskPlanner.FOLLOW_UP_PROMPTS[follow_up]} {topic}"
+            plan = self.planner.create_plan(intent=follow_up, topic=query, difficulty=self.state.difficulty_level)
+            _count("scheduled")
+            _get_executor().submit(self._run, entry, plan, context, summary)
+
+    def cancel_all(self):
+        """Drop every buffered prefetch, e.g. when the conversation is cleared."""
+        with self._lock:
+            entries, self._buffer = self._buffer, {}
+        for entry in entries.values():
+            self._cancel(entry, "cancelled")
+
+    def _run(self, entry: _Prefetch, plan: Dict, context, summary):
+        if entry.cancelled:
+            self._finish(entry)
+            return
+        trace = get_tracer().start_trace(parse_mode="prefetch", intent=entry.intent)
+        with activate(trace):
+            deltas = self.generator.stream_response(plan, context, summary, priority=Priority.BACKGROUND)
+            try:
+                for delta in deltas:
+                    with entry.cond:
+                        entry.pieces.append(delta)
+                        entry.cond.notify_all()
+                    if entry.cancelled:
+                        break
+            except Exception as e:
+                entry.error = e
+                _count("failed")
+            finally:
+                # Closing the generator abandons the upstream stream if it is cut short
+                deltas.close()
+        record = trace.finish()
+        entry.tokens = record["usage"]["prompt_tokens"] + record["usage"]["completion_tokens"]
+        if not entry.tokens and record["attributes"].get("answer_source") == "llm":
+            # Cut short before the usage chunk arrived; estimate what was spent
+            prompt = self.generator.prompt_report(plan, context, summary)
+            entry.tokens = prompt["prompt_tokens"] + estimate_tokens("".join(entry.pieces))
+        self._finish(entry)
+
+    def _warm(self, plan: Dict):
+        trace = get_tracer().start_trace(parse_mode="prefetch", intent="quiz")
+        with activate(trace):
+            try:
+                questions = self.quiz.warm(plan)
+            except Exception:
+                questions = 0
+                _count("failed")
+        record = trace.finish()
+        _count("quiz_questions", questions)
+        _count("quiz_tokens", record["usage"]["prompt_tokens"] + record["usage"]["completion_tokens"])
+
+    def _finish(self, entry: _Prefetch):
+        with entry.cond:
+            entry.done = True
+            entry.cond.notify_all()
+        self._settle(entry)
+
+    def _cancel(self, entry: _Prefetch, outcome: str):
+        with entry.cond:
+            if entry.served or entry.cancelled:
+                return
+            entry.cancelled = True
+        _count(outcome)
+        self._settle(entry)
+
+    @staticmethod
+    def _settle(entry: _Prefetch):
+        # Tokens are known once generation ends and are charged once, as used or wasted
+        with entry.cond:
+            if entry.accounted or not entry.done or not (entry.served or entry.cancelled):
+                return
+            entry.accounted = True
+        _count("used_tokens" if entry.served else "wasted_tokens", entry.tokens)
+
+    def _topic(self, user_input: str) -> str:
+        return " ".join(self.parser.parse(user_input)["topic"].lower().split())
+
+    def _key(self, intent: str, topic: str) -> Tuple:
+        return intent, topic, self.state.difficulty_level, self.state.interaction_count
+
+    @staticmethod
+    def _expired(entry: _Prefetch) -> bool:
+        return time.monotonic() - entry.created > Config.PREFETCH_TTL_SECONDS
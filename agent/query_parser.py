@@ -0,0 +1,221 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+
+# Trigger phrases per intent. Patterns are matched on word boundaries, so
+# "how" no longer fires inside "show" and "test" inside "latest".
+INTENT_PATTERNS: Dict[str, List[str]] = {
+    "compare": [
+        r"compare", r"comparing", r"comparison", r"contrast",
+        r"differences?\s+between", r"difference", r"differ",
+        r"vs\.?", r"versus", r"similarities"
+    ],
+    "quiz": [
+        r"quiz(?:\s+me)?", r"test\s+(?:me|my\s+knowledge)", r"mcqs?",
+        r"multiple[\s-]choice", r"ask\s+me\s+(?:some\s+)?questions", r"flash\s?cards?"
+    ],
+    "practice": [
+        r"practi[cs]e(?:\s+(?:problems?|questions|exercises?))?", r"exercises?",
+        r"problems?\s+(?:on|for|about)", r"worked\s+examples?", r"drills?", r"worksheet"
+    ],
+    "summarize": [
+        r"summari[sz]e", r"summary", r"tl;?dr", r"recap", r"overview(?:\s+of)?",
+        r"key\s+points", r"main\s+points", r"in\s+brief", r"briefly"
+    ],
+    "define": [
+        r"define", r"definition(?:\s+of)?", r"meaning\s+of", r"what\s+does(?=\s.+\smean\b)",
+        r"what(?:'s|\s+is|\s+are)(?:\s+(?:a|an|the))?"
+    ],
+    "explain": [
+        r"explain", r"explanation(?:\s+of)?", r"describe", r"how\s+(?:does|do|is|are|can|did|to)",
+        r"why\s+(?:does|do|is|are|did)", r"show\s+me\s+how", r"teach\s+me(?:\s+about)?", r"walk\s+me\s+through",
+        r"help\s+me\s+understand", r"tell\s+me\s+about", r"elaborate\s+on", r"break\s+down"
+    ]
+}
+
+# When the triggers that open a query (or, if none does, all of them) name
+# several intents, the more specific one wins.
+INTENT_PRIORITY = ["compare", "quiz", "practice", "summarize", "explain", "define"]
+
+DIFFICULTY_PATTERNS: Dict[str, List[str]] = {
+    "beginner": [
+        r"beginners?", r"simple", r"simply", r"basics?", r"easy", r"eli5",
+        r"like\s+i'?m\s+(?:5|five)", r"for\s+kids", r"introduct(?:ion|ory)", r"novice"
+    ],
+    "intermediate": [r"intermediate"],
+    "advanced": [
+        r"advanced", r"in[\s-]depth", r"detailed", r"rigorous(?:ly)?", r"expert",
+        r"graduate[\s-]level", r"deep\s+dive", r"technical"
+    ]
+}
+
+# Filler that may stand before a trigger phrase: "Can you make me 5 practice problems on ..."
+_REQUEST_FILLER = re.compile(
+    r"^\s*(?:(?:please|can\s+you|could\s+you|would\s+you|give\s+me|i\s+want|i\s+need|let's|"
+    r"make|create|generate|write|prepare|me|us|some|a|an|the|and|\d+|quick|short|few)\b[\s,:]*)+",
+    re.IGNORECASE
+)
+# Filler left between the trigger phrase and the topic. Numbers and verbs are
+# kept: they are part of topics like "5 pillars of Islam" or "how to make a cake".
+_LEADING_FILLER = re.compile(
+    r"^\s*(?:(?:please|can\s+you|could\s+you|would\s+you|give\s+me|i\s+want|i\s+need|let's|"
+    r"me|on|about|of|for|the\s+concept\s+of|the\s+topic\s+of|the\s+idea\s+of|some|a|an|the|and|in|"
+    r"between|how(?!\s+to\b))\b[\s,:]*)+",
+    re.IGNORECASE
+)
+_TRAILING_FILLER = re.compile(
+    r"(?:[\s,]*\b(?:please|for\s+me|work|works|mean|in\s+detail|briefly|in\s+brief|in\s+\w+\s+terms|"
+    r"at\s+an?\s+\w+\s+level|level|for|in|of|on|at|with|to)\b)+[\s?.!]*$|[\s?.!]+$",
+    re.IGNORECASE
+)
+# How difficulty is asked for around a topic ("at an advanced level", "in simple terms", "simply").
+# Difficulty words inside the topic itself ("technical debt", "simple harmonic motion") are left alone.
+_DIFFICULTY_PHRASES = re.compile(
+    r"\b(?:at\s+an?\s+[\w-]+\s+level|in\s+(?:simple|plain|basic|easy|technical|layman'?s?)\s+terms|"
+    r"in[\s-]depth|in\s+detail|for\s+(?:beginners?|kids|children|experts?|novices?|dummies)|"
+    r"like\s+i'?m\s+(?:5|five)|eli5|simply|rigorously)\b",
+    re.IGNORECASE
+)
+# A request verb opening a query without any trigger phrase: "Make a study plan for chemistry"
+_REQUEST_VERB = re.compile(r"^\s*(?:make|create|generate|write|prepare)\b\s*", re.IGNORECASE)
+# Triggers that belong to the topic ("how to make a cake") rather than introduce it
+_TOPIC_TRIGGER = re.compile(r"how\s+to\b", re.IGNORECASE)
+# Question triggers ("how are you") about the listener rather than a topic
+_QUESTION_TRIGGER = re.compile(r"^(?:how|why|what)\b", re.IGNORECASE)
+# Trigger nouns that are also words of topics ("the difference quotient", "how exercise affects the heart",
+# "the summary judgment"): they only ask for an intent at the start of a query or before a connective
+_TOPIC_NOUN = re.compile(
+    r"(?:differences?|practi[cs]e|exercises?|summary|overview|drills?|worksheet)", re.IGNORECASE
+)
+_NOUN_FOLLOWER = re.compile(r"\s+(?:between|of|on|for|about|in|with|to|from)\b|\s*[?.!]*$", re.IGNORECASE)
+_SMALL_TALK = re.compile(
+    r"^(?:you|yourself|u|things|everything|life|it\s+going|up)(?:\s+(?:doing|going|today|been))*$", re.IGNORECASE
+)
+
+
+def _compile(groups: Dict[str, List[str]]) -> Tuple["re.Pattern", Dict[str, str]]:
+    """Compile every pattern into one alternation with a named group per pattern."""
+    parts = []
+    owners = {}
+    for label, patterns in groups.items():
+        for i, pattern in enumerate(patterns):
+            name = f"{label}_{i}"
+            owners[name] = label
+            parts.append(f"(?P<{name}>\\b{pattern}\\b)")
+    return re.compile("|".join(parts), re.IGNORECASE), owners
+
+
+class LocalQueryParser:
+    """Rule-based parser that extracts intent, topic and difficulty without an LLM call."""
+
+    def __init__(self):
+        self._intent_regex, self._intent_owners = _compile(INTENT_PATTERNS)
+        self._difficulty_regex, self._difficulty_owners = _compile(DIFFICULTY_PATTERNS)
+
+    def parse(self, user_input: str) -> Dict:
+        """Parse a query into intent, topic, difficulty and a confidence score."""
+        matches = self._intent_matches(user_input)
+        cut, opening = self._opening(user_input, matches)
+        intent, confidence = self._pick_intent(self._deciding(user_input, matches, opening), user_input)
+        topic = self._topic(user_input, cut)
+        if _SMALL_TALK.match(topic) and all(
+            _QUESTION_TRIGGER.match(user_input[start:end]) for _, start, end in matches
+        ):
+            # "How are you?" is small talk, not a question about "you"
+            intent, confidence, topic = "general", 0.3, ""
+        difficulty = self._difficulty(user_input, topic)
+        if not topic:
+            confidence = min(confidence, 0.4)
+
+        return {
+            "intent": intent,
+            "topic": topic,
+            "difficulty": difficulty,
+            "confidence": confidence
+        }
+
+    def classify_intent(self, user_input: str) -> str:
+        """Return only the intent of a query."""
+        matches = self._intent_matches(user_input)
+        opening = self._opening(user_input, matches)[1]
+        return self._pick_intent(self._deciding(user_input, matches, opening), user_input)[0]
+
+    def _intent_matches(self, user_input: str) -> List[Tuple[str, int, int]]:
+        matches = []
+        for match in self._intent_regex.finditer(user_input):
+            if (
+                _TOPIC_NOUN.fullmatch(match.group())
+                and self._strip_filler(user_input[:match.start()])
+                and not _NOUN_FOLLOWER.match(user_input, match.end())
+            ):
+                continue
+            matches.append((self._intent_owners[match.lastgroup], match.start(), match.end()))
+        return matches
+
+    def _opening(
+        self, user_input: str, matches: List[Tuple[str, int, int]]
+    ) -> Tuple[int, List[Tuple[str, int, int]]]:
+        """Where the topic starts, and the trigger phrases before it that open the query.
+
+        "Give me practice problems for calculus" opens with "practice problems
+        for" and the topic starts at "calculus"; a trigger inside or after the
+        topic ("Explain photosynthesis briefly") doesn't open it.
+        """
+        cut = 0
+        opening = []
+        for match in sorted(matches, key=lambda match: match[1]):
+            _, start, end = match
+            if self._strip_filler(user_input[cut:start]):
+                break
+            opening.append(match)
+            if _TOPIC_TRIGGER.match(user_input, start):
+                cut = start
+                break
+            cut = end
+        return cut, opening
+
+    @staticmethod
+    def _deciding(
+        user_input: str, matches: List[Tuple[str, int, int]], opening: List[Tuple[str, int, int]]
+    ) -> List[Tuple[str, int, int]]:
+        # The triggers that open the query decide its intent ("Explain photosynthesis briefly"), unless
+        # they are only a question word, which the rest of the query may narrow ("How do viruses differ")
+        if opening and not all(_QUESTION_TRIGGER.match(user_input[start:end]) for _, start, end in opening):
+            return opening
+        return matches
+
+    @staticmethod
+    def _pick_intent(matches: List[Tuple[str, int, int]], user_input: str) -> Tuple[str, float]:
+        if not matches:
+            return "general", 0.3
+
+        found = {intent for intent, _, _ in matches}
+        intent = next(name for name in INTENT_PRIORITY if name in found)
+        if len(found) == 1:
+            # A trigger at the start of the query is the strongest signal
+            first_start = min(start for _, start, _ in matches)
+            leading = user_input[:first_start].strip()
+            return intent, 0.95 if len(leading.split()) <= 3 else 0.85
+        # "what is" is a weak define signal next to any other intent
+        if found - {"define"} and len(found - {"define"}) == 1:
+            return intent, 0.8
+        return intent, 0.6
+
+    def _difficulty(self, user_input: str, topic: str) -> Optional[str]:
+        # Only words around the topic ask for a difficulty; "technical debt" is not an advanced request
+        start = user_input.find(topic) if topic else -1
+        if start >= 0:
+            user_input = user_input[:start] + " " + user_input[start + len(topic):]
+        match = self._difficulty_regex.search(user_input)
+        return self._difficulty_owners[match.lastgroup] if match else None
+
+    def _topic(self, user_input: str, cut: int) -> str:
+        # Keep the text after the trigger phrases that open the query (see `_opening`)
+        text = user_input[cut:] if cut else _REQUEST_VERB.sub("", user_input)
+        text = _DIFFICULTY_PHRASES.sub(" ", _TRAILING_FILLER.sub("", text))
+        text = _TRAILING_FILLER.sub("", " ".join(text.split()))
+        return _LEADING_FILLER.sub("", text).strip(" ,:;-")
+
+    def _strip_filler(self, text: str) -> str:
+        # Before the trigger, difficulty words are never part of the topic ("a detailed explanation of")
+        return _REQUEST_FILLER.sub("", self._difficulty_regex.sub(" ", text)).strip()
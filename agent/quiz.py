@@ -0,0 +1,586 @@
+import contextvars
+import difflib
+import itertools
+import json
+import queue
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import groq
+
+from config import Config
+from .cancellation import current_token
+from .client import completion_usage
+from .query_parser import LocalQueryParser
+from .rate_limiter import Priority
+from .tracing import current_trace
+
+
+# Each parallel call is steered to a different part of the topic so they don't write the same questions
+ASPECTS = [
+    "key facts and definitions",
+    "how and why it works",
+    "applications and examples",
+    "common misconceptions",
+    "connections to related ideas"
+]
+
+# Questions the model is told not to repeat, per call
+MAX_AVOID = 8
+
+SYSTEM_PROMPT = (
+    "You write quiz questions for students. Reply with JSON Lines only: one JSON object per line, "
+    "no other text and no code fences."
+)
+
+LETTERS = "ABCDEFGH"
+
+_ARTICLES = re.compile(r"\b(a|an|the)\b")
+_REFERENTIAL = re.compile(r"\b(it|this|that|these|those|they|them|again)\b", re.IGNORECASE)
+_ANSWERS_PREFIX = re.compile(r"^\s*(my\s+)?answers?\s*[:\-]?\s*", re.IGNORECASE)
+_MARKER = re.compile(r"(?:^|([\s,;]+))(\d{1,2})\s*[.):\-]?\s*(?=\S)")
+_LETTER = re.compile(r"^\(?(?:option\s+)?([a-h])\s*[).:]?$", re.IGNORECASE)
+# Words that turn a reply containing the answer into a wrong one ("not chlorophyll")
+_NEGATIONS = frozenset(
+    "not no never neither nor none nothing without cannot isn aren wasn weren doesn don didn".split()
+)
+# Longest reply to one question, in words, that counts as an answer without an "Answers:" prefix
+MAX_ANSWER_WORDS = 6
+
+_quiz_ids = itertools.count(1)
+
+
+def normalize_answer(text: str) -> str:
+    """Lowercase, strip accents, punctuation and articles, and collapse whitespace."""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(_ARTICLES.sub(" ", text).split())
+
+
+class Question:
+    """One quiz question: multiple choice when it has options, short answer otherwise."""
+
+    __slots__ = ("text", "options", "answer", "explanation", "alternatives")
+
+    def __init__(
+        self,
+        text: str,
+        answer: str,
+        options: Optional[List[str]] = None,
+        explanation: str = "",
+        alternatives: Optional[List[str]] = None
+    ):
+        self.text = text
+        self.answer = answer
+        self.options = options or []
+        self.explanation = explanation
+        self.alternatives = alternatives or []
+
+    @classmethod
+    def from_json(cls, data: Any) -> Optional["Question"]:
+        """Build a question from the compact form the model writes, or None if it is unusable.
+
+        `{"q": question, "o": [options], "a": option letter or short answer, "e": explanation}`
+        """
+        if not isinstance(data, dict) or not isinstance(data.get("q"), str) or not data["q"].strip():
+            return None
+        answer = data.get("a")
+        if isinstance(answer, list):
+            answer, alternatives = (answer[0], answer[1:]) if answer else (None, [])
+        else:
+            alternatives = data.get("alt") or []
+        if not isinstance(answer, (str, int)) or not str(answer).strip():
+            return None
+        answer = str(answer).strip()
+        options = data.get("o") or []
+        if options:
+            if not isinstance(options, list) or not 2 <= len(options) <= len(LETTERS):
+                return None
+            options = [re.sub(r"^[A-Ha-h][).:]\s+", "", str(option)).strip() for option in options]
+            index = _option_index(answer, options)
+            if index is None:
+                return None
+            answer = LETTERS[index]
+        explanation = data.get("e")
+        return cls(
+            data["q"].strip(), answer, options,
+            explanation.strip() if isinstance(explanation, str) else "",
+            [str(alternative) for alternative in alternatives if str(alternative).strip()]
+        )
+
+    @property
+    def key(self) -> str:
+        return normalize_answer(self.text)
+
+    @property
+    def correct_text(self) -> str:
+        if self.options:
+            return f"{self.answer}) {self.options[LETTERS.index(self.answer)]}"
+        return self.answer
+
+    def grade(self, reply: str) -> bool:
+        """Check a student's reply locally.
+
+        Multiple choice accepts the option letter or the option's text (an
+        exact match after normalizing, or the closest option if it is close
+        enough); short answers accept a close enough match of the answer or
+        an alternative, or a reply that contains one as whole words. A reply
+        that negates the answer ("not chlorophyll") is wrong.
+        """
+        if self.options:
+            return _option_index(reply, self.options, fuzzy=True) == LETTERS.index(self.answer)
+        reply = normalize_answer(reply)
+        if not reply:
+            return False
+        negations = _NEGATIONS.intersection(reply.split())
+        for expected in [self.answer] + self.alternatives:
+            expected = normalize_answer(expected)
+            if not expected:
+                continue
+            if reply == expected:
+                return True
+            if negations - set(expected.split()):
+                continue
+            if re.search(rf"(?<!\w){re.escape(expected)}(?!\w)", reply):
+                return True
+            if difflib.SequenceMatcher(None, reply, expected).ratio() >= Config.QUIZ_FUZZY_THRESHOLD:
+                return True
+        return False
+
+    def to_markdown(self, number: int) -> str:
+        if not self.options:
+            return f"**{number}. {self.text}** _(short answer)_\n\n"
+        options = "".join(f"- {LETTERS[i]}) {option}\n" for i, option in enumerate(self.options))
+        return f"**{number}. {self.text}**\n\n{options}\n"
+
+    def to_dict(self) -> Dict:
+        return {"q": self.text, "o": self.options, "a": self.answer, "e": self.explanation, "alt": self.alternatives}
+
+
+def _option_index(reply: str, options: List[str], fuzzy: bool = False) -> Optional[int]:
+    match = _LETTER.match(str(reply).strip())
+    if match:
+        index = LETTERS.index(match.group(1).upper())
+        return index if index < len(options) else None
+    reply = normalize_answer(reply)
+    normalized = [normalize_answer(option) for option in options]
+    if reply in normalized:
+        return normalized.index(reply)
+    if not fuzzy or not reply:
+        return None
+    ratios = [difflib.SequenceMatcher(None, reply, option).ratio() for option in normalized]
+    best = max(range(len(options)), key=ratios.__getitem__)
+    return best if ratios[best] >= Config.QUIZ_FUZZY_THRESHOLD else None
+
+
+class Quiz:
+    """The questions of one quiz and the student's graded answers."""
+
+    def __init__(self, topic: str, difficulty: str):
+        self.id = next(_quiz_ids)
+        self.topic = topic
+        self.difficulty = difficulty
+        self.questions: List[Question] = []
+        self.results: Dict[int, Tuple[str, bool]] = {}
+
+    @property
+    def finished(self) -> bool:
+        return bool(self.questions) and len(self.results) == len(self.questions)
+
+    @property
+    def score(self) -> Tuple[int, int]:
+        """Correct answers and answered questions."""
+        return sum(correct for _, correct in self.results.values()), len(self.results)
+
+    def parse_answers(self, text: str) -> Optional[Dict[int, str]]:
+        """Read numbered answers ("1 B, 2 chlorophyll", "1) b 2) c") into {question number: reply}.
+
+        Returns None unless the whole text is numbered answers to this quiz.
+        Without an "Answers:" prefix (which the quiz form sends), the text must
+        also answer most of the quiz, or every question still open, in short
+        replies: "3 laws of motion explained" is a question, not an answer to 3.
+        """
+        prefix = _ANSWERS_PREFIX.match(text)
+        explicit = prefix is not None
+        text = text[prefix.end():] if explicit else text.strip()
+        markers = []
+        for match in _MARKER.finditer(text):
+            number = int(match.group(2))
+            previous = markers[-1][0] if markers else 0
+            if not markers and match.start() != 0:
+                break
+            # A number inside an answer ("about 300 nm") isn't a question number unless it is the next
+            # question's or follows a comma or new line
+            if previous < number <= len(self.questions) and (
+                not markers or number == previous + 1 or re.search(r"[,;\n]", match.group(1))
+            ):
+                markers.append((number, match.start(), match.end()))
+        if not markers:
+            return None
+        answers = {}
+        for i, (number, _, end) in enumerate(markers):
+            stop = markers[i + 1][1] if i + 1 < len(markers) else len(text)
+            answer = text[end:stop].strip(" ,;.\n")
+            if not answer:
+                return None
+            answers[number] = answer
+        if not explicit:
+            unanswered = len(self.questions) - len(self.results)
+            if len(answers) < min(len(self.questions) // 2 + 1, unanswered):
+                return None
+            if any(len(answer.split()) > MAX_ANSWER_WORDS for answer in answers.values()):
+                return None
+        return answers
+
+    def grade(self, answers: Dict[int, str]) -> str:
+        """Grade answers locally and return the feedback as markdown."""
+        lines = []
+        for number, reply in sorted(answers.items()):
+            question = self.questions[number - 1]
+            correct = question.grade(reply)
+            self.results[number] = (reply, correct)
+            if correct:
+                lines.append(f"✅ **{number}.** Correct!")
+            else:
+                line = f"❌ **{number}.** Not quite: the answer is **{question.correct_text}**."
+                lines.append(f"{line} {question.explanation}".rstrip())
+        correct, answered = self.score
+        lines.append(f"**Score: {correct}/{answered}**")
+        if not self.finished:
+            unanswered = [str(n) for n in range(1, len(self.questions) + 1) if n not in self.results]
+            lines.append(f"Still to answer: {', '.join(unanswered)}")
+        return "\n\n".join(lines)
+
+
+class QuestionBank:
+    """Generated questions per topic and difficulty, kept for reuse across sessions.
+
+    Topics are evicted least recently used first once there are `max_topics`,
+    and a topic keeps its newest `max_per_topic` questions.
+    """
+
+    def __init__(self, max_topics: Optional[int] = None, max_per_topic: Optional[int] = None):
+        self.max_topics = max_topics or Config.QUIZ_BANK_TOPICS
+        self.max_per_topic = max_per_topic or Config.QUIZ_BANK_PER_TOPIC
+        self._lock = threading.Lock()
+        self._topics: "OrderedDict[Tuple[str, str], OrderedDict[str, Question]]" = OrderedDict()
+        self._counters = {"hits": 0, "partial_hits": 0, "misses": 0, "served": 0, "generated": 0, "evictions": 0}
+
+    def take(self, key: Tuple[str, str], count: int, exclude: Set[str]) -> List[Question]:
+        """Return up to `count` questions on a topic that aren't in `exclude`."""
+        with self._lock:
+            questions = self._topics.get(key)
+            if questions is not None:
+                self._topics.move_to_end(key)
+            found = [q for k, q in (questions or {}).items() if k not in exclude][:count]
+            outcome = "hits" if len(found) == count else "partial_hits" if found else "misses"
+            self._counters[outcome] += 1
+            self._counters["served"] += len(found)
+            return found
+
+    def add(self, key: Tuple[str, str], question: Question):
+        with self._lock:
+            questions = self._topics.get(key)
+            if questions is None:
+                questions = self._topics[key] = OrderedDict()
+            self._topics.move_to_end(key)
+            if question.key in questions:
+                return
+            questions[question.key] = question
+            self._counters["generated"] += 1
+            while len(questions) > self.max_per_topic:
+                questions.popitem(last=False)
+            while len(self._topics) > self.max_topics:
+                self._topics.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def peek(self, key: Tuple[str, str], count: int) -> List[Question]:
+        """Return up to `count` of a topic's newest questions without counting a lookup."""
+        with self._lock:
+            return list((self._topics.get(key) or {}).values())[-count:]
+
+    def available(self, key: Tuple[str, str], exclude: Set[str]) -> int:
+        with self._lock:
+            return sum(1 for k in self._topics.get(key, {}) if k not in exclude)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["topics"] = len(self._topics)
+            stats["questions"] = sum(len(questions) for questions in self._topics.values())
+        lookups = stats["hits"] + stats["partial_hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+class QuizEngine:
+    """Structured quizzes for one session, graded without calling the model.
+
+    Questions are requested as compact JSON Lines from the plan's model tier,
+    split over up to `QUIZ_PARALLEL` concurrent calls that each cover a
+    different aspect of the topic; each question is yielded as soon as its
+    line has streamed in. Every generated question goes into the shared
+    `QuestionBank`, and questions this session hasn't seen are served from
+    there first, so a repeated topic needs no call at all. Answers to the
+    active quiz are graded locally by `grade`.
+    """
+
+    def __init__(self, generator, bank: Optional[QuestionBank] = None):
+        self.generator = generator
+        self.bank = bank or get_question_bank()
+        self.parser = LocalQueryParser()
+        self.active: Optional[Quiz] = None
+        self.seen: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def answers(self, user_input: str) -> Optional[Dict[int, str]]:
+        """Return the numbered answers in a reply to the unfinished active quiz, if it is one."""
+        quiz = self.active
+        if quiz is None or quiz.finished:
+            return None
+        return quiz.parse_answers(user_input)
+
+    def grade(self, answers: Dict[int, str]) -> str:
+        """Grade answers to the active quiz and return the feedback."""
+        trace = current_trace()
+        if trace is not None:
+            trace.set(answer_source="quiz")
+        return self.active.grade(answers)
+
+    def stream(
+        self,
+        plan: Dict,
+        context: Optional[List] = None,
+        summary: Optional[str] = None,
+        priority: int = Priority.INTERACTIVE
+    ) -> Iterator[str]:
+        """Start a new quiz for the plan, yielding each question as markdown as soon as it is ready."""
+        topic = self._topic(plan)
+        quiz = self.active = Quiz(topic, plan.get("difficulty") or "intermediate")
+        key = self._key(topic, quiz.difficulty)
+        count = Config.QUIZ_QUESTIONS
+        with self._lock:
+            exclude = set(self.seen)
+        from_bank = self.bank.take(key, count, exclude) if key else []
+        trace = current_trace()
+        if trace is not None:
+            trace.set(answer_source="quiz_bank" if len(from_bank) == count else "llm")
+
+        def ask(question: Question) -> str:
+            quiz.questions.append(question)
+            with self._lock:
+                self.seen.add(question.key)
+            return question.to_markdown(len(quiz.questions))
+
+        for question in from_bank:
+            yield ask(question)
+        # Only a quiz on "it" needs the conversation to know what it is about
+        if key is not None:
+            context, summary = None, None
+        if len(from_bank) < count:
+            exclude.update(question.key for question in from_bank)
+            for question in self._generate(plan, topic, key, count - len(from_bank), exclude, context, summary, priority):
+                yield ask(question)
+        if quiz.questions:
+            yield "Reply with your answers, e.g. `1 B, 2 chlorophyll`, or `Answers: 3 A` for just some of them."
+        else:
+            self.active = None
+            yield f"Sorry, I couldn't put together a quiz on {topic}. Try rephrasing the topic."
+
+    def warm(self, plan: Dict, priority: int = Priority.BACKGROUND) -> int:
+        """Fill the bank with a quiz's worth of questions this session hasn't seen, ahead of a likely quiz.
+
+        Returns how many questions were generated.
+        """
+        topic = self._topic(plan)
+        key = self._key(topic, plan.get("difficulty") or "intermediate")
+        if key is None:
+            return 0
+        with self._lock:
+            exclude = set(self.seen)
+        missing = Config.QUIZ_QUESTIONS - self.bank.available(key, exclude)
+        if missing <= 0:
+            return 0
+        return sum(1 for _ in self._generate(plan, topic, key, missing, exclude, None, None, priority))
+
+    def _topic(self, plan: Dict) -> str:
+        # The student's own words for the topic, less the request around it ("Quiz me on ...");
+        # it goes into the prompt as written and is only normalized for the bank key
+        topic = self.parser.parse(plan["topic"])["topic"] or plan["topic"]
+        return " ".join(topic.split())
+
+    def _key(self, topic: str, difficulty: str) -> Optional[Tuple[str, str]]:
+        # Questions about "it" depend on the conversation, so they aren't shared
+        if _REFERENTIAL.search(topic):
+            return None
+        topic = normalize_answer(topic)
+        return (topic, difficulty) if topic else None
+
+    def _generate(
+        self,
+        plan: Dict,
+        topic: str,
+        key: Optional[Tuple[str, str]],
+        count: int,
+        exclude: Set[str],
+        context: Optional[List],
+        summary: Optional[str],
+        priority: int
+    ) -> Iterator[Question]:
+        calls = max(1, min(Config.QUIZ_PARALLEL, count))
+        shares = [count // calls + (1 if i < count % calls else 0) for i in range(calls)]
+        results: queue.Queue = queue.Queue()
+        avoid = [question.text for question in self.bank.peek(key, MAX_AVOID)] if key else []
+        for i, share in enumerate(shares):
+            messages = self._messages(plan, topic, share, ASPECTS[i % len(ASPECTS)], avoid, context, summary)
+            # Copy the context so each call's usage lands in the caller's trace
+            context_copy = contextvars.copy_context()
+            threading.Thread(
+                target=context_copy.run, args=(self._call, plan, messages, share, priority, results),
+                daemon=True, name="quiz"
+            ).start()
+
+        pending = calls
+        wanted = count
+        error: Optional[BaseException] = None
+        token = current_token()
+        while pending:
+            try:
+                item = results.get(timeout=token.tick() if token is not None else None)
+            except queue.Empty:
+                continue
+            if isinstance(item, Question):
+                if item.key in exclude:
+                    continue
+                exclude.add(item.key)
+                if key:
+                    self.bank.add(key, item)
+                # Extra questions still go to the bank
+                if wanted:
+                    wanted -= 1
+                    yield item
+            else:
+                pending -= 1
+                error = item or error
+        if wanted == count and error is not None:
+            raise error
+
+    def _messages(
+        self,
+        plan: Dict,
+        topic: str,
+        count: int,
+        aspect: str,
+        avoid: List[str],
+        context: Optional[List],
+        summary: Optional[str]
+    ) -> List[Dict]:
+        prompt = (
+            f"Write {count} {plan.get('difficulty') or 'intermediate'} level quiz question{'s' if count > 1 else ''} "
+            f"about {topic}, focusing on {aspect}. Mix multiple choice and short answer. One line per question: "
+            '{"q": question, "o": [4 options] (omit for short answer), "a": correct option letter, '
+            'or a 1-4 word short answer, "e": one-sentence explanation}'
+        )
+        if avoid:
+            prompt += " Don't repeat these: " + " | ".join(avoid)
+        if context or summary:
+            messages, _ = self.generator.context_builder.build(SYSTEM_PROMPT, prompt, context, summary)
+            return messages
+        return [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
+
+    def _call(self, plan: Dict, messages: List[Dict], count: int, priority: int, results: queue.Queue):
+        router = self.generator.router
+        request = {
+            "messages": messages,
+            "max_tokens": min(plan.get("max_tokens", Config.MAX_TOKENS), 40 + Config.QUIZ_TOKENS_PER_QUESTION * count),
+            "temperature": Config.TEMPERATURE
+        }
+        preferred = router.preferred(plan)
+        tiers = router.choose(plan)
+        error: Optional[BaseException] = None
+        for attempt, tier in enumerate(tiers):
+            usage = None
+            found = 0
+            start = time.monotonic()
+            token = current_token()
+            try:
+                stream = self.generator.backends.complete(priority, stream=True, model=router.model(tier), **request)
+                try:
+                    decoder = _LineDecoder()
+                    for chunk in stream:
+                        # A stopped quiz stops paying for questions nobody will see
+                        if token is not None:
+                            token.check()
+                        usage = completion_usage(chunk) or usage
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            for question in decoder.feed(chunk.choices[0].delta.content):
+                                found += 1
+                                results.put(question)
+                    for question in decoder.feed("\n"):
+                        found += 1
+                        results.put(question)
+                finally:
+                    close = getattr(stream, "close", None)
+                    if close is not None:
+                        close()
+            except groq.APIError as e:
+                router.record(plan, tier, time.monotonic() - start, error=e, fallback=tier != preferred)
+                error = e
+                # Questions already handed out can't be taken back
+                if found or attempt == len(tiers) - 1:
+                    break
+                continue
+            except Exception as e:
+                error = e
+                break
+            router.record(plan, tier, time.monotonic() - start, usage, fallback=tier != preferred)
+            trace = current_trace()
+            if trace is not None:
+                trace.set(model=router.model(tier), model_tier=tier, model_fallback=tier != preferred)
+            error = None
+            break
+        results.put(error)
+
+
+class _LineDecoder:
+    """Turns streamed JSON Lines into questions, one per completed line."""
+
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, text: str) -> List[Question]:
+        self.buffer += text
+        *lines, self.buffer = self.buffer.split("\n")
+        questions = []
+        for line in lines:
+            line = line.strip().strip(",")
+            if not line.startswith(("{", "[")):
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError:
+                continue
+            # Some models put every question in one JSON array
+            for item in data if isinstance(data, list) else [data]:
+                question = Question.from_json(item)
+                if question is not None:
+                    questions.append(question)
+        return questions
+
+
+_shared_bank: Optional[QuestionBank] = None
+_shared_lock = threading.Lock()
+
+
+def get_question_bank() -> QuestionBank:
+    """Return the process-wide question bank, so questions generated for one session are reused by all."""
+    global _shared_bank
+    with _shared_lock:
+        if _shared_bank is None:
+            _shared_bank = QuestionBank()
+        return _shared_bank
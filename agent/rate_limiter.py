@@ -0,0 +1,264 @@
+import heapq
+import itertools
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+from config import Config
+
+
+# Longest a waiter with a `check` sleeps between calls to it
+CHECK_INTERVAL = 0.25
+
+
+class Priority:
+    """Queue priorities for upstream requests; lower values go first."""
+    INTERACTIVE = 0
+    BACKGROUND = 10
+
+
+class RateLimitTimeout(Exception):
+    """Raised when a request cannot get rate-limit capacity before its deadline."""
+
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """Parse rate-limit reset durations like "7.66s", "2m59.56s" or "250ms" into seconds."""
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(amount) * scale[unit] for amount, unit in parts)
+
+
+class _Bucket:
+    """Token bucket refilled continuously at `capacity` per minute."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60 / self.capacity
+
+
+class RateLimiter:
+    """Client-side requests-per-minute and tokens-per-minute limiter with a priority queue.
+
+    Requests wait in priority order until both buckets have room, so bursts
+    queue up instead of failing with 429s. The buckets are corrected from the
+    provider's rate-limit response headers, and a 429 pauses everyone for
+    the advertised retry delay. Each upstream account (API key and base URL)
+    has its own limiter, so several keys get several keys' throughput and one
+    backend's headers never resize another's buckets.
+    """
+
+    def __init__(self, rpm: Optional[int] = None, tpm: Optional[int] = None):
+        rpm = Config.RATE_LIMIT_RPM if rpm is None else rpm
+        tpm = Config.RATE_LIMIT_TPM if tpm is None else tpm
+        self._requests = _Bucket(rpm) if rpm > 0 else None
+        self._tokens = _Bucket(tpm) if tpm > 0 else None
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+        self._waiters: List[Tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._counters = {
+            "granted": 0,
+            "queued": 0,
+            "timeouts": 0,
+            "retries": 0,
+            "server_throttles": 0,
+            "wait_ms_total": 0.0,
+            "wait_ms_max": 0.0,
+            "max_queue_depth": 0
+        }
+
+    def acquire(
+        self,
+        tokens: int,
+        priority: int = Priority.INTERACTIVE,
+        deadline: Optional[float] = None,
+        check: Optional[Callable[[], None]] = None
+    ) -> float:
+        """Block until a request of `tokens` tokens may be sent; return the seconds waited.
+
+        `deadline` is a `time.monotonic()` timestamp; `RateLimitTimeout` is
+        raised if capacity won't be available by then. `check` is called
+        while waiting and may raise to give up the place in the queue.
+        """
+        ticket = (priority, next(self._seq))
+        start = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            self._counters["max_queue_depth"] = max(self._counters["max_queue_depth"], len(self._waiters))
+            self._cond.notify_all()
+            try:
+                while True:
+                    if check is not None:
+                        check()
+                    now = time.monotonic()
+                    if self._waiters[0] == ticket:
+                        wait = self._wait_time(tokens, now)
+                        if wait <= 0:
+                            self._take(tokens)
+                            return self._granted(start)
+                    else:
+                        # Not at the head of the queue; wake up when someone ahead is served
+                        wait = None
+                    if deadline is not None and now + (wait or 0) >= deadline:
+                        self._counters["timeouts"] += 1
+                        raise RateLimitTimeout(f"No rate-limit capacity for {tokens} tokens before the deadline")
+                    if wait is None and deadline is not None:
+                        wait = deadline - now
+                    if check is not None:
+                        wait = CHECK_INTERVAL if wait is None else min(wait, CHECK_INTERVAL)
+                    self._cond.wait(timeout=wait)
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def settle(self, reserved: int, actual: Optional[int]):
+        """Correct the token bucket once the real usage of a request is known."""
+        if self._tokens is None or actual is None:
+            return
+        with self._cond:
+            self._tokens.refill(time.monotonic())
+            self._tokens.level = min(self._tokens.capacity, self._tokens.level + reserved - actual)
+            self._cond.notify_all()
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        """Learn the provider's view of remaining capacity from rate-limit response headers."""
+        with self._cond:
+            now = time.monotonic()
+            limit_tokens = _number(headers.get("x-ratelimit-limit-tokens"))
+            remaining_tokens = _number(headers.get("x-ratelimit-remaining-tokens"))
+            if self._tokens is not None:
+                self._tokens.refill(now)
+                if limit_tokens:
+                    self._tokens.capacity = limit_tokens
+                if remaining_tokens is not None:
+                    self._tokens.level = min(self._tokens.level, remaining_tokens)
+
+            remaining_requests = _number(headers.get("x-ratelimit-remaining-requests"))
+            reset_requests = parse_duration(headers.get("x-ratelimit-reset-requests", ""))
+            if remaining_requests == 0 and reset_requests:
+                self._paused_until = max(self._paused_until, now + reset_requests)
+
+            retry_after = parse_duration(headers.get("retry-after", ""))
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            self._cond.notify_all()
+
+    def pause(self, seconds: float):
+        """Hold every queued request for `seconds`, e.g. after a 429."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._counters["server_throttles"] += 1
+
+    def record_retry(self):
+        with self._cond:
+            self._counters["retries"] += 1
+
+    def stats(self) -> Dict:
+        """Return queueing counters and current bucket levels."""
+        with self._cond:
+            now = time.monotonic()
+            stats = dict(self._counters)
+            stats["queue_depth"] = len(self._waiters)
+            stats["paused_for_s"] = round(max(0.0, self._paused_until - now), 2)
+            for name, bucket in (("requests", self._requests), ("tokens", self._tokens)):
+                if bucket is not None:
+                    bucket.refill(now)
+                    stats[f"{name}_available"] = int(bucket.level)
+                    stats[f"{name}_per_minute"] = int(bucket.capacity)
+        stats["wait_ms_avg"] = round(stats["wait_ms_total"] / stats["granted"], 2) if stats["granted"] else 0.0
+        return stats
+
+    def _wait_time(self, tokens: int, now: float) -> float:
+        wait = self._paused_until - now
+        for bucket, amount in ((self._requests, 1), (self._tokens, tokens)):
+            if bucket is not None:
+                bucket.refill(now)
+                wait = max(wait, bucket.wait_time(amount))
+        return wait
+
+    def _take(self, tokens: int):
+        if self._requests is not None:
+            self._requests.level -= 1
+        if self._tokens is not None:
+            self._tokens.level -= min(tokens, self._tokens.capacity)
+
+    def _granted(self, start: float) -> float:
+        waited = time.monotonic() - start
+        waited_ms = waited * 1000
+        self._counters["granted"] += 1
+        if waited_ms >= 1:
+            self._counters["queued"] += 1
+        self._counters["wait_ms_total"] += waited_ms
+        self._counters["wait_ms_max"] = max(self._counters["wait_ms_max"], round(waited_ms, 2))
+        return waited
+
+
+def _number(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+_shared_limiters: Dict[str, RateLimiter] = {}
+_shared_lock = threading.Lock()
+
+DEFAULT_ACCOUNT = "default"
+
+
+def get_rate_limiter(account: str = DEFAULT_ACCOUNT, rpm: Optional[int] = None, tpm: Optional[int] = None) -> RateLimiter:
+    """Return the process-wide rate limiter of an upstream account.
+
+    `rpm` and `tpm` override `RATE_LIMIT_RPM`/`RATE_LIMIT_TPM` when the
+    account's limiter is created; later calls get the existing limiter.
+    """
+    with _shared_lock:
+        limiter = _shared_limiters.get(account)
+        if limiter is None:
+            limiter = _shared_limiters[account] = RateLimiter(rpm, tpm)
+        return limiter
+
+
+def rate_limiter_stats() -> Dict:
+    """Return the stats of every account's limiter summed, with each one's own under "accounts"."""
+    with _shared_lock:
+        limiters = dict(_shared_limiters)
+    accounts = {account: limiter.stats() for account, limiter in sorted(limiters.items())}
+    totals: Dict = {}
+    for stats in accounts.values():
+        for name, value in stats.items():
+            if name in ("wait_ms_max", "paused_for_s"):
+                totals[name] = max(totals.get(name, 0), value)
+            elif name != "wait_ms_avg":
+                totals[name] = totals.get(name, 0) + value
+    for name in ("granted", "queued", "timeouts", "retries", "server_throttles", "queue_depth", "max_queue_depth"):
+        totals.setdefault(name, 0)
+    totals.setdefault("paused_for_s", 0.0)
+    totals.setdefault("wait_ms_max", 0.0)
+    wait_ms_total = totals.pop("wait_ms_total", 0.0)
+    totals["wait_ms_avg"] = round(wait_ms_total / totals["granted"], 2) if totals["granted"] else 0.0
+    totals["accounts"] = accounts
+    return totals
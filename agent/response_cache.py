@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+
+
+# Writes between passes over the disk tier for expired and excess entries
+DISK_EVICT_INTERVAL = 64
+
+
+class ResponseCache:
+    """Two-tier cache of generated responses.
+
+    Recently used entries live in an in-memory LRU bounded by entry count and
+    total size. Every entry is also written to a SQLite file so the cache
+    survives restarts. Entries expire after `ttl` seconds in both tiers.
+
+    Memory hits are remembered and written to the disk rows' access times
+    before the disk tier is trimmed, which happens every
+    `DISK_EVICT_INTERVAL` writes, so it may briefly exceed its limit.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        max_disk_entries: Optional[int] = None,
+        ttl: Optional[float] = None
+    ):
+        self.path = path or Config.CACHE_PATH
+        self.max_entries = max_entries or Config.CACHE_MAX_ENTRIES
+        self.max_bytes = max_bytes or Config.CACHE_MAX_BYTES
+        self.max_disk_entries = max_disk_entries or Config.CACHE_DISK_MAX_ENTRIES
+        self.ttl = ttl if ttl is not None else Config.CACHE_TTL_SECONDS
+
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._memory_bytes = 0
+        # Keys served from memory since the disk tier was last trimmed, with when
+        self._touched: Dict[str, float] = {}
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0
+        }
+
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_expires ON responses (expires_at)")
+        self._db.commit()
+
+    @staticmethod
+    def make_key(prompt: str, messages: List[Dict], params: Dict) -> str:
+        """Build a cache key from the request prompt, the context sent with it and every generation parameter.
+
+        `params` holds the rest of the request (model, temperature, max_tokens, ...):
+        an answer cut short by a small `max_tokens` must not answer a call allowed more.
+        """
+        normalized = " ".join(prompt.lower().split())
+        context_digest = hashlib.sha256(
+            json.dumps(messages, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+        raw = json.dumps([normalized, context_digest, params], sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for a key, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                expires_at, value = item
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._touched[key] = now
+                    self._counters["memory_hits"] += 1
+                    return value
+                self._drop_memory(key)
+                self._counters["expired"] += 1
+
+            row = self._db.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._counters["misses"] += 1
+                return None
+
+            value, expires_at = row
+            if expires_at <= now:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                self._counters["expired"] += 1
+                self._counters["misses"] += 1
+                return None
+
+            self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self._store_memory(key, expires_at, value)
+            self._counters["disk_hits"] += 1
+            return value
+
+    def set(self, key: str, value: str):
+        """Store a response in both tiers."""
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._store_memory(key, expires_at, value)
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, expires_at, now)
+            )
+            self._writes += 1
+            if self._writes % DISK_EVICT_INTERVAL == 0:
+                self._evict_disk()
+            self._db.commit()
+
+    def stats(self) -> Dict:
+        """Return hit/miss/eviction counters and tier sizes."""
+        with self._lock:
+            disk_entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_bytes
+            stats["disk_entries"] = disk_entries
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 3) if lookups else 0.0
+        return stats
+
+    def clear(self):
+        """Remove every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            self._touched.clear()
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+
+    def _store_memory(self, key: str, expires_at: float, value: str):
+        if key in self._memory:
+            self._drop_memory(key)
+        self._memory[key] = (expires_at, value)
+        self._memory_bytes += len(value.encode("utf-8"))
+        while self._memory and (len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes):
+            oldest = next(iter(self._memory))
+            self._drop_memory(oldest)
+            self._counters["memory_evictions"] += 1
+
+    def _drop_memory(self, key: str):
+        _, value = self._memory.pop(key)
+        self._memory_bytes -= len(value.encode("utf-8"))
+
+    def _evict_disk(self):
+        # Entries used from memory are recent, whatever their disk row says
+        if self._touched:
+            self._db.executemany(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._touched.items()]
+            )
+            self._touched.clear()
+        self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+        overflow = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_disk_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                (overflow,)
+            )
+            self._counters["disk_evictions"] += overflow
+
+
+_shared_cache: Optional[ResponseCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Return the process-wide response cache, or None when caching is disabled."""
+    global _shared_cache
+    if not Config.CACHE_ENABLED:
+        return None
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ResponseCache()
+        return _shared_cache
@@ -0,0 +1,56 @@
+import random
+import time
+from typing import Any, Callable, Optional
+
+import groq
+
+from config import Config
+from .rate_limiter import parse_duration
+
+
+# Errors worth another attempt: throttling, network trouble and server-side failures
+RETRYABLE_ERRORS = (groq.RateLimitError, groq.APIConnectionError, groq.InternalServerError)
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Return the delay the server asked for in a Retry-After header, if any."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    return parse_duration(response.headers.get("retry-after", ""))
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter for the given (1-based) retry attempt."""
+    ceiling = min(Config.RETRY_MAX_DELAY, Config.RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    return random.uniform(0, ceiling)
+
+
+def call_with_retry(
+    fn: Callable[[], Any],
+    deadline: Optional[float] = None,
+    max_attempts: Optional[int] = None,
+    on_retry: Optional[Callable[[Exception, float], None]] = None,
+    sleep: Callable[[float], Any] = time.sleep
+) -> Any:
+    """Call `fn`, retrying retryable errors with jittered backoff until `deadline`.
+
+    `deadline` is a `time.monotonic()` timestamp. The last error is raised
+    once attempts run out or the next wait would pass the deadline. `sleep`
+    waits between attempts; a query's `CancelToken.wait` cuts it short.
+    """
+    max_attempts = max_attempts or Config.RETRY_MAX_ATTEMPTS
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except RETRYABLE_ERRORS as e:
+            attempt += 1
+            if attempt >= max_attempts:
+                raise
+            delay = retry_after(e) or backoff_delay(attempt)
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                raise
+            if on_retry is not None:
+                on_retry(e, delay)
+            sleep(delay)
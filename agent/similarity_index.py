@@ -0,0 +1,314 @@
+import functools
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import Config
+
+
+_WORD = re.compile(r"\w+")
+_NUMBER = re.compile(r"\d+")
+
+# Words that phrase a request rather than name its subject. Everything else in
+# a question, numbers, qualifiers and negations included, stays in its key, so
+# "technical debt" and "debt", "3 pillars" and "5 pillars" or "safe" and "not
+# safe" are different questions.
+_PHRASING = frozenset("""
+    a an the please can could would will you me us i we to tell give show let s
+    explain explanation explained how does do did is are was were what work works mean means meaning
+    summarize summarise summary quiz test define definition compare comparison practice
+    about on of for some quick short briefly
+""".split())
+
+# Words are weighted above character trigrams so that "World War 1" and
+# "World War 2" stay apart even though nearly all their trigrams match
+WORD_WEIGHT = 2.0
+
+CODE_BITS = 64
+_BIT_VALUES = np.left_shift(np.uint64(1), np.arange(CODE_BITS, dtype=np.uint64))
+
+# Vectors with cosine similarity 0.9 differ in ~9 of 64 code bits (sd ~3);
+# a radius of 20 keeps virtually all of them as candidates for exact scoring
+MAX_HAMMING = 20
+RERANK_CANDIDATES = 64
+
+
+def normalize_query(query: str) -> str:
+    """The words of a question that name its subject: lowercased, without request phrasing."""
+    return " ".join(word for word in _WORD.findall(query.lower()) if word not in _PHRASING)
+
+
+def vectorize(text: str, dim: int) -> np.ndarray:
+    """Embed text as an L2-normalized vector of signed, hashed word and character-trigram counts."""
+    words = _WORD.findall(text.lower())
+    padded = f" {' '.join(words)} "
+    features = [f"w:{word}" for word in words] + [padded[i:i + 3] for i in range(len(padded) - 2)]
+    vector = np.zeros(dim, dtype=np.float32)
+    if not words:
+        return vector
+    # crc32 is stable across processes, unlike hash(), so persisted vectors stay valid
+    hashes = np.array([zlib.crc32(feature.encode("utf-8")) for feature in features], dtype=np.uint64)
+    signs = np.where(hashes & (1 << 31), -1.0, 1.0)
+    signs[:len(words)] *= WORD_WEIGHT
+    vector += np.bincount((hashes % dim).astype(np.intp), weights=signs, minlength=dim).astype(np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+@functools.lru_cache(maxsize=4)
+def _hyperplanes(dim: int) -> np.ndarray:
+    # Fixed seed: codes must be reproducible for vectors loaded from disk
+    return np.random.default_rng(0x51A11).standard_normal((dim, CODE_BITS)).astype(np.float32)
+
+
+def simhash(vector: np.ndarray) -> np.uint64:
+    """64-bit random-hyperplane code; the Hamming distance between codes tracks the angle between vectors."""
+    bits = (vector @ _hyperplanes(len(vector))) > 0
+    return np.uint64(np.sum(_BIT_VALUES[bits], dtype=np.uint64))
+
+
+class _Partition:
+    """Entries of one (task type, difficulty) pair in growable arrays.
+
+    Lookups scan the 64-bit codes first and only compute exact cosine
+    similarity for the closest few, so a lookup touches 8 bytes per entry
+    instead of the whole vector.
+    """
+
+    def __init__(self, dim: int):
+        self.codes = np.zeros(16, dtype=np.uint64)
+        self.vectors = np.zeros((16, dim), dtype=np.float16)
+        self.ids = np.zeros(16, dtype=np.int64)
+        self.accessed = np.zeros(16, dtype=np.float64)
+        self.size = 0
+
+    def add(self, entry_id: int, vector: np.ndarray, accessed: float):
+        if self.size == len(self.ids):
+            capacity = len(self.ids) * 2
+            self.codes = np.resize(self.codes, capacity)
+            self.vectors = np.resize(self.vectors, (capacity, self.vectors.shape[1]))
+            self.ids = np.resize(self.ids, capacity)
+            self.accessed = np.resize(self.accessed, capacity)
+        self.codes[self.size] = simhash(vector)
+        self.vectors[self.size] = vector
+        self.ids[self.size] = entry_id
+        self.accessed[self.size] = accessed
+        self.size += 1
+
+    def remove(self, row: int):
+        # Move the last row into the hole so the live rows stay contiguous
+        last = self.size - 1
+        self.codes[row] = self.codes[last]
+        self.vectors[row] = self.vectors[last]
+        self.ids[row] = self.ids[last]
+        self.accessed[row] = self.accessed[last]
+        self.size = last
+
+    def best(self, vector: np.ndarray, code: np.uint64) -> Optional[Tuple[int, float]]:
+        distances = np.bitwise_count(self.codes[:self.size] ^ code)
+        candidates = np.flatnonzero(distances <= MAX_HAMMING)
+        if not len(candidates):
+            return None
+        if len(candidates) > RERANK_CANDIDATES:
+            nearest = np.argpartition(distances[candidates], RERANK_CANDIDATES)[:RERANK_CANDIDATES]
+            candidates = candidates[nearest]
+        scores = self.vectors[candidates].astype(np.float32) @ vector
+        best = int(np.argmax(scores))
+        return int(candidates[best]), float(scores[best])
+
+
+class SimilarityIndex:
+    """Reuses answers across paraphrases of the same question.
+
+    Each stored answer is indexed by its task type and difficulty and by a
+    hashed n-gram vector of the whole question, less its request phrasing
+    (`normalize_query`), so "Explain photosynthesis" and "How does
+    photosynthesis work" land on the same vector. A lookup narrows one
+    partition down with SimHash codes, scores the remaining candidates
+    exactly and returns the best answer whose cosine similarity clears
+    `threshold` and whose question has the same numbers ("World War 1" is
+    never "World War 2").
+
+    Answers live in a SQLite file and only the vectors are kept in memory.
+    Answers older than `ttl` are not reused; past `max_entries` the least
+    recently used answers are evicted.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        dim: Optional[int] = None,
+        threshold: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None
+    ):
+        self.path = path or Config.SIMILARITY_INDEX_PATH
+        self.dim = dim or Config.SIMILARITY_DIM
+        self.threshold = threshold if threshold is not None else Config.SIMILARITY_THRESHOLD
+        self.max_entries = max_entries or Config.SIMILARITY_MAX_ENTRIES
+        self.ttl = ttl if ttl is not None else Config.SIMILARITY_TTL_SECONDS
+
+        self._partitions: Dict[Tuple[str, str], _Partition] = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            "lookups": 0,
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "inserts": 0,
+            "evictions": 0,
+            "lookup_us_total": 0.0
+        }
+
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "id INTEGER PRIMARY KEY, task_type TEXT NOT NULL, difficulty TEXT NOT NULL, topic TEXT NOT NULL, "
+            "answer TEXT NOT NULL, vector BLOB NOT NULL, accessed_at REAL NOT NULL, created_at REAL NOT NULL)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(answers)")}
+        if "created_at" not in columns:
+            # Written before answers expired, keyed on the parsed topic alone: none of them are reused
+            self._db.execute("DELETE FROM answers")
+            self._db.execute("ALTER TABLE answers ADD COLUMN created_at REAL NOT NULL DEFAULT 0")
+        self._db.commit()
+        self._load()
+
+    def lookup(self, task_type: str, difficulty: str, query: str) -> Optional[str]:
+        """Return a stored answer to a similar enough question, or None."""
+        start = time.perf_counter()
+        query = normalize_query(query)
+        vector = vectorize(query, self.dim)
+        with self._lock:
+            self._counters["lookups"] += 1
+            answer = None
+            partition = self._partitions.get((task_type, difficulty))
+            match = partition.best(vector, simhash(vector)) if partition and partition.size and vector.any() else None
+            if match is not None and match[1] >= self.threshold:
+                row = match[0]
+                answer = self._fetch(partition, row, query)
+            self._counters["hits" if answer is not None else "misses"] += 1
+            self._counters["lookup_us_total"] += (time.perf_counter() - start) * 1e6
+            return answer
+
+    def add(self, task_type: str, difficulty: str, query: str, answer: str):
+        """Index an answer under its task type, difficulty and question."""
+        query = normalize_query(query)
+        vector = vectorize(query, self.dim)
+        if not vector.any():
+            return
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO answers (task_type, difficulty, topic, answer, vector, accessed_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (task_type, difficulty, query, answer, vector.tobytes(), now, now)
+            )
+            self._partition(task_type, difficulty).add(cursor.lastrowid, vector, now)
+            self._counters["inserts"] += 1
+            self._evict()
+            self._db.commit()
+
+    def stats(self) -> Dict:
+        """Return lookup counters, hit rate and index size."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = sum(partition.size for partition in self._partitions.values())
+            stats["partitions"] = len(self._partitions)
+        stats["hit_rate"] = round(stats["hits"] / stats["lookups"], 3) if stats["lookups"] else 0.0
+        lookup_us_total = stats.pop("lookup_us_total")
+        stats["lookup_us_avg"] = round(lookup_us_total / stats["lookups"], 1) if stats["lookups"] else 0.0
+        return stats
+
+    def clear(self):
+        """Remove every stored answer."""
+        with self._lock:
+            self._partitions.clear()
+            self._db.execute("DELETE FROM answers")
+            self._db.commit()
+
+    def _fetch(self, partition: _Partition, row: int, query: str) -> Optional[str]:
+        entry_id = int(partition.ids[row])
+        stored = self._db.execute("SELECT answer, topic, created_at FROM answers WHERE id = ?", (entry_id,)).fetchone()
+        # Similar vectors only find the candidate: it answers the same question only if it names
+        # the same things ("plant cells" is not "animal cells") and the same numbers, in order
+        if stored is None or _NUMBER.findall(stored[1]) != _NUMBER.findall(query):
+            return None
+        if set(stored[1].split()) != set(query.split()):
+            return None
+        now = time.time()
+        if now - stored[2] >= self.ttl:
+            partition.remove(row)
+            self._db.execute("DELETE FROM answers WHERE id = ?", (entry_id,))
+            self._db.commit()
+            self._counters["expired"] += 1
+            return None
+        partition.accessed[row] = now
+        self._db.execute("UPDATE answers SET accessed_at = ? WHERE id = ?", (now, entry_id))
+        self._db.commit()
+        return stored[0]
+
+    def _partition(self, task_type: str, difficulty: str) -> _Partition:
+        partition = self._partitions.get((task_type, difficulty))
+        if partition is None:
+            partition = self._partitions[(task_type, difficulty)] = _Partition(self.dim)
+        return partition
+
+    def _load(self):
+        self._db.execute("DELETE FROM answers WHERE created_at <= ?", (time.time() - self.ttl,))
+        rows = self._db.execute("SELECT id, task_type, difficulty, vector, accessed_at FROM answers")
+        for entry_id, task_type, difficulty, blob, accessed_at in rows:
+            vector = np.frombuffer(blob, dtype=np.float32)
+            if len(vector) != self.dim:
+                # Written with another SIMILARITY_DIM; can't be compared with new vectors
+                continue
+            self._partition(task_type, difficulty).add(entry_id, vector, accessed_at)
+        with self._lock:
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        partitions = [partition for partition in self._partitions.values() if partition.size]
+        total = sum(partition.size for partition in partitions)
+        if total <= self.max_entries:
+            return
+        # Evict a little extra so a full index doesn't scan on every insert
+        count = min(total, total - self.max_entries + self.max_entries // 100)
+        accessed = np.concatenate([partition.accessed[:partition.size] for partition in partitions])
+        owners = np.repeat(np.arange(len(partitions)), [partition.size for partition in partitions])
+        rows = np.concatenate([np.arange(partition.size) for partition in partitions])
+        victims = np.argpartition(accessed, count - 1)[:count] if count < total else np.arange(total)
+
+        doomed_ids: List[int] = []
+        for owner in np.unique(owners[victims]):
+            partition = partitions[owner]
+            doomed_rows = np.sort(rows[victims[owners[victims] == owner]])[::-1]
+            doomed_ids.extend(partition.ids[doomed_rows].tolist())
+            # Highest rows first, so the last row moved into each hole is never a later victim
+            for row in doomed_rows:
+                partition.remove(int(row))
+        self._db.executemany("DELETE FROM answers WHERE id = ?", [(entry_id,) for entry_id in doomed_ids])
+        self._counters["evictions"] += len(doomed_ids)
+
+
+_shared_index: Optional[SimilarityIndex] = None
+_shared_lock = threading.Lock()
+
+
+def get_similarity_index() -> Optional[SimilarityIndex]:
+    """Return the process-wide similarity index, or None when it is disabled."""
+    global _shared_index
+    if not Config.SIMILARITY_ENABLED:
+        return None
+    with _shared_lock:
+        if _shared_index is None:
+            _shared_index = SimilarityIndex()
+        return _shared_index
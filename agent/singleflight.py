@@ -0,0 +1,192 @@
+import contextvars
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .cancellation import CancelToken, QueryCancelled, activate_token, current_token
+
+
+def request_fingerprint(**request: Any) -> str:
+    """Digest of the arguments of an upstream request; equal requests share a fingerprint."""
+    raw = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _StreamCall:
+    """One upstream stream, pumped on its own thread and replayed to every subscriber."""
+
+    def __init__(self, fn: Callable[[], Iterable[str]], on_done: Callable[["_StreamCall"], None]):
+        self.fn = fn
+        self.on_done = on_done
+        self.chunks: List[str] = []
+        self.done = False
+        self.abandoned = False
+        self.error: Optional[BaseException] = None
+        self.joined = 0
+        self.left = 0
+        self.cond = threading.Condition()
+
+    def start(self):
+        # The pump runs in the leader's context, so its upstream call is traced to the leader's query
+        context = contextvars.copy_context()
+        threading.Thread(target=context.run, args=(self._pump,), name="single-flight-stream", daemon=True).start()
+
+    def _pump(self):
+        upstream = None
+        try:
+            # Subscribers come and go with their own deadlines; the shared stream only stops once all have left
+            with activate_token(CancelToken.for_query()):
+                upstream = iter(self.fn())
+                for chunk in upstream:
+                    with self.cond:
+                        self.chunks.append(chunk)
+                        self.cond.notify_all()
+                        # Every subscriber went away, so stop paying for the rest of the stream
+                        if self.joined and self.left >= self.joined:
+                            self.abandoned = True
+                            break
+        except BaseException as e:
+            self.error = e
+        finally:
+            close = getattr(upstream, "close", None)
+            if close is not None:
+                close()
+            with self.cond:
+                self.done = True
+                self.cond.notify_all()
+            self.on_done(self)
+
+    def subscribe(self) -> Iterator[str]:
+        index = 0
+        token = current_token()
+        try:
+            while True:
+                with self.cond:
+                    while index >= len(self.chunks) and not self.done:
+                        self.cond.wait(timeout=token.tick() if token is not None else None)
+                    if index < len(self.chunks):
+                        chunk = self.chunks[index]
+                        index += 1
+                    elif self.error is not None:
+                        raise self.error
+                    else:
+                        return
+                yield chunk
+        finally:
+            with self.cond:
+                self.left += 1
+
+
+class SingleFlight:
+    """Coalesces concurrent identical upstream requests into one call.
+
+    Callers that arrive while a request with the same key is in flight wait
+    for it and receive its result (or, for streams, every chunk from the
+    start) instead of making their own call. A waiting caller still honours
+    its own query's `CancelToken`, and one whose leader was stopped makes
+    the call itself.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, _StreamCall] = {}
+        self._counters = {
+            "upstream_calls": 0,
+            "coalesced_calls": 0,
+            "upstream_streams": 0,
+            "coalesced_streams": 0
+        }
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Run `fn` unless a call with the same key is in flight, then share its result."""
+        token = current_token()
+        while True:
+            call, leader = self._join(key)
+            if leader:
+                break
+            while not call.event.wait(timeout=token.tick() if token is not None else None):
+                pass
+            error = call.error
+            if isinstance(error, QueryCancelled) or (error is not None and not isinstance(error, Exception)):
+                # The leader's query was stopped or interrupted, which this caller wasn't
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def _join(self, key: str) -> Tuple[_Call, bool]:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._counters["upstream_calls"] += 1
+            else:
+                self._counters["coalesced_calls"] += 1
+            return call, leader
+
+    def stream(self, key: str, fn: Callable[[], Iterable[str]]) -> Iterator[str]:
+        """Iterate the chunks of `fn()`, sharing one upstream stream per key."""
+        with self._lock:
+            call = self._streams.get(key)
+            leader = call is None or self._join_abandoned(call)
+            if leader:
+                call = self._streams[key] = _StreamCall(fn, self._forget_stream(key))
+                self._counters["upstream_streams"] += 1
+            else:
+                self._counters["coalesced_streams"] += 1
+            with call.cond:
+                call.joined += 1
+
+        if leader:
+            call.start()
+        return call.subscribe()
+
+    def stats(self) -> Dict:
+        """Return how many upstream calls were made and how many were saved."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["in_flight"] = len(self._calls) + len(self._streams)
+        stats["saved_calls"] = stats["coalesced_calls"] + stats["coalesced_streams"]
+        return stats
+
+    @staticmethod
+    def _join_abandoned(call: _StreamCall) -> bool:
+        # A stream cut short because nobody was reading can't be replayed in full
+        with call.cond:
+            return call.abandoned
+
+    def _forget_stream(self, key: str) -> Callable[[_StreamCall], None]:
+        def forget(call: _StreamCall):
+            with self._lock:
+                if self._streams.get(key) is call:
+                    del self._streams[key]
+        return forget
+
+
+_shared_flights = SingleFlight()
+
+
+def get_single_flight() -> SingleFlight:
+    """Return the process-wide request coalescer."""
+    return _shared_flights
@@ -1,54 +1,195 @@
+import bisect
+import heapq
+import re
+import time
+from collections import deque
 from datetime import datetime
-from typing import Optional
+from typing import Deque, Iterator, List, Optional
+
+from config import Config
+from .context_builder import clip_to_tokens, estimate_tokens
+from .history_store import HistoryStore, Turn
+from .query_parser import LocalQueryParser
+from .topic_index import TopicEntry, TopicIndex, history_question, topic_key
+
+
+# Topics and past questions listed when answering "what have I studied"
+REPORT_TOPICS = 10
+REPORT_QUESTIONS = 3
+
+# Topic extraction is stateless, so every session shares one parser
+_parser = LocalQueryParser()
 
 
 class StateTracker:
     def __init__(self):
-        self.conversation_history = []
+        self._init_history()
         self.current_topic = None
         self.difficulty_level = "intermediate"
         self.session_start = datetime.now()
-        self.topics_covered = []
-    
-    def update_state(self, user_input: str, parsed_input: dict, response: str):
-        """Update the conversation state with new interaction."""
-        self.conversation_history.append({
-            "timestamp": datetime.now().isoformat(),
-            "user_input": user_input,
-            "parsed": parsed_input,
-            "response": response
-        })
+
+    def _init_history(self):
+        # Recent turns stay in memory; older ones are spilled to a compressed file on demand
+        self.recent_turns: Deque[Turn] = deque()
+        self.max_recent_turns = max(Config.HISTORY_MEMORY_TURNS, Config.CONTEXT_RECENT_TURNS + 1)
+        self.spilled: Optional[HistoryStore] = None
+        self.interaction_count = 0
+        self.summary_lines = deque()
+        self.summary_tokens = 0
+        # Canonical topics and the turns (by position) that studied them
+        self.topics = TopicIndex()
+
+    def update_state(self, user_input: str, parsed_input: dict, response: str, indexed: bool = True) -> Turn:
+        """Update the conversation state with new interaction.
         
-        if self.current_topic and self.current_topic not in self.topics_covered:
-            self.topics_covered.append(self.current_topic)
-    
+        The turn is filed under the current topic unless `indexed` is false,
+        as for questions about the session itself.
+        """
+        turn = Turn(user_input, response, time.time())
+        turn.set_parsed(parsed_input)
+        position = self.interaction_count
+
+        if len(self.recent_turns) >= self.max_recent_turns:
+            if self.spilled is None:
+                self.spilled = HistoryStore()
+            self.spilled.append(self.recent_turns.popleft())
+        self.recent_turns.append(turn)
+        self.interaction_count += 1
+
+        # Fold the turn that just left the verbatim window into the summary
+        recent = Config.CONTEXT_RECENT_TURNS
+        if len(self.recent_turns) > recent:
+            self._fold_into_summary(self.recent_turns[-recent - 1])
+
+        if self.current_topic and indexed:
+            self.topics.add(self.current_topic, position, turn.timestamp)
+        return turn
+
+    def attach_parsed(self, turn: Turn, parsed_input: dict):
+        """Fill in the parsed input of an interaction recorded before parsing finished."""
+        turn.set_parsed(parsed_input)
+
+    @property
+    def topics_covered(self) -> List[str]:
+        """Topics studied this session, in the order first seen."""
+        return self.topics.labels
+
+    def has_covered(self, topic: str) -> bool:
+        """Check whether a topic was studied this session, however it is worded."""
+        return topic in self.topics
+
+    def iter_history(self) -> Iterator[Turn]:
+        """Yield every turn of the session, oldest first, loading spilled turns lazily."""
+        if self.spilled is not None:
+            yield from self.spilled
+        yield from list(self.recent_turns)
+
+    def history_slice(self, start: int, stop: Optional[int] = None) -> List[Turn]:
+        """Return turns `start` to `stop` (exclusive) of the session, reading only the spilled blocks needed."""
+        recent = list(self.recent_turns)
+        spilled = len(self.spilled) if self.spilled is not None else 0
+        stop = spilled + len(recent) if stop is None else stop
+        turns = list(self.spilled.slice(start, stop)) if start < spilled else []
+        return turns + recent[max(0, start - spilled):max(0, stop - spilled)]
+
+    def history_at(self, positions: List[int]) -> List[Turn]:
+        """Return the turns at ascending `positions`, reading each spilled block needed only once."""
+        spilled = len(self.spilled) if self.spilled is not None else 0
+        split = bisect.bisect_left(positions, spilled)
+        turns = self.spilled.turns_at(positions[:split]) if split else []
+        recent = list(self.recent_turns)
+        return turns + [recent[position - spilled] for position in positions[split:]]
+
     def set_topic(self, topic: str):
-        """Set the current study topic."""
-        self.current_topic = topic
-    
+        """Set the current study topic from a query, e.g. "Explain photosynthesis simply" -> "photosynthesis".
+        
+        Paraphrases of a topic studied before map to its first wording, and a
+        query that only points back at the conversation ("explain it again")
+        stays on the current topic.
+        """
+        extracted = _parser.parse(topic)["topic"] or topic
+        if topic_key(extracted) or not self.current_topic:
+            self.current_topic = self.topics.label(extracted)
+
+    @staticmethod
+    def history_question(user_input: str) -> Optional[str]:
+        """The topic a "what have I studied on X" question asks about ("" for everything), or `None`."""
+        return history_question(user_input)
+
+    def study_report(self, topic: str = "") -> str:
+        """Answer "what have I studied (on `topic`)" from the topic index, loading only the turns it quotes."""
+        if not len(self.topics):
+            return "You haven't studied anything yet this session."
+        if not topic:
+            entries = self.topics.recent(REPORT_TOPICS)
+            lines = [f"**You've studied {len(self.topics)} topic(s) this session, most recent first:**", ""]
+            lines += [f"- {entry.label} ({_count_turns(entry)})" for entry in entries]
+            if len(self.topics) > len(entries):
+                lines.append(f"- …and {len(self.topics) - len(entries)} more")
+            return "\n".join(lines)
+
+        entries = self.topics.search(topic)
+        if not entries:
+            recent = ", ".join(entry.label for entry in self.topics.recent(3))
+            return f"You haven't studied anything on {topic} yet this session. Recently: {recent}."
+        lines = [f"**What you've studied on {topic}:**", ""]
+        for entry in entries[:REPORT_TOPICS]:
+            first = datetime.fromtimestamp(entry.first).strftime("%H:%M")
+            last = datetime.fromtimestamp(entry.last).strftime("%H:%M")
+            when = first if first == last else f"{first}–{last}"
+            lines.append(f"- **{entry.label}**: {_count_turns(entry)}, {when}")
+        # The latest questions over every matching topic, merged from their turn lists
+        positions = sorted(heapq.nlargest(REPORT_QUESTIONS, heapq.merge(*(entry.turns for entry in entries))))
+        questions = [turn.user_input for turn in self.history_at(positions)]
+        lines += ["", "Your latest questions:"] + [f"- _{clip_to_tokens(question, 40)}_" for question in questions]
+        return "\n".join(lines)
+
     def set_difficulty(self, level: str):
         """Set the difficulty level."""
         if level in ["beginner", "intermediate", "advanced"]:
             self.difficulty_level = level
-    
-    def get_context(self, num_messages: int = 5) -> list:
+
+    def get_context(self, num_messages: Optional[int] = None) -> List[Turn]:
         """Get recent conversation context."""
-        return self.conversation_history[-num_messages:]
-    
+        count = min(num_messages or Config.CONTEXT_RECENT_TURNS, len(self.recent_turns))
+        return list(self.recent_turns)[len(self.recent_turns) - count:]
+
+    @property
+    def summary(self) -> str:
+        """Rolling summary of the turns older than the recent context window."""
+        return "\n".join(line for line, _ in self.summary_lines)
+
+    def _fold_into_summary(self, turn: Turn):
+        response = " ".join(turn.response.split())
+        # First sentence or so of the answer is enough to remind the model what was covered
+        first = re.split(r"(?<=[.!?])\s", response, maxsplit=1)[0]
+        line = f"- Student: {clip_to_tokens(turn.user_input, 40)} | Answer: {clip_to_tokens(first, 60)}"
+        tokens = estimate_tokens(line)
+        self.summary_lines.append((line, tokens))
+        self.summary_tokens += tokens
+        while self.summary_tokens > Config.CONTEXT_SUMMARY_TOKENS and len(self.summary_lines) > 1:
+            _, dropped = self.summary_lines.popleft()
+            self.summary_tokens -= dropped
+
     def get_session_summary(self) -> dict:
         """Get a summary of the current session."""
         return {
             "session_duration": str(datetime.now() - self.session_start),
             "topics_covered": self.topics_covered,
-            "total_interactions": len(self.conversation_history),
+            "total_interactions": self.interaction_count,
             "current_topic": self.current_topic,
             "difficulty_level": self.difficulty_level
         }
-    
+
     def reset(self):
         """Reset the state for a new session."""
-        self.conversation_history = []
+        if self.spilled is not None:
+            self.spilled.close()
+        self._init_history()
         self.current_topic = None
         self.difficulty_level = "intermediate"
         self.session_start = datetime.now()
-        self.topics_covered = []
+
+
+def _count_turns(entry: TopicEntry) -> str:
+    return f"{len(entry.turns)} question" + ("s" if len(entry.turns) != 1 else "")
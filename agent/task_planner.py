@@ -1,7 +1,21 @@
-from typing import List, Dict
+import threading
+from typing import List, Dict, Optional
+
+from config import Config
 
 
 class TaskPlanner:
+    # How a student phrases a request for each intent; used for the UI's quick
+    # actions and for the follow-up queries the prefetcher speculates on
+    FOLLOW_UP_PROMPTS = {
+        "explain": "Explain the concept of",
+        "summarize": "Summarize the topic of",
+        "quiz": "Quiz me on",
+        "define": "Define",
+        "compare": "Compare and contrast",
+        "practice": "Give me practice problems for"
+    }
+    
     def __init__(self):
         self.task_templates = {
             "explain": self._plan_explanation,
@@ -16,7 +30,16 @@ class TaskPlanner:
     def create_plan(self, intent: str, topic: str, difficulty: str) -> Dict:
         """Create an execution plan based on intent."""
         planner = self.task_templates.get(intent, self._plan_general)
-        return planner(topic, difficulty)
+        plan = planner(topic, difficulty)
+        plan.update(intent=intent, topic=topic, difficulty=difficulty)
+        # Model tier, completion budget and latency target for this kind of task
+        route = Config.MODEL_ROUTES.get(plan["task_type"], Config.MODEL_ROUTES["general"])
+        plan.update(
+            model_tier=route["tier"],
+            max_tokens=int(route["max_tokens"]),
+            latency_target=float(route["latency_target"])
+        )
+        return plan
     
     def _plan_explanation(self, topic: str, difficulty: str) -> Dict:
         return {
@@ -90,3 +113,16 @@ class TaskPlanner:
             "steps": ["Respond to query"],
             "prompt_template": f"Help the student with: {topic}. Respond at a {difficulty} level."
         }
+
+
+_shared_planner: Optional[TaskPlanner] = None
+_shared_lock = threading.Lock()
+
+
+def get_task_planner() -> TaskPlanner:
+    """Return the process-wide task planner; planning keeps no state, so every session shares it."""
+    global _shared_planner
+    with _shared_lock:
+        if _shared_planner is None:
+            _shared_planner = TaskPlanner()
+        return _shared_planner
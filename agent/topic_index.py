@@ -0,0 +1,145 @@
+import re
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+
+
+# Words that don't change what a topic is about
+_STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "and", "or", "for", "to", "about", "with", "by", "from", "its", "their",
+    "how", "what", "why", "is", "are", "does", "do", "works", "work", "concept", "topic", "idea", "basics",
+    "me", "tell", "show", "please", "can", "you",
+    # Words that point back into the conversation ("explain it again") rather than name a topic
+    "it", "this", "that", "these", "those", "they", "them", "again", "more", "further"
+}
+
+# "What have I studied on photosynthesis?", "which topics did we cover so far", "have I learned about cells"
+_HISTORY_QUESTION = re.compile(
+    r"^\s*(?:(?:what|which)(?:\s+topics?)?\s+(?:have|did)\s+(?:i|we)|have\s+(?:i|we))\s+"
+    r"(?:studied|study|learn(?:ed|t)?|cover(?:ed)?|gone\s+over|go\s+over)\b(?P<rest>.*)$",
+    re.IGNORECASE
+)
+_HISTORY_FILLER = re.compile(
+    r"\b(?:so\s+far|yet|before|already|until\s+now)\b|^\s*(?:on|about|in|for|regarding|with)\b|[?.!]+\s*$",
+    re.IGNORECASE
+)
+
+
+def _stem(word: str) -> str:
+    # Just enough to fold plurals together ("cells" / "cell", "processes" / "process")
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("sses", "xes", "ches", "shes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def topic_words(topic: str) -> List[str]:
+    """The distinct meaningful words of a topic, lowercased, unaccented and singular."""
+    text = unicodedata.normalize("NFKD", topic.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    words = [_stem(word) for word in re.findall(r"[a-z0-9]+", text) if word not in _STOPWORDS]
+    return list(dict.fromkeys(word for word in words if len(word) > 1 or word.isdigit()))
+
+
+def topic_key(topic: str) -> str:
+    """Canonical key of a topic: paraphrases like "Cell division" and "division of cells" share one."""
+    return " ".join(sorted(topic_words(topic)))
+
+
+def history_question(user_input: str) -> Optional[str]:
+    """The topic a "what have I studied on X" question asks about ("" for everything), or `None`."""
+    match = _HISTORY_QUESTION.match(user_input)
+    if match is None:
+        return None
+    return _HISTORY_FILLER.sub(" ", match.group("rest")).strip(" ,:;-")
+
+
+class TopicEntry:
+    """One canonical topic of a session and the turns that studied it."""
+
+    __slots__ = ("key", "label", "turns", "first", "last")
+
+    def __init__(self, key: str, label: str, timestamp: float):
+        self.key = key
+        self.label = label
+        self.turns: List[int] = []
+        self.first = timestamp
+        self.last = timestamp
+
+
+class TopicIndex:
+    """Inverted index of a session's history by canonical topic.
+
+    Each turn is filed under the key of its topic, by its position in the
+    session history, so spilled turns stay indexed without being loaded.
+    Every word of every key also points back at the keys containing it, so
+    a search for "photosynthesis" finds "light reactions of photosynthesis"
+    by intersecting a few small sets instead of scanning the history.
+    """
+
+    def __init__(self):
+        # In the order first studied
+        self._entries: Dict[str, TopicEntry] = {}
+        # Least recently studied first
+        self._recent: "OrderedDict[str, None]" = OrderedDict()
+        self._words: Dict[str, Set[str]] = {}
+
+    def add(self, topic: str, position: int, timestamp: float) -> Optional[TopicEntry]:
+        """File the turn at `position` under `topic`; the first wording seen becomes the topic's label."""
+        key = topic_key(topic)
+        if not key:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = TopicEntry(key, topic, timestamp)
+            for word in key.split():
+                self._words.setdefault(word, set()).add(key)
+        entry.turns.append(position)
+        entry.last = timestamp
+        self._recent[key] = None
+        self._recent.move_to_end(key)
+        return entry
+
+    def get(self, topic: str) -> Optional[TopicEntry]:
+        """The entry of exactly this topic, in any wording."""
+        return self._entries.get(topic_key(topic))
+
+    def label(self, topic: str) -> str:
+        """How the session first worded `topic`, or `topic` itself if it is new."""
+        entry = self.get(topic)
+        return entry.label if entry is not None else topic
+
+    def search(self, query: str) -> List[TopicEntry]:
+        """Topics whose key has every word of `query`, most recently studied first."""
+        words = topic_words(query)
+        if not words:
+            return []
+        keys = set(self._words.get(words[0], ()))
+        for word in words[1:]:
+            keys &= self._words.get(word, set())
+            if not keys:
+                return []
+        return sorted((self._entries[key] for key in keys), key=lambda entry: entry.last, reverse=True)
+
+    def recent(self, count: int) -> List[TopicEntry]:
+        """The `count` most recently studied topics, newest first."""
+        keys = []
+        for key in reversed(self._recent):
+            if len(keys) == count:
+                break
+            keys.append(key)
+        return [self._entries[key] for key in keys]
+
+    @property
+    def labels(self) -> List[str]:
+        """Every topic, in the order first studied."""
+        return [entry.label for entry in self._entries.values()]
+
+    def __contains__(self, topic: str) -> bool:
+        return topic_key(topic) in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
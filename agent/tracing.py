@@ -0,0 +1,403 @@
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from config import Config
+
+
+# Upper bounds in seconds; LLM stages sit in the seconds range, local stages in the sub-millisecond range
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("trace", default=None)
+_current_stage: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("stage", default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Labelled counters and histograms, rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        self._histograms: Dict[Tuple[str, Tuple], Histogram] = {}
+
+    def describe(self, name: str, kind: str, text: str):
+        self._help[name] = (kind, text)
+
+    def inc(self, name: str, amount: float = 1, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def render(self) -> str:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            lines: List[str] = []
+            described = set()
+
+            def header(name: str):
+                if name not in described and name in self._help:
+                    kind, text = self._help[name]
+                    lines.append(f"# HELP {name} {text}")
+                    lines.append(f"# TYPE {name} {kind}")
+                described.add(name)
+
+            for (name, labels), value in counters:
+                header(name)
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+            for (name, labels), histogram in histograms:
+                header(name)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else _number(bound)
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(round(histogram.total, 6))}")
+                lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: Tuple) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class Trace:
+    """Spans and upstream usage for one query.
+
+    Spans are recorded by `span()`; upstream calls made while a trace is
+    active (also on worker threads, which inherit it through contextvars)
+    add their token usage and queueing time with `record_call()`.
+    """
+
+    def __init__(self, tracer: "Tracer", **attributes):
+        self.tracer = tracer
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.attributes = dict(attributes)
+        self.spans: List[Dict] = []
+        self.timings: Dict[str, float] = {}
+        self.calls: List[Dict] = []
+        self.finished = False
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        """Time a pipeline stage; upstream calls inside it are attributed to `stage`."""
+        previous = _current_stage.get()
+        # Restored by value rather than by token, so a span may be held open across generator yields
+        _current_stage.set(stage)
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            _current_stage.set(previous)
+            self.end_span(stage, start, error=error)
+
+    def end_span(self, stage: str, start: float, error: Optional[str] = None):
+        """Record a span that started at `start` (a `time.perf_counter()` value)."""
+        duration_ms = round((time.perf_counter() - start) * 1000, 2)
+        span = {
+            "name": stage,
+            "offset_ms": round((start - self.start) * 1000, 2),
+            "duration_ms": duration_ms
+        }
+        if error:
+            span["error"] = error
+        with self._lock:
+            self.spans.append(span)
+            # A stage can run in several pieces (e.g. the state tracker before and after generation)
+            self.timings[stage] = round(self.timings.get(stage, 0) + duration_ms, 2)
+        self.tracer.record_span(stage, duration_ms, error)
+
+    def set(self, **attributes):
+        with self._lock:
+            self.attributes.update(attributes)
+
+    def record_call(
+        self,
+        stage: Optional[str],
+        prompt_tokens: Optional[int],
+        completion_tokens: Optional[int],
+        queue_ms: float,
+        retries: int = 0,
+        duration_ms: Optional[float] = None
+    ):
+        call = {
+            "stage": stage or "unknown",
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "queue_ms": round(queue_ms, 2),
+            "retries": retries,
+            "duration_ms": round(duration_ms, 2) if duration_ms is not None else None
+        }
+        with self._lock:
+            self.calls.append(call)
+
+    def usage(self) -> Dict:
+        """Token and queueing totals over the upstream calls recorded so far."""
+        with self._lock:
+            calls = list(self.calls)
+        return {
+            "upstream_calls": len(calls),
+            "prompt_tokens": sum(call["prompt_tokens"] or 0 for call in calls),
+            "completion_tokens": sum(call["completion_tokens"] or 0 for call in calls),
+            "queue_ms": round(sum(call["queue_ms"] for call in calls), 2),
+            "retries": sum(call["retries"] for call in calls),
+            "calls": calls
+        }
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            record = {
+                "trace_id": self.trace_id,
+                "started_at": round(self.started_at, 3),
+                "attributes": dict(self.attributes),
+                "timings": dict(self.timings),
+                "spans": list(self.spans)
+            }
+        record["usage"] = self.usage()
+        return record
+
+    def finish(self) -> Dict:
+        """Close the trace, export it and return its record."""
+        with self._lock:
+            first = not self.finished
+            if first:
+                self.finished = True
+                self.timings["total"] = round((time.perf_counter() - self.start) * 1000, 2)
+        record = self.to_dict()
+        if first:
+            self.tracer.export(record)
+        return record
+
+
+class Tracer:
+    """Creates traces and aggregates them into metrics and an optional JSONL trace log."""
+
+    def __init__(self, log_path: Optional[str] = None):
+        self.log_path = log_path if log_path is not None else Config.TRACE_LOG_PATH
+        self.metrics = MetricsRegistry()
+        self._log_lock = threading.Lock()
+        self.metrics.describe("study_buddy_queries_total", "counter", "Queries handled, by intent, parse mode and outcome.")
+        self.metrics.describe("study_buddy_stage_errors_total", "counter", "Pipeline stages that raised, by stage.")
+        self.metrics.describe("study_buddy_upstream_calls_total", "counter", "Groq API calls, by pipeline stage.")
+        self.metrics.describe("study_buddy_upstream_retries_total", "counter", "Retried Groq API attempts, by stage.")
+        self.metrics.describe("study_buddy_tokens_total", "counter", "Tokens reported by Groq, by stage and kind.")
+        self.metrics.describe("study_buddy_stage_duration_seconds", "histogram", "Time spent in each pipeline stage.")
+        self.metrics.describe("study_buddy_query_duration_seconds", "histogram", "End-to-end query latency.")
+        self.metrics.describe("study_buddy_time_to_first_token_seconds", "histogram", "Time to the first streamed token.")
+        self.metrics.describe("study_buddy_queue_wait_seconds", "histogram", "Time Groq calls waited for the rate limiter.")
+
+    def start_trace(self, **attributes) -> Trace:
+        return Trace(self, **attributes)
+
+    def record_span(self, stage: str, duration_ms: float, error: Optional[str] = None):
+        if stage == "time_to_first_token":
+            self.metrics.observe("study_buddy_time_to_first_token_seconds", duration_ms / 1000)
+            return
+        self.metrics.observe("study_buddy_stage_duration_seconds", duration_ms / 1000, stage=stage)
+        if error:
+            self.metrics.inc("study_buddy_stage_errors_total", stage=stage)
+
+    def record_call(
+        self,
+        prompt_tokens: Optional[int],
+        completion_tokens: Optional[int],
+        queue_seconds: float,
+        retries: int = 0,
+        duration_seconds: Optional[float] = None
+    ):
+        """Account for one upstream call, attributed to the active trace and stage.
+
+        `duration_seconds` runs from the call being made to its last byte,
+        including queueing and retries.
+        """
+        stage = _current_stage.get() or "unknown"
+        self.metrics.inc("study_buddy_upstream_calls_total", stage=stage)
+        self.metrics.observe("study_buddy_queue_wait_seconds", queue_seconds)
+        if retries:
+            self.metrics.inc("study_buddy_upstream_retries_total", retries, stage=stage)
+        if prompt_tokens:
+            self.metrics.inc("study_buddy_tokens_total", prompt_tokens, stage=stage, kind="prompt")
+        if completion_tokens:
+            self.metrics.inc("study_buddy_tokens_total", completion_tokens, stage=stage, kind="completion")
+        trace = _current_trace.get()
+        if trace is not None:
+            duration_ms = duration_seconds * 1000 if duration_seconds is not None else None
+            trace.record_call(stage, prompt_tokens, completion_tokens, queue_seconds * 1000, retries, duration_ms)
+
+    def export(self, record: Dict):
+        attributes = record["attributes"]
+        self.metrics.inc(
+            "study_buddy_queries_total",
+            intent=attributes.get("intent", "unknown"),
+            parse_mode=attributes.get("parse_mode", "unknown"),
+            # A truncated answer was still served, but isn't "ok" either
+            outcome=attributes.get("error") or attributes.get("truncated") or "ok"
+        )
+        self.metrics.observe("study_buddy_query_duration_seconds", record["timings"].get("total", 0) / 1000)
+        if self.log_path:
+            line = json.dumps(record, ensure_ascii=False)
+            with self._log_lock:
+                os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+
+    def render_metrics(self) -> str:
+        return self.metrics.render()
+
+
+@contextmanager
+def activate(trace: Trace) -> Iterator[Trace]:
+    """Make `trace` the current trace for upstream calls in this context."""
+    previous = _current_trace.get()
+    _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.set(previous)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def merge_metrics(texts: List[str], label: str = "worker") -> str:
+    """Merge the metrics of several processes into one exposition, labelling each sample with its process index.
+
+    Samples stay grouped under their metric's HELP/TYPE lines, as the text format requires.
+    """
+    order: List[str] = []
+    headers: Dict[str, List[str]] = {}
+    samples: Dict[str, List[str]] = {}
+    for index, text in enumerate(texts):
+        family = None
+        for line in text.splitlines():
+            if not line:
+                continue
+            if line.startswith("#"):
+                family = line.split()[2]
+                if family not in headers:
+                    order.append(family)
+                    headers[family] = []
+                    samples[family] = []
+                if line not in headers[family]:
+                    headers[family].append(line)
+                continue
+            name, brace, rest = line.partition("{")
+            if brace:
+                line = f'{name}{{{label}="{index}",{rest}'
+            else:
+                name, _, value = line.partition(" ")
+                line = f'{name}{{{label}="{index}"}} {value}'
+            if family is None or not name.startswith(family):
+                family = name
+                if family not in samples:
+                    order.append(family)
+                    headers[family] = []
+                    samples[family] = []
+            samples[family].append(line)
+    lines = [line for family in order for line in headers[family] + samples[family]]
+    return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(
+    port: int,
+    host: Optional[str] = None,
+    render: Optional[Callable[[], str]] = None
+) -> ThreadingHTTPServer:
+    """Serve `GET /metrics` on a daemon thread, from the process-wide tracer unless `render` is given.
+
+    Binds to `METRICS_HOST` (loopback by default) unless `host` is given.
+    """
+    host = Config.METRICS_HOST if host is None else host
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            try:
+                body = (render or get_tracer().render_metrics)().encode("utf-8")
+            except Exception as e:
+                self.send_error(503, f"{type(e).__name__}: {e}")
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+_shared_tracer: Optional[Tracer] = None
+_metrics_server: Optional[ThreadingHTTPServer] = None
+_shared_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Return the process-wide tracer, starting the metrics endpoint if `METRICS_PORT` is set."""
+    global _shared_tracer, _metrics_server
+    with _shared_lock:
+        if _shared_tracer is None:
+            _shared_tracer = Tracer()
+            if Config.METRICS_PORT:
+                try:
+                    _metrics_server = start_metrics_server(Config.METRICS_PORT)
+                except OSError:
+                    # Another process (e.g. a second Streamlit worker) already serves the port
+                    _metrics_server = None
+        return _shared_tracer
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from typing import Dict, Iterator, Optional
+
+from config import Config
+from .context_builder import estimate_tokens
+from .topic_index import topic_key
+
+
+FORMAT = "study-buddy-traffic"
+VERSION = 1
+
+
+class TrafficRecorder:
+    """Appends an anonymized record of every query to a compact JSON Lines file.
+
+    A record keeps the shape of the traffic and none of its text: when the
+    query started, a random per-session id (`new_session_id`), the intent, whether it was
+    streamed, the size of the question and of the answer, where the answer
+    came from, the outcome, and each upstream call made at the client
+    boundary (the parse of `InputUnderstanding`, the answers and quizzes of
+    `OutputGenerator`) with its stage, prompt and completion tokens and
+    latency. Topics are kept only as a salted hash, so repeats of a topic
+    within and across sessions can be replayed; the salt is random per
+    recording and never written. Processes appending to one recording (the
+    workers of `server.py`) share it through `set_traffic_salt`, so a topic
+    gets the same id in all of them.
+
+        {"t": 1718000000.12, "s": "3f2a9c01", "i": "explain", "k": "9b1e77d2", "st": 1,
+         "q": 6, "r": 1840, "src": "llm", "ms": 2310.5, "c": [["output_generator", 812, 411, 2290.1]]}
+    """
+
+    def __init__(self, path: str, salt: Optional[bytes] = None):
+        self.path = path
+        self._salt = salt or os.urandom(16)
+        self._lock = threading.Lock()
+        self._file = None
+
+    def topic_id(self, topic: Optional[str]) -> Optional[str]:
+        """The anonymous id of a topic; paraphrases share one (see `topic_key`)."""
+        key = topic_key(topic) if topic else ""
+        if not key:
+            return None
+        return hashlib.blake2b(key.encode("utf-8"), key=self._salt, digest_size=4).hexdigest()
+
+    def record(
+        self,
+        trace: Dict,
+        session_id: str,
+        user_input: str,
+        topic: Optional[str] = None,
+        response: Optional[str] = None
+    ):
+        """Write one query, from its finished trace record."""
+        attributes = trace["attributes"]
+        entry = {
+            "t": round(trace["started_at"], 2),
+            "s": session_id,
+            "i": attributes.get("intent"),
+            "k": self.topic_id(topic),
+            "st": 1 if attributes.get("stream") else 0,
+            "q": estimate_tokens(user_input),
+            "r": len(response) if response is not None else None,
+            "src": attributes.get("answer_source"),
+            "ms": trace["timings"].get("total")
+        }
+        outcome = attributes.get("error") or attributes.get("truncated")
+        if outcome:
+            entry["x"] = outcome
+        entry["c"] = [
+            [call["stage"], call["prompt_tokens"], call["completion_tokens"], call.get("duration_ms")]
+            for call in trace["usage"]["calls"]
+        ]
+        line = json.dumps(entry, separators=(",", ":"))
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                # Line buffered: each record reaches the file as one write, even with several processes appending
+                self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+                if self._file.tell() == 0:
+                    self._file.write(json.dumps({"format": FORMAT, "version": VERSION}) + "\n")
+            self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def new_session_id() -> str:
+    """A random id for one session's records; it tells sessions apart without identifying them."""
+    return uuid.uuid4().hex[:8]
+
+
+def read_traffic(path: str) -> Iterator[Dict]:
+    """Yield the query records of a traffic file, skipping its header lines."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if "format" in entry:
+                if entry["format"] != FORMAT or entry.get("version", VERSION) > VERSION:
+                    raise ValueError(f"{path} is not a version {VERSION} {FORMAT} file")
+                continue
+            yield entry
+
+
+_shared_recorder: Optional[TrafficRecorder] = None
+_shared_salt: Optional[bytes] = None
+_shared_lock = threading.Lock()
+
+
+def set_traffic_salt(salt: bytes):
+    """Hash topics with this salt in the process-wide recorder; call before the first query is recorded."""
+    global _shared_salt
+    with _shared_lock:
+        _shared_salt = salt
+
+
+def get_traffic_recorder() -> Optional[TrafficRecorder]:
+    """Return the process-wide recorder, or `None` unless `TRAFFIC_RECORD_PATH` is set."""
+    global _shared_recorder
+    if not Config.TRAFFIC_RECORD_PATH:
+        return None
+    with _shared_lock:
+        if _shared_recorder is None:
+            _shared_recorder = TrafficRecorder(Config.TRAFFIC_RECORD_PATH, _shared_salt)
+        return _shared_recorder
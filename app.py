@@ -1,38 +1,39 @@
-from agent import InputUnderstanding, StateTracker, TaskPlanner, OutputGenerator
+from typing import Optional
+
+from agent import (
+    CancelToken, StateTracker, Prefetcher, QueryPipeline, QueryStream, QuizEngine, get_input_understanding,
+    get_output_generator, get_task_planner
+)
+from agent.rate_limiter import RateLimitTimeout
+from config import Config
 
 
 class StudyBuddyAgent:
-    def __init__(self):
-        self.input_handler = InputUnderstanding()
+    def __init__(self, parse_mode: Optional[str] = None):
+        # Stateless components are shared by every agent in the process; the rest is this session's
+        self.input_handler = get_input_understanding()
         self.state = StateTracker()
-        self.planner = TaskPlanner()
-        self.generator = OutputGenerator()
+        self.planner = get_task_planner()
+        self.generator = get_output_generator()
+        self.quiz = QuizEngine(self.generator) if Config.QUIZ_ENABLED else None
+        self.prefetcher = (
+            Prefetcher(self.planner, self.generator, self.state, quiz=self.quiz) if Config.PREFETCH_ENABLED else None
+        )
+        self.pipeline = QueryPipeline(
+            self.input_handler, self.state, self.planner, self.generator,
+            parse_mode=parse_mode, prefetcher=self.prefetcher, quiz=self.quiz
+        )
+        self.last_timings = {}
     
-    def process_query(self, user_input: str) -> str:
+    def process_query(self, user_input: str, token: Optional[CancelToken] = None) -> str:
         """Process a user query and generate a response."""
-        # Step 1: Understand input
-        parsed = self.input_handler.parse_input(user_input)
-        intent = self.input_handler.classify_intent(user_input)
-        
-        # Step 2: Update state
-        self.state.set_topic(user_input)
-        
-        # Step 3: Create plan
-        plan = self.planner.create_plan(
-            intent=intent,
-            topic=user_input,
-            difficulty=self.state.difficulty_level
-        )
-        
-        # Step 4: Generate response
-        context = self.state.get_context()
-        response = self.generator.generate_response(plan, context)
-        formatted = self.generator.format_response(response, plan["task_type"])
-        
-        # Step 5: Update state with response
-        self.state.update_state(user_input, parsed, response)
-        
-        return formatted
+        result = self.pipeline.run(user_input, token)
+        self.last_timings = result["timings"]
+        return result["response"]
+    
+    def stream_query(self, user_input: str, token: Optional[CancelToken] = None) -> QueryStream:
+        """Process a user query, yielding the response as it is generated."""
+        return self.pipeline.stream(user_input, token)
     
     def set_difficulty(self, level: str):
         """Set the difficulty level."""
@@ -44,6 +45,19 @@ class StudyBuddyAgent:
         return self.state.get_session_summary()
 
 
+def format_timings(timings: dict, prompt: Optional[dict] = None, usage: Optional[dict] = None) -> str:
+    """Render per-stage timings, the prompt size and token usage as a single line."""
+    stages = ", ".join(f"{stage} {ms:.0f}ms" for stage, ms in timings.items() if stage != "total")
+    line = f"⏱️ {timings.get('total', 0):.0f}ms total ({stages})"
+    if prompt:
+        line += f" | ~{prompt['prompt_tokens']}/{prompt['budget']} prompt tokens"
+    if usage and usage["upstream_calls"]:
+        line += f" | {usage['prompt_tokens']}+{usage['completion_tokens']} tokens used"
+        if usage["queue_ms"] >= 1:
+            line += f", queued {usage['queue_ms']:.0f}ms"
+    return line
+
+
 def main():
     print("🎓 AI Study Buddy Agent")
     print("=" * 40)
@@ -71,9 +85,19 @@ def main():
                 print(agent.set_difficulty(level))
                 continue
             
-            response = agent.process_query(user_input)
-            print(response)
+            stream = agent.stream_query(user_input)
+            try:
+                for delta in stream:
+                    print(delta, end="", flush=True)
+            except KeyboardInterrupt:
+                # Ctrl-C stops only this answer; what was printed stays in the history, marked incomplete
+                print("\n\n⏹️ Stopped. Ask something else, or 'quit' to exit.")
+                continue
+            agent.last_timings = stream.result["timings"]
+            print(format_timings(agent.last_timings, stream.result["prompt"], stream.result["usage"]))
             
+        except RateLimitTimeout:
+            print("\n⏳ The study buddy is busy right now. Please try again in a moment.")
         except KeyboardInterrupt:
             print("\n\n👋 Goodbye!")
             break
@@ -0,0 +1,237 @@
+"""Generate study material in bulk from a file of jobs.
+
+Each job is a topic, an intent and a difficulty, read from JSONL or CSV:
+
+    {"topic": "photosynthesis", "intent": "quiz", "difficulty": "beginner"}
+
+    topic,intent,difficulty
+    photosynthesis,quiz,beginner
+
+Plans are built with `TaskPlanner.create_plan` directly (no parsing step) and
+answers are generated with bounded concurrency at background priority, so
+the shared rate limiter paces the run. Every result is appended to the
+output JSONL as soon as it is ready; rerunning with the same output file
+skips jobs that already succeeded.
+
+    python batch.py syllabus.jsonl --output materials.jsonl --concurrency 8
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Set
+
+from agent import OutputGenerator, Priority, TaskPlanner, get_tracer
+from agent.tracing import activate
+from config import Config
+
+DIFFICULTIES = ["beginner", "intermediate", "advanced"]
+
+
+def read_jobs(path: str) -> Iterator[Dict]:
+    """Yield jobs from a JSONL or CSV file (chosen by extension)."""
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            yield from csv.DictReader(f)
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def normalize_job(raw: Dict, planner: TaskPlanner) -> Dict:
+    """Validate a job and give it a stable id, so reruns recognise finished jobs."""
+    topic = str(raw.get("topic") or "").strip()
+    intent = str(raw.get("intent") or "explain").strip().lower()
+    difficulty = str(raw.get("difficulty") or "intermediate").strip().lower()
+    if not topic:
+        raise ValueError("missing topic")
+    if intent not in planner.task_templates:
+        raise ValueError(f"unknown intent {intent!r}")
+    if difficulty not in DIFFICULTIES:
+        raise ValueError(f"unknown difficulty {difficulty!r}")
+    job_id = str(raw.get("id") or "").strip() or hashlib.sha256(
+        json.dumps([topic.lower(), intent, difficulty]).encode("utf-8")
+    ).hexdigest()[:16]
+    return {"id": job_id, "topic": topic, "intent": intent, "difficulty": difficulty}
+
+
+def completed_ids(path: str) -> Set[str]:
+    """Ids of jobs with a successful result in an existing output file."""
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by a crash; the job will run again
+                continue
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+class BatchRunner:
+    """Runs jobs through the planner and generator and appends each result to a JSONL file."""
+
+    def __init__(self, output_path: str, concurrency: int, generator: Optional[OutputGenerator] = None):
+        self.output_path = output_path
+        self.concurrency = concurrency
+        self.planner = TaskPlanner()
+        self.generator = generator or OutputGenerator()
+        self.tracer = get_tracer()
+        self._lock = threading.Lock()
+        self.counters = Counter()
+        self.sources = Counter()
+        self.start = time.monotonic()
+
+    def run_job(self, job: Dict) -> Dict:
+        plan = self.planner.create_plan(intent=job["intent"], topic=job["topic"], difficulty=job["difficulty"])
+        trace = self.tracer.start_trace(parse_mode="batch", intent=job["intent"])
+        with activate(trace):
+            try:
+                with trace.span("output_generator"):
+                    response = self.generator.generate_response(plan, priority=Priority.BACKGROUND)
+            except Exception as e:
+                trace.set(error=type(e).__name__)
+                record = trace.finish()
+                return {**job, "status": "error", "error": f"{type(e).__name__}: {e}", "usage": record["usage"]}
+        record = trace.finish()
+        return {
+            **job,
+            "status": "ok",
+            "task_type": plan["task_type"],
+            "response": response,
+            "answer_source": record["attributes"].get("answer_source"),
+            "usage": record["usage"],
+            "duration_ms": record["timings"]["total"]
+        }
+
+    def run(self, jobs: List[Dict], progress_interval: float = 5.0) -> Dict:
+        """Run `jobs`, keeping at most `concurrency` in flight, and return throughput stats."""
+        total = len(jobs)
+        pending: Set[Future] = set()
+        last_report = time.monotonic()
+        with open(self.output_path, "a", encoding="utf-8") as out, \
+                ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch") as executor:
+            queue = iter(jobs)
+            while True:
+                # Submit lazily so tens of thousands of jobs don't become tens of thousands of futures
+                for job in queue:
+                    pending.add(executor.submit(self.run_job, job))
+                    if len(pending) >= self.concurrency * 2:
+                        break
+                if not pending:
+                    break
+                try:
+                    finished, pending = wait(pending, timeout=progress_interval, return_when=FIRST_COMPLETED)
+                except KeyboardInterrupt:
+                    # Let the jobs already generating finish; the queued ones run on resume
+                    for future in pending:
+                        future.cancel()
+                    raise
+                for future in finished:
+                    self._write(out, future.result())
+                if time.monotonic() - last_report >= progress_interval:
+                    print(self.progress(total), file=sys.stderr)
+                    last_report = time.monotonic()
+        return self.stats()
+
+    def _write(self, out, result: Dict):
+        with self._lock:
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            # Flush per result so a crash loses at most the jobs still in flight
+            out.flush()
+            self.counters[result["status"]] += 1
+            self.counters["prompt_tokens"] += result["usage"]["prompt_tokens"]
+            self.counters["completion_tokens"] += result["usage"]["completion_tokens"]
+            if result["status"] == "ok":
+                self.sources[result["answer_source"] or "unknown"] += 1
+
+    def progress(self, total: int) -> str:
+        stats = self.stats()
+        done = stats["ok"] + stats["errors"]
+        remaining = total - done
+        eta = f"{remaining / stats['jobs_per_minute']:.1f} min" if stats["jobs_per_minute"] else "?"
+        return (
+            f"[{done}/{total}] {stats['jobs_per_minute']:.1f} jobs/min, "
+            f"{stats['tokens_per_minute']:.0f} tokens/min, {stats['errors']} errors, ETA {eta}"
+        )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            elapsed = time.monotonic() - self.start
+            done = self.counters["ok"] + self.counters["error"]
+            tokens = self.counters["prompt_tokens"] + self.counters["completion_tokens"]
+            return {
+                "ok": self.counters["ok"],
+                "errors": self.counters["error"],
+                "elapsed_s": round(elapsed, 1),
+                "jobs_per_minute": round(done * 60 / elapsed, 1) if elapsed else 0.0,
+                "tokens_per_minute": round(tokens * 60 / elapsed, 1) if elapsed else 0.0,
+                "prompt_tokens": self.counters["prompt_tokens"],
+                "completion_tokens": self.counters["completion_tokens"],
+                "answer_sources": dict(self.sources)
+            }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("jobs", help="JSONL or CSV file of topic/intent/difficulty jobs")
+    arg_parser.add_argument("--output", "-o", help="results JSONL (default: <jobs>.results.jsonl)")
+    arg_parser.add_argument("--concurrency", "-c", type=int, default=8, help="jobs generated at once")
+    arg_parser.add_argument("--progress-interval", type=float, default=5.0, help="seconds between progress lines")
+    args = arg_parser.parse_args()
+
+    output = args.output or os.path.splitext(args.jobs)[0] + ".results.jsonl"
+    concurrency = max(1, args.concurrency)
+    if Config.RATE_LIMIT_RPM > 0:
+        # More jobs in flight than the limiter can serve within the queue timeout would just time out
+        ceiling = max(1, int(Config.RATE_LIMIT_RPM * Config.REQUEST_QUEUE_TIMEOUT / 60))
+        if concurrency > ceiling:
+            print(f"⚠️ Limiting concurrency to {ceiling} to stay within RATE_LIMIT_RPM", file=sys.stderr)
+            concurrency = ceiling
+    runner = BatchRunner(output, concurrency)
+
+    jobs: List[Dict] = []
+    seen: Set[str] = set()
+    done = completed_ids(output)
+    invalid = 0
+    for line_number, raw in enumerate(read_jobs(args.jobs), start=1):
+        try:
+            job = normalize_job(raw, runner.planner)
+        except ValueError as e:
+            print(f"⚠️ Skipping job {line_number}: {e}", file=sys.stderr)
+            invalid += 1
+            continue
+        if job["id"] in done or job["id"] in seen:
+            continue
+        seen.add(job["id"])
+        jobs.append(job)
+
+    print(
+        f"📦 {len(jobs)} jobs to run, {len(done)} already done, {invalid} invalid -> {output}",
+        file=sys.stderr
+    )
+    try:
+        stats = runner.run(jobs, args.progress_interval)
+    except KeyboardInterrupt:
+        print("\n⏸️ Interrupted; rerun the same command to resume.", file=sys.stderr)
+        sys.exit(130)
+    print(f"✅ {stats['ok']} done, {stats['errors']} failed in {stats['elapsed_s']}s", file=sys.stderr)
+    print(json.dumps(stats, indent=2))
+    if stats["errors"]:
+        print("Rerun the same command to retry failed jobs.", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
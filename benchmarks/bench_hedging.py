@@ -0,0 +1,108 @@
+"""Measure how hedged requests cut tail latency across several backends.
+
+Starts one fake Groq server per backend, each answering a fraction of
+requests `--slow-factor` times slower, and streams completions through a
+`BackendPool` with hedging off and then on. Reports time-to-first-token and
+total latency percentiles, how often requests were hedged and how many
+extra upstream requests that cost.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_hedging --backends 2 --requests 400 --slow-rate 0.02
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from benchmarks.bench_pipeline import summarize
+from benchmarks.fake_groq_server import FakeGroqServer
+
+
+def configure_environment():
+    """Keep the client-side rate limiter out of the way; must run before `config` is imported."""
+    os.environ["GROQ_API_KEY"] = "fake-key"
+    os.environ["RATE_LIMIT_RPM"] = "0"
+    os.environ["RATE_LIMIT_TPM"] = "0"
+
+
+def run(pool, requests: int, concurrency: int, completion_tokens: int) -> Dict:
+    ttft: List[float] = []
+    total: List[float] = []
+    errors: List[str] = []
+
+    def one(n: int):
+        start = time.perf_counter()
+        try:
+            stream = pool.complete(
+                stream=True,
+                model="llama-3.3-70b-versatile",
+                messages=[{"role": "user", "content": f"Explain photosynthesis ({n})"}],
+                max_tokens=completion_tokens
+            )
+            first = None
+            for _ in stream:
+                if first is None:
+                    first = (time.perf_counter() - start) * 1000
+            ttft.append(first or 0.0)
+            total.append((time.perf_counter() - start) * 1000)
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(requests)))
+    return {"ttft": summarize(ttft), "total": summarize(total), "errors": len(errors), "error_samples": errors[:3]}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--backends", type=int, default=2)
+    arg_parser.add_argument("--requests", type=int, default=400)
+    arg_parser.add_argument("--concurrency", type=int, default=8)
+    arg_parser.add_argument("--latency", type=float, default=0.1, help="fake server seconds to first token")
+    arg_parser.add_argument("--slow-rate", type=float, default=0.02)
+    arg_parser.add_argument("--slow-factor", type=float, default=10.0)
+    arg_parser.add_argument("--tokens-per-second", type=float, default=2000.0)
+    arg_parser.add_argument("--completion-tokens", type=int, default=100)
+    arg_parser.add_argument("--hedge-percentile", type=float, default=0.95)
+    arg_parser.add_argument("--hedge-max-ratio", type=float, default=0.1)
+    args = arg_parser.parse_args()
+
+    configure_environment()
+    from agent.backend_pool import Backend, BackendPool
+    from agent.client import get_client
+
+    print(f"{'mode':>8} {'ttft p50':>9} {'p95':>8} {'p99':>8} {'total p99':>10} {'hedged':>7} {'upstream':>9} {'errors':>6}")
+    for hedge in (False, True):
+        servers = [
+            FakeGroqServer(
+                latency=args.latency, tokens_per_second=args.tokens_per_second,
+                completion_tokens=args.completion_tokens, slow_rate=args.slow_rate,
+                slow_factor=args.slow_factor, seed=n
+            ).start()
+            for n in range(args.backends)
+        ]
+        try:
+            pool = BackendPool(
+                [Backend(f"fake-{n}", get_client("fake-key", server.base_url)) for n, server in enumerate(servers)],
+                hedge=hedge, hedge_percentile=args.hedge_percentile, hedge_max_ratio=args.hedge_max_ratio
+            )
+            result = run(pool, args.requests, args.concurrency, args.completion_tokens)
+            stats = pool.stats()
+            upstream = sum(server.stats()["requests"] for server in servers)
+        finally:
+            for server in servers:
+                server.stop()
+        print(
+            f"{'hedged' if hedge else 'single':>8} {result['ttft']['p50_ms']:>9} {result['ttft']['p95_ms']:>8} "
+            f"{result['ttft']['p99_ms']:>8} {result['total']['p99_ms']:>10} {stats['hedge_rate']:>7.1%} "
+            f"{upstream:>9} {result['errors']:>6}"
+        )
+        for line in result["error_samples"]:
+            print(f"  {line}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Compare the local query parser against the previous intent paths.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_parser [--llm]
+
+Accuracy is also reported on `data/intent_heldout.jsonl`, queries written
+apart from the parser's patterns (difficulty words inside topics, numbers,
+"how to" phrases, small talk); tune the patterns on the main corpus only.
+
+`--llm` also times the LLM parse (needs GROQ_API_KEY and spends quota).
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from typing import Callable, Dict, List
+
+from agent.query_parser import LocalQueryParser
+from config import Config
+
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "data", "intent_corpus.jsonl")
+HELDOUT_PATH = os.path.join(os.path.dirname(__file__), "data", "intent_heldout.jsonl")
+
+
+def legacy_classify_intent(user_input: str) -> str:
+    """The substring chain `InputUnderstanding.classify_intent` used before the local parser."""
+    input_lower = user_input.lower()
+    if "explain" in input_lower or "how" in input_lower:
+        return "explain"
+    elif "summarize" in input_lower or "summary" in input_lower:
+        return "summarize"
+    elif "quiz" in input_lower or "test" in input_lower:
+        return "quiz"
+    elif "define" in input_lower or "what is" in input_lower:
+        return "define"
+    elif "compare" in input_lower or "difference" in input_lower:
+        return "compare"
+    elif "practice" in input_lower or "exercise" in input_lower:
+        return "practice"
+    return "general"
+
+
+def load_corpus(path: str = CORPUS_PATH) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def time_calls(fn: Callable[[str], object], queries: List[str], repeat: int) -> Dict:
+    samples = []
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            fn(query)
+            samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        "mean_us": round(statistics.mean(samples), 2),
+        "p50_us": round(samples[len(samples) // 2], 2),
+        "p99_us": round(samples[int(len(samples) * 0.99) - 1], 2)
+    }
+
+
+def accuracy(predictions: List, expected: List) -> float:
+    return round(sum(p == e for p, e in zip(predictions, expected)) / len(expected), 3)
+
+
+def normalize_topic(topic) -> str:
+    return " ".join(str(topic or "").lower().replace("the ", "").split())
+
+
+def score(corpus: List[Dict], parsed: List[Dict]) -> Dict:
+    return {
+        "intent_accuracy": accuracy([p["intent"] for p in parsed], [r["intent"] for r in corpus]),
+        "topic_accuracy": accuracy(
+            [normalize_topic(p["topic"]) for p in parsed], [normalize_topic(r["topic"]) for r in corpus]
+        ),
+        "difficulty_accuracy": accuracy([p["difficulty"] for p in parsed], [r["difficulty"] for r in corpus])
+    }
+
+
+def bench_llm(corpus: List[Dict]) -> Dict:
+    from agent.input_understanding import InputUnderstanding
+
+    handler = InputUnderstanding()
+    intents, latencies = [], []
+    for row in corpus:
+        start = time.perf_counter()
+        result = handler.parse_with_llm(row["query"])
+        latencies.append((time.perf_counter() - start) * 1e6)
+        intents.append(result.get("intent"))
+    latencies.sort()
+    return {
+        "intent_accuracy": accuracy(intents, [row["intent"] for row in corpus]),
+        "mean_us": round(statistics.mean(latencies), 2),
+        "p50_us": round(latencies[len(latencies) // 2], 2)
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--repeat", type=int, default=200, help="timing passes over the corpus")
+    arg_parser.add_argument("--llm", action="store_true", help="also benchmark the LLM parse")
+    arg_parser.add_argument("--show-errors", action="store_true", help="print misclassified queries")
+    args = arg_parser.parse_args()
+
+    corpus = load_corpus()
+    queries = [row["query"] for row in corpus]
+    parser = LocalQueryParser()
+    parsed = [parser.parse(query) for query in queries]
+    heldout = load_corpus(HELDOUT_PATH)
+    heldout_parsed = [parser.parse(row["query"]) for row in heldout]
+
+    report = {
+        "corpus_size": len(corpus),
+        "legacy_substring": {
+            "intent_accuracy": accuracy([legacy_classify_intent(q) for q in queries], [r["intent"] for r in corpus]),
+            **time_calls(legacy_classify_intent, queries, args.repeat)
+        },
+        "local_parser": {
+            **score(corpus, parsed),
+            "llm_fallback_rate": round(
+                sum(p["confidence"] < Config.PARSER_CONFIDENCE_THRESHOLD for p in parsed) / len(parsed), 3
+            ),
+            **time_calls(parser.parse, queries, args.repeat)
+        },
+        "heldout_size": len(heldout),
+        "local_parser_heldout": score(heldout, heldout_parsed)
+    }
+    if args.llm:
+        report["llm_parse"] = bench_llm(corpus)
+
+    print(json.dumps(report, indent=2))
+
+    if args.show_errors:
+        for row, result in zip(corpus + heldout, parsed + heldout_parsed):
+            if (result["intent"], normalize_topic(result["topic"]), result["difficulty"]) != (
+                row["intent"], normalize_topic(row["topic"]), row["difficulty"]
+            ):
+                print(f"{row['query']!r}: expected {row['intent']}/{row['topic']!r}/{row['difficulty']}, "
+                      f"got {result['intent']}/{result['topic']!r}/{result['difficulty']}")
+
+
+if __name__ == "__main__":
+    main()
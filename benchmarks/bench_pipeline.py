@@ -0,0 +1,278 @@
+"""Drive the agent against the fake Groq server at increasing concurrency.
+
+Measures per-stage latency percentiles, throughput and memory per session
+for both the CLI (`StudyBuddyAgent`) and the Streamlit (`ui.process_query`)
+paths, and writes the results as JSON for comparison between commits.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_pipeline --concurrency 1 4 16 64 --output results.json
+    python -m benchmarks.bench_pipeline --compare results.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.fake_groq_server import FakeGroqServer
+
+
+QUERIES = [
+    "Explain photosynthesis",
+    "Quiz me on World War 2",
+    "What is the difference between DNA and RNA?",
+    "Define machine learning",
+    "Give me practice problems for calculus derivatives",
+    "Summarize the French Revolution"
+]
+
+DEFAULT_OUTPUT = os.path.join("benchmarks", "results", "bench_pipeline.json")
+
+
+class BenchSession(dict):
+    """Stand-in for `st.session_state`: a mapping with attribute access, one per simulated browser."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+def configure_environment(base_url: str, rate_limit: bool):
+    """Point the agent at the fake server; must run before `config` is imported."""
+    os.environ["GROQ_BASE_URL"] = base_url
+    os.environ["GROQ_API_KEY"] = "fake-key"
+    os.environ["RESPONSE_CACHE"] = "0"
+    os.environ["SIMILARITY_CACHE"] = "0"
+    os.environ["PREFETCH"] = "0"
+    if not rate_limit:
+        os.environ["RATE_LIMIT_RPM"] = "0"
+        os.environ["RATE_LIMIT_TPM"] = "0"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return round(ordered[index], 2)
+
+
+def summarize(samples: List[float]) -> Dict:
+    return {
+        "count": len(samples),
+        "p50_ms": percentile(samples, 50),
+        "p95_ms": percentile(samples, 95),
+        "p99_ms": percentile(samples, 99),
+        "max_ms": round(max(samples), 2) if samples else 0.0
+    }
+
+
+def make_runner(path: str, stream: bool) -> Callable[[], Callable[[str], Dict]]:
+    """Return a factory of per-session query functions that return stage timings."""
+    if path == "app":
+        from app import StudyBuddyAgent
+
+        def new_session():
+            agent = StudyBuddyAgent()
+
+            def query(text: str) -> Dict:
+                if stream:
+                    result = agent.stream_query(text)
+                    for _ in result:
+                        pass
+                    return result.result["timings"]
+                agent.process_query(text)
+                return agent.last_timings
+            return query
+        return new_session
+
+    import ui
+
+    def new_ui_session():
+        session = BenchSession()
+        ui.init_session_state(session)
+
+        def query(text: str) -> Dict:
+            if stream:
+                result = ui.stream_query(text, session)
+                for _ in result:
+                    pass
+                return ui.build_result(text, result.result, session)["debug_info"]["timings"]["stages"]
+            return ui.process_query(text, session)["debug_info"]["timings"]["stages"]
+        return query
+    return new_ui_session
+
+
+def run_level(new_session: Callable, concurrency: int, queries_per_session: int, shared_queries: bool) -> Dict:
+    sessions = [new_session() for _ in range(concurrency)]
+    stages: Dict[str, List[float]] = {}
+    wall: List[float] = []
+    errors: List[str] = []
+    lock = threading.Lock()
+
+    def drive(index: int):
+        query = sessions[index]
+        for n in range(queries_per_session):
+            text = QUERIES[(index + n) % len(QUERIES)]
+            if not shared_queries:
+                # Unique text keeps request coalescing out of the measurement
+                text = f"{text} (student {index}, question {n})"
+            start = time.perf_counter()
+            try:
+                timings = query(text)
+            except Exception as e:
+                with lock:
+                    errors.append(f"{type(e).__name__}: {e}")
+                continue
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                wall.append(elapsed)
+                for stage, ms in timings.items():
+                    stages.setdefault(stage, []).append(ms)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(drive, range(concurrency)))
+    duration = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "queries": len(wall),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "duration_s": round(duration, 3),
+        "throughput_qps": round(len(wall) / duration, 2) if duration else 0.0,
+        "wall": summarize(wall),
+        "stages": {stage: summarize(values) for stage, values in sorted(stages.items())}
+    }
+
+
+def measure_session_memory(new_session: Callable, sessions: int, queries_per_session: int) -> Dict:
+    """Bytes allocated per live session after it has answered some queries."""
+    gc.collect()
+    tracemalloc.start()
+    live = []
+    for index in range(sessions):
+        query = new_session()
+        for n in range(queries_per_session):
+            query(f"{QUERIES[n % len(QUERIES)]} (memory probe {index})")
+        live.append(query)
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "sessions": sessions,
+        "queries_per_session": queries_per_session,
+        "bytes_per_session": round(current / sessions),
+        "peak_bytes": peak
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: Dict, baseline_path: str, threshold: float) -> List[str]:
+    """List p95 wall-time and throughput regressions larger than `threshold` (a fraction)."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = []
+    for path, levels in current["results"].items():
+        base_levels = {level["concurrency"]: level for level in baseline.get("results", {}).get(path, [])}
+        for level in levels:
+            base = base_levels.get(level["concurrency"])
+            if base is None:
+                continue
+            old_p95, new_p95 = base["wall"]["p95_ms"], level["wall"]["p95_ms"]
+            if old_p95 and new_p95 > old_p95 * (1 + threshold):
+                regressions.append(f"{path} x{level['concurrency']}: p95 {old_p95}ms -> {new_p95}ms")
+            old_qps, new_qps = base["throughput_qps"], level["throughput_qps"]
+            if old_qps and new_qps < old_qps * (1 - threshold):
+                regressions.append(f"{path} x{level['concurrency']}: throughput {old_qps} -> {new_qps} qps")
+    return regressions
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    arg_parser.add_argument("--queries", type=int, default=5, help="queries per session")
+    arg_parser.add_argument("--paths", nargs="+", choices=["app", "ui"], default=["app", "ui"])
+    arg_parser.add_argument("--stream", action="store_true", help="use the streaming API")
+    arg_parser.add_argument("--shared-queries", action="store_true",
+                            help="let sessions send identical queries (exercises request coalescing)")
+    arg_parser.add_argument("--rate-limit", action="store_true", help="keep the client-side rate limiter on")
+    arg_parser.add_argument("--latency", type=float, default=0.2, help="fake server seconds to first token")
+    arg_parser.add_argument("--tokens-per-second", type=float, default=500.0)
+    arg_parser.add_argument("--completion-tokens", type=int, default=150)
+    arg_parser.add_argument("--error-rate", type=float, default=0.0)
+    arg_parser.add_argument("--throttle-rate", type=float, default=0.0)
+    arg_parser.add_argument("--memory-sessions", type=int, default=20)
+    arg_parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    arg_parser.add_argument("--compare", help="baseline JSON to compare against")
+    arg_parser.add_argument("--threshold", type=float, default=0.1, help="regression tolerance as a fraction")
+    args = arg_parser.parse_args()
+
+    server = FakeGroqServer(
+        latency=args.latency, tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens, error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate, seed=0
+    ).start()
+    configure_environment(server.base_url, args.rate_limit)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": {},
+        "memory": {}
+    }
+    try:
+        for path in args.paths:
+            new_session = make_runner(path, args.stream)
+            report["results"][path] = []
+            for concurrency in args.concurrency:
+                level = run_level(new_session, concurrency, args.queries, args.shared_queries)
+                report["results"][path].append(level)
+                print(f"{path:>3} x{concurrency:<4} {level['throughput_qps']:>8} qps  "
+                      f"p50 {level['wall']['p50_ms']}ms  p95 {level['wall']['p95_ms']}ms  "
+                      f"p99 {level['wall']['p99_ms']}ms  errors {level['errors']}", file=sys.stderr)
+            report["memory"][path] = measure_session_memory(new_session, args.memory_sessions, 3)
+        report["server"] = server.stats()
+    finally:
+        server.stop()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        regressions = compare(report, args.compare, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Load-test the HTTP server at several worker counts.
+
+Starts the fake Groq server, then for each worker count runs `server.py`
+as a subprocess and drives it with concurrent simulated students, each with
+its own session sending queries back to back over a keep-alive connection.
+Reports throughput, latency percentiles and how many queries were refused
+with 503, so scaling with workers (and backpressure) can be seen.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_server --workers 1 2 4 --clients 64 --queries 5
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from benchmarks.bench_pipeline import QUERIES, summarize
+from benchmarks.fake_groq_server import FakeGroqServer
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, workers: int, threads: int, queue_limit: int, base_url: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "GROQ_BASE_URL": base_url,
+        "GROQ_API_KEY": "fake-key",
+        "RESPONSE_CACHE": "0",
+        "SIMILARITY_CACHE": "0",
+        "PREFETCH": "0",
+        "RATE_LIMIT_RPM": "0",
+        "RATE_LIMIT_TPM": "0"
+    }
+    process = subprocess.Popen(
+        [sys.executable, "server.py", "--port", str(port), "--workers", str(workers),
+         "--threads", str(threads), "--queue-limit", str(queue_limit)],
+        env=env, stdout=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            status, body = request(http.client.HTTPConnection("127.0.0.1", port, timeout=5), "GET", "/health")
+            if status == 200 and body["workers"] == workers:
+                return process
+        except OSError:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("server did not start")
+
+
+def request(conn: http.client.HTTPConnection, method: str, path: str, body: Dict = None):
+    payload = json.dumps(body).encode("utf-8") if body is not None else None
+    headers = {"Content-Type": "application/json"} if payload else {}
+    conn.request(method, path, body=payload, headers=headers)
+    response = conn.getresponse()
+    data = response.read()
+    if response.getheader("Content-Type") == "application/x-ndjson":
+        # Streamed: the last line is the final result
+        return response.status, json.loads(data.decode("utf-8").strip().splitlines()[-1])
+    return response.status, json.loads(data)
+
+
+def run_level(port: int, clients: int, queries: int, stream: bool) -> Dict:
+    latencies: List[float] = []
+    counts = {"ok": 0, "busy": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def student(index: int):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+        _, created = request(conn, "POST", "/sessions", {"difficulty": "beginner"})
+        path = f"/sessions/{created['session_id']}/query"
+        for n in range(queries):
+            # Unique text keeps request coalescing out of the measurement
+            text = f"{QUERIES[(index + n) % len(QUERIES)]} (student {index}, question {n})"
+            start = time.perf_counter()
+            status, _ = request(conn, "POST", path, {"text": text, "stream": stream})
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                if status == 200:
+                    counts["ok"] += 1
+                    latencies.append(elapsed)
+                elif status == 503:
+                    counts["busy"] += 1
+                else:
+                    counts["errors"] += 1
+        conn.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(student, range(clients)))
+    duration = time.perf_counter() - start
+    return {
+        **counts,
+        "duration_s": round(duration, 2),
+        "throughput_qps": round(counts["ok"] / duration, 2) if duration else 0.0,
+        "latency": summarize(latencies)
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    arg_parser.add_argument("--clients", type=int, default=64, help="concurrent students")
+    arg_parser.add_argument("--queries", type=int, default=5, help="queries per student")
+    arg_parser.add_argument("--threads", type=int, default=8, help="queries run at once per worker")
+    arg_parser.add_argument("--queue-limit", type=int, default=64, help="queries waiting per worker before 503s")
+    arg_parser.add_argument("--stream", action="store_true")
+    arg_parser.add_argument("--latency", type=float, default=0.2, help="fake server seconds to first token")
+    arg_parser.add_argument("--tokens-per-second", type=float, default=500.0)
+    arg_parser.add_argument("--output", help="write the results as JSON")
+    args = arg_parser.parse_args()
+
+    fake = FakeGroqServer(latency=args.latency, tokens_per_second=args.tokens_per_second, seed=0).start()
+    results = []
+    print(f"{'workers':>7} {'qps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'503s':>6} {'errors':>6}")
+    try:
+        for workers in args.workers:
+            port = free_port()
+            server = start_server(port, workers, args.threads, args.queue_limit, fake.base_url)
+            try:
+                level = run_level(port, args.clients, args.queries, args.stream)
+            finally:
+                server.terminate()
+                server.wait(timeout=10)
+            level["workers"] = workers
+            results.append(level)
+            print(f"{workers:>7} {level['throughput_qps']:>8} {level['latency']['p50_ms']:>8} "
+                  f"{level['latency']['p95_ms']:>8} {level['latency']['p99_ms']:>8} {level['busy']:>6} {level['errors']:>6}")
+    finally:
+        fake.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Measure near-duplicate index lookup latency against index size.
+
+Fills an in-memory `SimilarityIndex` with synthetic topics, then times
+lookups (a mix of paraphrases of stored topics and unseen topics) at each
+size. Also checks that paraphrase pairs are matched and that different
+questions are not, including ones that differ only in a number or a
+qualifier ("What is 2+2" / "What is 3+2", "debt" / "technical debt").
+
+Run from the repository root:
+
+    python -m benchmarks.bench_similarity --sizes 1000 10000 100000
+"""
+import argparse
+import random
+import statistics
+import time
+from typing import List
+
+from agent.query_parser import LocalQueryParser
+from agent.similarity_index import SimilarityIndex
+
+
+TASK_TYPES = ["explanation", "summary", "quiz", "definition", "comparison", "practice"]
+DIFFICULTIES = ["beginner", "intermediate", "advanced"]
+
+SUBJECTS = [
+    "photosynthesis", "cell division", "the french revolution", "world war", "machine learning",
+    "linear algebra", "organic chemistry", "plate tectonics", "supply and demand", "the immune system",
+    "quantum mechanics", "the roman empire", "neural networks", "climate change", "probability"
+]
+ASPECTS = [
+    "basics", "history", "applications", "key terms", "common mistakes", "experiments",
+    "theory", "examples", "formulas", "causes", "effects", "in practice", "part", "chapter"
+]
+
+# (query, paraphrase) pairs that should reuse an answer, and pairs that must not
+PARAPHRASES = [
+    ("Explain photosynthesis", "How does photosynthesis work"),
+    ("Explain photosynthesis", "explain photosynthesis please"),
+    ("Quiz me on the French Revolution", "Test me on French Revolution"),
+    ("Define machine learning", "What is machine-learning"),
+    ("Summarize World War 2", "Give me a summary of World War 2")
+]
+DIFFERENT = [
+    ("Summarize World War 2", "Summarize World War 1"),
+    ("Explain debt", "Explain technical debt"),
+    ("What is 2+2", "What is 3+2"),
+    ("Explain the 3 pillars of Islam", "Explain the 5 pillars of Islam"),
+    ("Explain systems", "Explain expert systems"),
+    ("Summarize income", "Summarize universal basic income"),
+    ("Explain DNA replication", "Explain RNA replication"),
+    ("Explain calculus derivatives", "Explain calculus integrals"),
+    ("Define photosynthesis", "Define cellular respiration"),
+    ("Explain why vaccines are safe", "Explain why vaccines are not safe"),
+    ("Explain plant cells", "Explain animal cells"),
+    ("Explain the causes of World War 1", "Explain the effects of World War 1")
+]
+
+
+def synthetic_topic(rng: random.Random, index: int) -> str:
+    return f"{rng.choice(SUBJECTS)} {rng.choice(ASPECTS)} {index}"
+
+
+def fill(index: SimilarityIndex, size: int, partitions: int, rng: random.Random) -> List[str]:
+    topics = []
+    keys = [(task_type, difficulty) for task_type in TASK_TYPES for difficulty in DIFFICULTIES][:partitions]
+    for n in range(size):
+        topic = synthetic_topic(rng, n)
+        task_type, difficulty = keys[n % len(keys)]
+        index.add(task_type, difficulty, topic, f"answer {n}")
+        topics.append(topic)
+    return topics
+
+
+def time_lookups(index: SimilarityIndex, topics: List[str], partitions: int, lookups: int, rng: random.Random):
+    keys = [(task_type, difficulty) for task_type in TASK_TYPES for difficulty in DIFFICULTIES][:partitions]
+    samples = []
+    for n in range(lookups):
+        if n % 2:
+            position = rng.randrange(len(topics))
+            topic = topics[position]
+            key = keys[position % len(keys)]
+        else:
+            topic = synthetic_topic(rng, len(topics) + n)
+            key = rng.choice(keys)
+        start = time.perf_counter()
+        index.lookup(key[0], key[1], topic)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def check_paraphrases(threshold: float):
+    parser = LocalQueryParser()
+    index = SimilarityIndex(path=":memory:", threshold=threshold)
+
+    def key(query: str):
+        # As `OutputGenerator` keys answers: the parsed intent and the whole question
+        return parser.parse(query)["intent"], "beginner", query
+
+    print(f"\nParaphrase matching at threshold {threshold}:")
+    for pairs, expected in ((PARAPHRASES, True), (DIFFERENT, False)):
+        for stored, asked in pairs:
+            index.clear()
+            index.add(*key(stored), "stored answer")
+            matched = index.lookup(*key(asked)) is not None
+            status = "ok  " if matched == expected else "FAIL"
+            print(f"  {status} {'reuse' if matched else 'miss '}  {stored!r} -> {asked!r}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    arg_parser.add_argument("--lookups", type=int, default=2000)
+    arg_parser.add_argument("--dim", type=int, default=None, help="vector size (defaults to SIMILARITY_DIM)")
+    arg_parser.add_argument("--threshold", type=float, default=None)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    print(f"{'entries':>8} {'partitions':>10} {'insert/s':>9} {'p50 us':>8} {'p99 us':>8} {'hit rate':>8}")
+    for size in args.sizes:
+        # One partition is the worst case; answers normally spread over task types and difficulties
+        for partitions in (1, len(TASK_TYPES) * len(DIFFICULTIES)):
+            rng = random.Random(args.seed)
+            index = SimilarityIndex(path=":memory:", dim=args.dim, threshold=args.threshold, max_entries=size)
+            start = time.perf_counter()
+            topics = fill(index, size, partitions, rng)
+            insert_rate = size / (time.perf_counter() - start)
+            p50, p99 = time_lookups(index, topics, partitions, args.lookups, rng)
+            stats = index.stats()
+            print(f"{size:>8} {partitions:>10} {insert_rate:>9.0f} {p50:>8.1f} {p99:>8.1f} {stats['hit_rate']:>8.1%}")
+
+    check_paraphrases(args.threshold if args.threshold is not None else SimilarityIndex(path=":memory:").threshold)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Measure startup and session creation: import times, first rendered page, per-session setup.
+
+Each import is timed in a fresh interpreter, as a new Streamlit or CLI
+process would pay it; the pure-Python parts (`TaskPlanner`, `StateTracker`)
+must also load without the Groq SDK. The first page is a cold `ui.py` run
+with Streamlit's `AppTest` (Streamlit itself already loaded, as under
+`streamlit run`), followed by a second browser session in the same process.
+Per-session setup is `ui.init_session_state` and `StudyBuddyAgent()` in a
+warm process. Nothing is sent to Groq.
+
+Every measurement has a budget in milliseconds (bytes, for memory); the
+run exits 1 when one is exceeded, so it can gate changes. Override a budget
+with `--budget name=value`.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup [--repeats 5] [--budget first_page_ms=3000]
+"""
+import argparse
+import gc
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Dict, List
+
+
+# Generous enough for a slow laptop; a regression that matters blows well past them
+BUDGETS = {
+    "import_config_ms": 50,
+    "import_pure_ms": 100,
+    "import_app_ms": 1500,
+    "import_ui_ms": 2500,
+    "first_page_ms": 4000,
+    "next_session_page_ms": 1000,
+    "ui_session_setup_ms": 5,
+    "cli_session_setup_ms": 5,
+    "ui_session_bytes": 64 * 1024
+}
+
+IMPORTS = {
+    "import_config_ms": "import config",
+    "import_pure_ms": "from agent import TaskPlanner, StateTracker",
+    "import_app_ms": "import app",
+    "import_ui_ms": "import ui"
+}
+
+# Modules the pure-Python parts must not pull in
+HEAVY_MODULES = ["groq", "httpx", "numpy"]
+
+TIME_IMPORT = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{"ms": elapsed, "loaded": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+TIME_FIRST_PAGE = """
+import json, os, time
+from streamlit.testing.v1 import AppTest
+samples = []
+for _ in range(2):
+    app = AppTest.from_file(os.path.abspath("ui.py"), default_timeout=120)
+    start = time.perf_counter()
+    app.run()
+    samples.append((time.perf_counter() - start) * 1000)
+    if app.exception:
+        raise SystemExit(app.exception[0].message)
+print(json.dumps(samples))
+"""
+
+
+class BenchSession(dict):
+    """Stand-in for `st.session_state`: a mapping with attribute access."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+def configure_environment():
+    """No real key or network is needed; must run before `config` is imported."""
+    os.environ.setdefault("GROQ_API_KEY", "fake-key")
+    os.environ["RESPONSE_CACHE"] = "0"
+    os.environ["SIMILARITY_CACHE"] = "0"
+    os.environ["PREFETCH"] = "0"
+
+
+def run_python(code: str) -> str:
+    completed = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True, env=os.environ
+    )
+    return completed.stdout.strip().splitlines()[-1]
+
+
+def time_imports(repeats: int) -> Dict:
+    results = {}
+    for name, statement in IMPORTS.items():
+        runs = [
+            json.loads(run_python(TIME_IMPORT.format(statement=statement, heavy=HEAVY_MODULES)))
+            for _ in range(repeats)
+        ]
+        results[name] = round(statistics.median(run["ms"] for run in runs), 1)
+        results[name.replace("_ms", "_loaded")] = runs[0]["loaded"]
+    return results
+
+
+def time_first_page(repeats: int) -> Dict:
+    runs = [json.loads(run_python(TIME_FIRST_PAGE)) for _ in range(repeats)]
+    return {
+        "first_page_ms": round(statistics.median(run[0] for run in runs), 1),
+        "next_session_page_ms": round(statistics.median(run[1] for run in runs), 1)
+    }
+
+
+def time_session_setup(sessions: int) -> Dict:
+    import ui
+    from app import StudyBuddyAgent
+
+    # The first session in the process builds the shared components; that is the first page's cost
+    ui.init_session_state(BenchSession())
+    StudyBuddyAgent()
+
+    samples: Dict[str, List[float]] = {"ui": [], "cli": []}
+    live = []
+    for _ in range(sessions):
+        start = time.perf_counter()
+        session = BenchSession()
+        ui.init_session_state(session)
+        samples["ui"].append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        live.append(StudyBuddyAgent())
+        samples["cli"].append((time.perf_counter() - start) * 1000)
+
+    gc.collect()
+    tracemalloc.start()
+    live = [BenchSession() for _ in range(sessions)]
+    for session in live:
+        ui.init_session_state(session)
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "ui_session_setup_ms": round(statistics.median(samples["ui"]), 3),
+        "cli_session_setup_ms": round(statistics.median(samples["cli"]), 3),
+        "ui_session_bytes": round(current / sessions)
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--repeats", type=int, default=5, help="fresh processes per import and first page")
+    arg_parser.add_argument("--sessions", type=int, default=50, help="sessions created for the setup cost")
+    arg_parser.add_argument("--budget", action="append", default=[], metavar="NAME=VALUE",
+                            help="override a budget, e.g. first_page_ms=3000")
+    arg_parser.add_argument("--output", help="write the results as JSON")
+    args = arg_parser.parse_args()
+
+    budgets = dict(BUDGETS)
+    for override in args.budget:
+        name, _, value = override.partition("=")
+        if name not in budgets:
+            arg_parser.error(f"unknown budget {name!r}; one of {', '.join(budgets)}")
+        budgets[name] = float(value)
+
+    configure_environment()
+    results = {**time_imports(args.repeats), **time_first_page(args.repeats), **time_session_setup(args.sessions)}
+
+    failures = []
+    if results["import_pure_loaded"]:
+        failures.append(f"TaskPlanner/StateTracker import loaded {', '.join(results['import_pure_loaded'])}")
+    print(f"{'measurement':<24} {'value':>10} {'budget':>10}")
+    for name, budget in budgets.items():
+        value = results[name]
+        over = value > budget
+        if over:
+            failures.append(f"{name} {value} > {budget:g}")
+        print(f"{name:<24} {value:>10} {budget:>10g}{'  OVER' if over else ''}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "budgets": budgets, "results": results}, f, indent=2)
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Measure StateTracker memory per turn against the original dict-based history.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_state_memory [--turns 2000]
+"""
+import argparse
+import gc
+import json
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict
+
+from agent.state_tracker import StateTracker
+
+
+RESPONSE = (
+    "Photosynthesis is the process by which green plants use sunlight, water and carbon dioxide "
+    "to make glucose and release oxygen. "
+) * 40
+
+
+class LegacyStateTracker:
+    """The unbounded list-of-dicts history StateTracker kept before compact records."""
+
+    def __init__(self):
+        self.conversation_history = []
+        self.current_topic = None
+        self.topics_covered = []
+
+    def update_state(self, user_input: str, parsed_input: dict, response: str):
+        self.conversation_history.append({
+            "timestamp": datetime.now().isoformat(),
+            "user_input": user_input,
+            "parsed": parsed_input,
+            "response": response
+        })
+        if self.current_topic and self.current_topic not in self.topics_covered:
+            self.topics_covered.append(self.current_topic)
+
+    def set_topic(self, topic: str):
+        self.current_topic = topic
+
+
+def simulate(factory: Callable, turns: int) -> Dict:
+    gc.collect()
+    tracemalloc.start()
+    state = factory()
+    for i in range(turns):
+        user_input = f"Explain photosynthesis step {i}"
+        parsed = {
+            "raw_input": user_input,
+            "parsed": json.dumps({"intent": "explain", "topic": f"photosynthesis step {i}"}),
+            "source": "local",
+            "intent": "explain",
+            "topic": f"photosynthesis step {i}",
+            "difficulty": None,
+            "confidence": 0.95
+        }
+        state.set_topic(user_input)
+        # Fresh strings per turn, as they would arrive from the API
+        state.update_state(user_input, parsed, RESPONSE + str(i))
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    report = {
+        "resident_bytes": current,
+        "peak_bytes": peak,
+        "bytes_per_turn": round(current / turns)
+    }
+    recent = getattr(state, "recent_turns", None)
+    report["turns_in_memory"] = len(recent) if recent is not None else turns
+    spilled = getattr(state, "spilled", None)
+    if spilled is not None:
+        report["spilled_turns"] = len(spilled)
+        report["spill_file_bytes"] = spilled.bytes_written
+        spilled.close()
+    return report
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--turns", type=int, default=2000)
+    args = arg_parser.parse_args()
+
+    report = {
+        "turns": args.turns,
+        "response_chars": len(RESPONSE),
+        "legacy_dict_history": simulate(LegacyStateTracker, args.turns),
+        "compact_state_tracker": simulate(StateTracker, args.turns)
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
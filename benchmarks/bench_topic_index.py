@@ -0,0 +1,95 @@
+"""Measure "what have I studied on X" against session length: topic index vs history scan.
+
+Fills a session with `--lengths` turns over a few hundred topics, then times
+`StateTracker.study_report` (index lookup, loading only the quoted turns)
+against a linear scan of `iter_history` matching every turn's query, which
+is how the question could be answered before the index. Nothing is sent to
+Groq: the history is built directly.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_topic_index --lengths 1000 10000 --lookups 50
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from typing import Dict, List
+
+
+SUBJECTS = [
+    "photosynthesis", "cell division", "newton's laws", "the french revolution", "binary search",
+    "supply and demand", "plate tectonics", "the krebs cycle", "linear regression", "world war one"
+]
+ASPECTS = [
+    "basics", "history", "examples", "common mistakes", "exam questions", "applications",
+    "key terms", "diagrams", "proofs", "summaries", "comparisons", "edge cases", "formulas",
+    "experiments", "misconceptions", "timelines", "definitions", "case studies", "practice problems",
+    "real world uses", "vocabulary", "advanced ideas", "quick facts", "review notes", "mnemonics",
+    "derivations", "visual aids", "analogies", "glossary", "overview"
+]
+RESPONSE = "Photosynthesis turns light, water and carbon dioxide into glucose and oxygen. " * 20
+
+
+def configure_environment():
+    """No real key or network is needed; must run before `config` is imported."""
+    os.environ.setdefault("GROQ_API_KEY", "fake-key")
+
+
+def build_history(turns: int):
+    from agent.state_tracker import StateTracker
+
+    state = StateTracker()
+    for i in range(turns):
+        subject = SUBJECTS[i % len(SUBJECTS)]
+        aspect = ASPECTS[(i // len(SUBJECTS)) % len(ASPECTS)]
+        user_input = f"Explain the {aspect} of {subject}"
+        state.set_topic(user_input)
+        state.update_state(user_input, {"intent": "explain", "topic": state.current_topic}, f"{RESPONSE}({i})")
+    return state
+
+
+def scan_report(state, topic: str) -> List[str]:
+    """The questions of every turn whose query mentions `topic`, found by reading the whole history."""
+    needle = topic.lower()
+    return [turn.user_input for turn in state.iter_history() if needle in turn.user_input.lower()]
+
+
+def time_lookups(state, lookups: int) -> Dict:
+    samples = {"index": [], "scan": []}
+    for i in range(lookups):
+        topic = SUBJECTS[i % len(SUBJECTS)]
+        start = time.perf_counter()
+        state.study_report(topic)
+        samples["index"].append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        scan_report(state, topic)
+        samples["scan"].append((time.perf_counter() - start) * 1000)
+    return {mode: round(statistics.median(values), 3) for mode, values in samples.items()}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--lengths", type=int, nargs="+", default=[1000, 10000])
+    arg_parser.add_argument("--lookups", type=int, default=50)
+    arg_parser.add_argument("--output", help="write the results as JSON")
+    args = arg_parser.parse_args()
+
+    configure_environment()
+    results = []
+    print(f"{'turns':>6} {'topics':>7} {'index ms':>9} {'scan ms':>9}")
+    for turns in args.lengths:
+        state = build_history(turns)
+        result = {"turns": turns, "topics": len(state.topics), **time_lookups(state, args.lookups)}
+        state.reset()
+        results.append(result)
+        print(f"{turns:>6} {result['topics']:>7} {result['index']:>9} {result['scan']:>9}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
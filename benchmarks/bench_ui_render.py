@@ -0,0 +1,96 @@
+"""Measure Streamlit rerun time of ui.py against session length.
+
+Fills a session's history with `--lengths` turns, then times reruns of the
+whole script with Streamlit's `AppTest`, rendering every message
+(`CHAT_PAGE_TURNS=0`, how the chat used to render) and then only the
+windowed, paged chat. Nothing is sent to Groq: the history is built directly.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_ui_render --lengths 10 100 500 --reruns 5
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from typing import Dict, List
+
+
+RESPONSE = (
+    "**Photosynthesis** is the process by which green plants use sunlight, water and carbon dioxide "
+    "to make glucose and release oxygen.\n\n"
+    "1. Light reactions in the thylakoids\n"
+    "2. The Calvin cycle in the stroma\n\n"
+) * 8
+
+
+def configure_environment():
+    """No real key or network is needed; must run before `config` is imported."""
+    os.environ.setdefault("GROQ_API_KEY", "fake-key")
+    os.environ["RESPONSE_CACHE"] = "0"
+    os.environ["SIMILARITY_CACHE"] = "0"
+    os.environ["PREFETCH"] = "0"
+
+
+def build_history(turns: int):
+    from agent.state_tracker import StateTracker
+
+    state = StateTracker()
+    for i in range(turns):
+        user_input = f"Explain photosynthesis step {i}"
+        state.set_topic(user_input)
+        state.update_state(user_input, {"intent": "explain", "topic": user_input}, f"{RESPONSE}({i})")
+    return state
+
+
+def time_reruns(turns: int, page_turns: int, reruns: int) -> Dict:
+    from streamlit.testing.v1 import AppTest
+    from config import Config
+
+    Config.CHAT_PAGE_TURNS = page_turns
+    app = AppTest.from_file(os.path.abspath("ui.py"), default_timeout=120)
+    app.session_state["agent_state"] = build_history(turns)
+    samples: List[float] = []
+    # The first run also creates the session's components; it is timed like the rest
+    for _ in range(reruns):
+        start = time.perf_counter()
+        app.run()
+        samples.append((time.perf_counter() - start) * 1000)
+        if app.exception:
+            raise RuntimeError(app.exception[0].message)
+    rendered = sum(1 for _ in app.get("chat_message"))
+    app.session_state["agent_state"].reset()
+    return {
+        "turns": turns,
+        "messages_rendered": rendered,
+        "rerun_ms_median": round(statistics.median(samples), 1),
+        "rerun_ms_max": round(max(samples), 1)
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--lengths", type=int, nargs="+", default=[10, 100, 500])
+    arg_parser.add_argument("--reruns", type=int, default=5)
+    arg_parser.add_argument("--page-turns", type=int, default=10, help="CHAT_PAGE_TURNS of the windowed run")
+    arg_parser.add_argument("--output", help="write the results as JSON")
+    args = arg_parser.parse_args()
+
+    configure_environment()
+    results = {"full": [], "windowed": []}
+    print(f"{'turns':>6} {'mode':>9} {'messages':>9} {'median ms':>10} {'max ms':>8}")
+    for turns in args.lengths:
+        for mode, page_turns in (("full", 0), ("windowed", args.page_turns)):
+            result = time_reruns(turns, page_turns, args.reruns)
+            results[mode].append(result)
+            print(f"{turns:>6} {mode:>9} {result['messages_rendered']:>9} "
+                  f"{result['rerun_ms_median']:>10} {result['rerun_ms_max']:>8}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
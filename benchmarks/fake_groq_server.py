@@ -0,0 +1,295 @@
+"""Local stand-in for the Groq chat-completions endpoint.
+
+Serves `POST /openai/v1/chat/completions` (plain and streamed) with
+configurable latency, token rate and injected errors, so the agent can be
+benchmarked without spending API quota. Point the agent at it with
+GROQ_BASE_URL=http://127.0.0.1:<port>.
+
+    python -m benchmarks.fake_groq_server --port 8765 --latency 0.4 --tokens-per-second 200
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+
+WORDS = (
+    "photosynthesis converts light energy into chemical energy stored in glucose while releasing oxygen "
+    "as a by product plants algae and some bacteria rely on chlorophyll to capture sunlight"
+).split()
+
+
+class FakeGroqServer:
+    """Threaded HTTP server that answers chat completions after a simulated delay.
+
+    - latency: seconds before the first token, with +/- `jitter` as a fraction
+    - tokens_per_second: generation speed after the first token (0 = instant)
+    - completion_tokens: tokens per answer, capped by the request's max_tokens
+    - error_rate / throttle_rate: fraction of requests answered with 500 / 429
+    - slow_rate / slow_factor: fraction of requests whose latency is multiplied
+    - failing_models: models every request to which is answered with 500
+    - completion_size: called with each request body; a number it returns
+      replaces completion_tokens for that request (e.g. a replayed size)
+
+    Quiz prompts (`agent.quiz`) are answered with the JSON Lines questions they ask for.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.3,
+        jitter: float = 0.2,
+        tokens_per_second: float = 300.0,
+        completion_tokens: int = 200,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_factor: float = 5.0,
+        failing_models: Optional[List[str]] = None,
+        completion_size: Optional[Callable[[Dict], Optional[int]]] = None,
+        seed: Optional[int] = None
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self.failing_models = set(failing_models or [])
+        self.completion_size = completion_size
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counters = {
+            "requests": 0,
+            "streams": 0,
+            "errors_injected": 0,
+            "throttles_injected": 0,
+            "in_flight": 0,
+            "max_in_flight": 0,
+            "completion_tokens": 0
+        }
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeGroqServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-groq", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "FakeGroqServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return dict(self.counters)
+
+    def _count(self, name: str, amount: int = 1):
+        with self.lock:
+            self.counters[name] += amount
+            if name == "in_flight":
+                self.counters["max_in_flight"] = max(self.counters["max_in_flight"], self.counters["in_flight"])
+
+    def _quiz_lines(self, count: int) -> str:
+        lines = []
+        for _ in range(count):
+            with self.lock:
+                n = self.random.randrange(10 ** 9)
+            if n % 2:
+                question = {"q": f"Which pigment captures light in photosynthesis ({n})?",
+                            "o": ["Chlorophyll", "Hemoglobin", "Keratin", "Melanin"], "a": "A",
+                            "e": "Chlorophyll absorbs red and blue light."}
+            else:
+                question = {"q": f"What gas do plants release during photosynthesis ({n})?", "a": "oxygen",
+                            "e": "Oxygen comes from splitting water."}
+            lines.append(json.dumps(question))
+        return "\n".join(lines) + "\n"
+
+    def _first_token_delay(self) -> float:
+        delay = self.latency * (1 + self.random.uniform(-self.jitter, self.jitter))
+        if self.slow_rate and self.random.random() < self.slow_rate:
+            delay *= self.slow_factor
+        return max(0.0, delay)
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "not found"}})
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                server._count("requests")
+                server._count("in_flight")
+                try:
+                    self._complete(body)
+                finally:
+                    server._count("in_flight", -1)
+
+            def _complete(self, body: Dict):
+                if body.get("model") in server.failing_models:
+                    server._count("errors_injected")
+                    self._send_json(500, {"error": {"message": "Model unavailable", "type": "internal_server_error"}})
+                    return
+                roll = server.random.random()
+                if roll < server.throttle_rate:
+                    server._count("throttles_injected")
+                    self._send_json(429, {"error": {"message": "Rate limit reached", "type": "tokens"}},
+                                    {"retry-after": "1"})
+                    return
+                if roll < server.throttle_rate + server.error_rate:
+                    server._count("errors_injected")
+                    self._send_json(500, {"error": {"message": "Injected failure", "type": "internal_server_error"}})
+                    return
+
+                tokens = server.completion_tokens
+                if server.completion_size is not None:
+                    tokens = server.completion_size(body) or tokens
+                tokens = min(tokens, int(body.get("max_tokens") or tokens))
+                prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+                words = [WORDS[i % len(WORDS)] for i in range(tokens)]
+                quiz = re.search(r"Write (\d+) .*quiz question", str(body.get("messages", [{}])[-1].get("content", "")))
+                if quiz:
+                    # Quiz prompts get the JSON Lines they ask for
+                    words = server._quiz_lines(int(quiz.group(1))).split(" ")[:max(tokens, 1)]
+                    tokens = len(words)
+                usage = {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": tokens,
+                    "total_tokens": prompt_tokens + tokens
+                }
+                server._count("completion_tokens", tokens)
+                time.sleep(server._first_token_delay())
+
+                if body.get("stream"):
+                    server._count("streams")
+                    self._stream(body, words, usage)
+                    return
+                if server.tokens_per_second:
+                    time.sleep(tokens / server.tokens_per_second)
+                self._send_json(200, {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": " ".join(words)},
+                        "finish_reason": "stop"
+                    }],
+                    "usage": usage
+                })
+
+            def _stream(self, body: Dict, words, usage: Dict):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self._rate_limit_headers()
+                self.end_headers()
+                interval = 1 / server.tokens_per_second if server.tokens_per_second else 0
+                try:
+                    for i, word in enumerate(words):
+                        self._event(self._chunk(body, {"content": word if i == 0 else " " + word}))
+                        if interval:
+                            time.sleep(interval)
+                    final = self._chunk(body, {}, finish_reason="stop")
+                    final["x_groq"] = {"id": "req-fake", "usage": usage}
+                    self._event(final)
+                    self._write_chunk(b"data: [DONE]\n\n")
+                    self._write_chunk(b"")
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client cancelled the stream
+                    self.close_connection = True
+
+            @staticmethod
+            def _chunk(body: Dict, delta: Dict, finish_reason: Optional[str] = None) -> Dict:
+                return {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+                }
+
+            def _event(self, payload: Dict):
+                self._write_chunk(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+
+            def _write_chunk(self, data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def _send_json(self, status: int, payload: Dict, headers: Optional[Dict] = None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self._rate_limit_headers()
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _rate_limit_headers(self):
+                self.send_header("x-ratelimit-limit-tokens", "1000000")
+                self.send_header("x-ratelimit-remaining-tokens", "1000000")
+
+        return Handler
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8765)
+    arg_parser.add_argument("--latency", type=float, default=0.3, help="seconds to first token")
+    arg_parser.add_argument("--jitter", type=float, default=0.2, help="latency jitter as a fraction")
+    arg_parser.add_argument("--tokens-per-second", type=float, default=300.0)
+    arg_parser.add_argument("--completion-tokens", type=int, default=200)
+    arg_parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 500 responses")
+    arg_parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of 429 responses")
+    arg_parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of slow responses")
+    arg_parser.add_argument("--slow-factor", type=float, default=5.0)
+    arg_parser.add_argument("--failing-models", nargs="*", default=[], help="models that always return 500")
+    args = arg_parser.parse_args()
+
+    server = FakeGroqServer(
+        host=args.host, port=args.port, latency=args.latency, jitter=args.jitter,
+        tokens_per_second=args.tokens_per_second, completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+        slow_rate=args.slow_rate, slow_factor=args.slow_factor, failing_models=args.failing_models
+    )
+    print(f"Fake Groq server listening on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""Replay recorded traffic through StudyBuddyAgent against the fake Groq server.
+
+Every recorded session gets its own `StudyBuddyAgent`, created when its
+first query is due. Each query is sent as a stand-in question of the
+recorded intent at the recorded time divided by `--speed`, and a session's
+next query waits for its previous answer, as a student would. Every recorded
+topic id becomes one stand-in topic, so a topic asked about again is asked
+about again. The fake server answers each call with the completion size
+recorded for that topic and stage. Queries run on `--workers` threads, like
+the HTTP API's worker threads.
+
+For each speed the replay reports:
+- queueing: how long queries waited past their due time for a worker, and
+  for the rate limiter;
+- the latency distribution, overall and by intent;
+- memory growth (resident set size) over the replay.
+
+Response caches are off, so every speed sends the same upstream load.
+
+Record traffic with TRAFFIC_RECORD_PATH=traffic.jsonl, then run from the
+repository root:
+
+    python -m benchmarks.replay_traffic traffic.jsonl --speeds 1 10 100
+"""
+import argparse
+import heapq
+import json
+import os
+import re
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from benchmarks.bench_pipeline import summarize
+from benchmarks.fake_groq_server import FakeGroqServer
+
+
+# Stand-in questions by recorded intent; the other intents use `TaskPlanner.FOLLOW_UP_PROMPTS`
+QUESTIONS = {
+    "history": "What have I studied on {topic}?",
+    "general": "Help me get started with {topic}"
+}
+QUIZ_ANSWERS = "1 A, 2 oxygen, 3 B, 4 C, 5 A"
+TOPIC_PATTERN = re.compile(r"subject ([0-9a-f]{8})")
+
+
+def configure_environment(base_url: str, rate_limit: bool):
+    """Point the agent at the fake server; must run before `config` is imported."""
+    os.environ["GROQ_BASE_URL"] = base_url
+    os.environ["GROQ_API_KEY"] = "fake-key"
+    os.environ["RESPONSE_CACHE"] = "0"
+    os.environ["SIMILARITY_CACHE"] = "0"
+    # Replayed traffic must not end up in a recording
+    os.environ["TRAFFIC_RECORD_PATH"] = ""
+    if not rate_limit:
+        os.environ["RATE_LIMIT_RPM"] = "0"
+        os.environ["RATE_LIMIT_TPM"] = "0"
+
+
+def rss_bytes() -> int:
+    """Resident set size of this process (its peak, where /proc isn't available)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def question(record: Dict) -> str:
+    """A stand-in for the recorded query, on the stand-in topic of its topic id."""
+    from agent.task_planner import TaskPlanner
+
+    intent = record.get("i") or "general"
+    if intent == "quiz" and record.get("src") == "quiz":
+        return QUIZ_ANSWERS
+    topic = f"subject {record['k']}" if record.get("k") else None
+    if intent == "history" and topic is None:
+        return "What have I studied so far?"
+    topic = topic or f"subject {record['s'][:8]}"
+    if intent in TaskPlanner.FOLLOW_UP_PROMPTS:
+        return f"{TaskPlanner.FOLLOW_UP_PROMPTS[intent]} {topic}"
+    return QUESTIONS.get(intent, QUESTIONS["general"]).format(topic=topic)
+
+
+class CompletionSizes:
+    """Completion tokens recorded per topic id and stage, handed to the fake server by request."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sizes: Dict[tuple, int] = {}
+
+    def remember(self, record: Dict):
+        if not record.get("k"):
+            return
+        by_stage: Dict[str, List[int]] = {}
+        for stage, _, completion, _ in record.get("c", []):
+            if completion:
+                by_stage.setdefault(stage, []).append(completion)
+        with self.lock:
+            for stage, values in by_stage.items():
+                self.sizes[(record["k"], stage)] = round(statistics.mean(values))
+
+    def __call__(self, body: Dict) -> Optional[int]:
+        messages = body.get("messages") or [{}]
+        content = str(messages[-1].get("content", ""))
+        match = TOPIC_PATTERN.search(content)
+        if match is None:
+            return None
+        # The parser's prompt is the only one that asks for JSON about the query
+        stage = "input_understanding" if "Respond in JSON format only" in content else "output_generator"
+        with self.lock:
+            return self.sizes.get((match.group(1), stage))
+
+
+def replay(records: List[Dict], speed: float, workers: int, sizes: CompletionSizes) -> Dict:
+    from app import StudyBuddyAgent
+    from agent import QuestionBank
+
+    sessions: Dict[str, List[Dict]] = {}
+    for record in records:
+        sessions.setdefault(record["s"], []).append(record)
+    origin = records[0]["t"]
+    # Quiz questions banked at one speed must not answer the next speed's quizzes
+    bank = QuestionBank()
+    agents: Dict[str, StudyBuddyAgent] = {}
+
+    condition = threading.Condition()
+    due_queue = [((queries[0]["t"] - origin) / speed, session, 0) for session, queries in sessions.items()]
+    heapq.heapify(due_queue)
+    remaining = [len(records)]
+    samples = {"latency": [], "worker_wait": [], "limiter_wait": [], "setup": []}
+    by_intent: Dict[str, List[float]] = {}
+    replayed = {"upstream_calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+    errors: List[str] = []
+    memory = [(0, rss_bytes())]
+    start = time.perf_counter()
+
+    def run_one(session: str, n: int, due: float):
+        began = time.perf_counter()
+        record = sessions[session][n]
+        try:
+            agent = agents.get(session)
+            if agent is None:
+                agent = agents[session] = StudyBuddyAgent()
+                if agent.quiz is not None:
+                    agent.quiz.bank = bank
+                samples["setup"].append((time.perf_counter() - began) * 1000)
+            sizes.remember(record)
+            query_start = time.perf_counter()
+            if record.get("st"):
+                stream = agent.stream_query(question(record))
+                for _ in stream:
+                    pass
+                result = stream.result
+            else:
+                result = agent.pipeline.run(question(record))
+            latency = (time.perf_counter() - query_start) * 1000
+        except Exception as e:
+            result, latency = None, None
+            with condition:
+                errors.append(f"{type(e).__name__}: {e}")
+        with condition:
+            samples["worker_wait"].append(max(0.0, (began - start - due) * 1000))
+            if result is not None:
+                samples["latency"].append(latency)
+                by_intent.setdefault(record.get("i") or "general", []).append(latency)
+                samples["limiter_wait"].append(result["usage"]["queue_ms"])
+                for name in replayed:
+                    replayed[name] += result["usage"][name]
+            remaining[0] -= 1
+            done = len(records) - remaining[0]
+            if done % max(1, len(records) // 10) == 0:
+                memory.append((done, rss_bytes()))
+            if n + 1 < len(sessions[session]):
+                # The student reads the answer before asking the next question, however late it came
+                next_due = max((sessions[session][n + 1]["t"] - origin) / speed, time.perf_counter() - start)
+                heapq.heappush(due_queue, (next_due, session, n + 1))
+            condition.notify()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="replay") as executor:
+        while True:
+            with condition:
+                if not remaining[0]:
+                    break
+                if not due_queue:
+                    condition.wait()
+                    continue
+                due, session, n = due_queue[0]
+                delay = start + due - time.perf_counter()
+                if delay > 0:
+                    condition.wait(delay)
+                    continue
+                heapq.heappop(due_queue)
+            executor.submit(run_one, session, n, due)
+    duration = time.perf_counter() - start
+
+    for agent in agents.values():
+        if agent.prefetcher is not None:
+            agent.prefetcher.cancel_all()
+    memory.append((len(records), rss_bytes()))
+    recorded = {
+        "upstream_calls": sum(len(record.get("c", [])) for record in records),
+        "prompt_tokens": sum(call[1] or 0 for record in records for call in record.get("c", [])),
+        "completion_tokens": sum(call[2] or 0 for record in records for call in record.get("c", []))
+    }
+    growth = memory[-1][1] - memory[0][1]
+    return {
+        "speed": speed,
+        "sessions": len(sessions),
+        "queries": len(samples["latency"]),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "duration_s": round(duration, 3),
+        "recorded_duration_s": round((records[-1]["t"] - origin) / speed, 3),
+        "throughput_qps": round(len(samples["latency"]) / duration, 2) if duration else 0.0,
+        "latency": summarize(samples["latency"]),
+        "latency_by_intent": {intent: summarize(values) for intent, values in sorted(by_intent.items())},
+        "recorded_latency": summarize([record["ms"] for record in records if record.get("ms") is not None]),
+        "worker_wait": summarize(samples["worker_wait"]),
+        "limiter_wait": summarize(samples["limiter_wait"]),
+        "session_setup": summarize(samples["setup"]),
+        "upstream": {"recorded": recorded, "replayed": replayed},
+        "memory": {
+            "start_bytes": memory[0][1],
+            "end_bytes": memory[-1][1],
+            "growth_bytes": growth,
+            "growth_per_session_bytes": round(growth / len(sessions)),
+            "timeline": memory
+        }
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("traffic", help="a file recorded with TRAFFIC_RECORD_PATH")
+    arg_parser.add_argument("--speeds", type=float, nargs="+", default=[1, 10, 100])
+    arg_parser.add_argument("--workers", type=int, default=64, help="threads answering queries")
+    arg_parser.add_argument("--limit", type=int, help="replay only the first N queries")
+    arg_parser.add_argument("--rate-limit", action="store_true", help="keep the client-side rate limiter on")
+    arg_parser.add_argument("--latency", type=float, default=0.3, help="fake server seconds to first token")
+    arg_parser.add_argument("--tokens-per-second", type=float, default=300.0)
+    arg_parser.add_argument("--error-rate", type=float, default=0.0)
+    arg_parser.add_argument("--output", help="write the results as JSON")
+    args = arg_parser.parse_args()
+
+    sizes = CompletionSizes()
+    server = FakeGroqServer(
+        latency=args.latency, tokens_per_second=args.tokens_per_second, error_rate=args.error_rate,
+        completion_size=sizes, seed=0
+    ).start()
+    configure_environment(server.base_url, args.rate_limit)
+    from agent.traffic import read_traffic
+
+    records = sorted(read_traffic(args.traffic), key=lambda record: record["t"])[:args.limit]
+    if not records:
+        sys.exit(f"No queries recorded in {args.traffic}")
+
+    results = []
+    print(f"{'speed':>6} {'queries':>8} {'qps':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'wait p95':>9} {'limiter p95':>12} {'mem +MB':>8} {'errors':>7}", file=sys.stderr)
+    try:
+        for speed in args.speeds:
+            result = replay(records, speed, args.workers, sizes)
+            results.append(result)
+            print(f"{speed:>5g}x {result['queries']:>8} {result['throughput_qps']:>7} "
+                  f"{result['latency']['p50_ms']:>8} {result['latency']['p95_ms']:>8} "
+                  f"{result['latency']['p99_ms']:>8} {result['worker_wait']['p95_ms']:>9} "
+                  f"{result['limiter_wait']['p95_ms']:>12} "
+                  f"{result['memory']['growth_bytes'] / 2 ** 20:>8.1f} {result['errors']:>7}", file=sys.stderr)
+    finally:
+        server.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "server": server.stats(), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,142 @@
+import json
 import os
-from dotenv import load_dotenv
+from typing import Optional
+
+
+def _find_dotenv() -> Optional[str]:
+    """The .env `load_dotenv()` would load for this file: the nearest one in its directory or above."""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        path = os.path.join(directory, ".env")
+        if os.path.isfile(path):
+            return path
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+_dotenv_path = _find_dotenv()
+if _dotenv_path:
+    # python-dotenv is only imported when there is a file for it to load
+    from dotenv import load_dotenv
+    load_dotenv(_dotenv_path)
+
+
+def _model_routes(defaults: dict) -> dict:
+    """Apply the MODEL_ROUTES (JSON) overrides to the default routes."""
+    routes = {task_type: dict(route) for task_type, route in defaults.items()}
+    for task_type, route in json.loads(os.getenv("MODEL_ROUTES") or "{}").items():
+        routes[task_type] = {**routes.get(task_type, defaults["general"]), **route}
+    return routes
+
+
+def _backends(api_key: str, base_url: str) -> list:
+    """Upstream backends from BACKENDS (a JSON list), else one per key in GROQ_API_KEYS."""
+    if os.getenv("BACKENDS"):
+        backends = json.loads(os.getenv("BACKENDS"))
+        return [{"name": f"backend-{n}", **backend} for n, backend in enumerate(backends, start=1)]
+    keys = [key.strip() for key in os.getenv("GROQ_API_KEYS", "").split(",") if key.strip()]
+    if keys:
+        return [{"name": f"groq-{n}", "api_key": key, "base_url": base_url} for n, key in enumerate(keys, start=1)]
+    return [{"name": "groq", "api_key": api_key, "base_url": base_url}]
 
-load_dotenv()
 
 class Config:
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+    GROQ_BASE_URL = os.getenv("GROQ_BASE_URL")
+    # Each backend: {"name", "api_key", "base_url", "models": {requested model: model served there}}
+    BACKENDS = _backends(GROQ_API_KEY, GROQ_BASE_URL)
+    BACKEND_FAILURE_THRESHOLD = int(os.getenv("BACKEND_FAILURE_THRESHOLD", "3"))
+    BACKEND_COOLDOWN = float(os.getenv("BACKEND_COOLDOWN", "30"))
+    HEDGE_ENABLED = os.getenv("HEDGE", "1") == "1"
+    HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+    HEDGE_INITIAL_DELAY = float(os.getenv("HEDGE_INITIAL_DELAY", "2.0"))
+    HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.1"))
+    HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.1"))
     MODEL_NAME = "llama-3.3-70b-versatile"
     MAX_TOKENS = 2048
     TEMPERATURE = 0.7
+    MODEL_TIERS = {
+        "large": os.getenv("MODEL_LARGE", MODEL_NAME),
+        "small": os.getenv("MODEL_SMALL", "llama-3.1-8b-instant")
+    }
+    # Per task type: model tier, completion token budget and latency target in seconds.
+    # MODEL_ROUTES (JSON) overrides entries, e.g. {"summary": {"tier": "small", "max_tokens": 600}}
+    MODEL_ROUTES = _model_routes({
+        "explanation": {"tier": "large", "max_tokens": 1200, "latency_target": 8.0},
+        "summary": {"tier": "large", "max_tokens": 700, "latency_target": 5.0},
+        "quiz": {"tier": "small", "max_tokens": 700, "latency_target": 5.0},
+        "definition": {"tier": "small", "max_tokens": 300, "latency_target": 2.0},
+        "comparison": {"tier": "large", "max_tokens": 1200, "latency_target": 8.0},
+        "practice": {"tier": "large", "max_tokens": 1500, "latency_target": 10.0},
+        "general": {"tier": "large", "max_tokens": MAX_TOKENS, "latency_target": 10.0}
+    })
+    MODEL_FALLBACK = os.getenv("MODEL_FALLBACK", "1") == "1"
+    MODEL_SLOW_RATIO = float(os.getenv("MODEL_SLOW_RATIO", "2.0"))
+    MODEL_FALLBACK_COOLDOWN = float(os.getenv("MODEL_FALLBACK_COOLDOWN", "60"))
+    PARSE_MODE = os.getenv("PARSE_MODE", "concurrent")
+    PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "8"))
+    CACHE_ENABLED = os.getenv("RESPONSE_CACHE", "1") == "1"
+    CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", os.path.join(".cache", "responses.sqlite3"))
+    CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+    CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+    CACHE_DISK_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_DISK_MAX_ENTRIES", "20000"))
+    CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL", str(24 * 60 * 60)))
+    SIMILARITY_ENABLED = os.getenv("SIMILARITY_CACHE", "1") == "1"
+    SIMILARITY_INDEX_PATH = os.getenv("SIMILARITY_INDEX_PATH", os.path.join(".cache", "similar.sqlite3"))
+    SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.9"))
+    SIMILARITY_DIM = int(os.getenv("SIMILARITY_DIM", "256"))
+    SIMILARITY_MAX_ENTRIES = int(os.getenv("SIMILARITY_MAX_ENTRIES", "100000"))
+    SIMILARITY_TTL_SECONDS = float(os.getenv("SIMILARITY_TTL", str(CACHE_TTL_SECONDS)))
+    HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "200"))
+    HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "50"))
+    HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+    HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))
+    PARSER_CONFIDENCE_THRESHOLD = float(os.getenv("PARSER_CONFIDENCE_THRESHOLD", "0.5"))
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+    CONTEXT_RECENT_TURNS = int(os.getenv("CONTEXT_RECENT_TURNS", "3"))
+    CONTEXT_SUMMARY_TOKENS = int(os.getenv("CONTEXT_SUMMARY_TOKENS", "400"))
+    CONTEXT_MIN_CLIP_TOKENS = int(os.getenv("CONTEXT_MIN_CLIP_TOKENS", "64"))
+    HISTORY_MEMORY_TURNS = int(os.getenv("HISTORY_MEMORY_TURNS", "50"))
+    HISTORY_SPILL_BATCH = int(os.getenv("HISTORY_SPILL_BATCH", "25"))
+    HISTORY_SPILL_DIR = os.getenv("HISTORY_SPILL_DIR")
+    HISTORY_COMPRESSION_LEVEL = int(os.getenv("HISTORY_COMPRESSION_LEVEL", "6"))
+    CHAT_PAGE_TURNS = int(os.getenv("CHAT_PAGE_TURNS", "10"))
+    RATE_LIMIT_RPM = int(os.getenv("RATE_LIMIT_RPM", "30"))
+    RATE_LIMIT_TPM = int(os.getenv("RATE_LIMIT_TPM", "12000"))
+    REQUEST_QUEUE_TIMEOUT = float(os.getenv("REQUEST_QUEUE_TIMEOUT", "60"))
+    # Latency budget of a whole query in seconds (0: none), and the share of it each stage may use
+    QUERY_TIMEOUT = float(os.getenv("QUERY_TIMEOUT", "60"))
+    QUERY_STAGE_BUDGETS = {
+        "input_understanding": float(os.getenv("QUERY_PARSE_BUDGET", "0.25")),
+        "first_token": float(os.getenv("QUERY_FIRST_TOKEN_BUDGET", "0.5"))
+    }
+    RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "4"))
+    RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+    RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "20"))
+    # Off by default: prefetches spend the same RPM/TPM budget as the queries students actually send
+    PREFETCH_ENABLED = os.getenv("PREFETCH", "0") == "1"
+    PREFETCH_COUNT = int(os.getenv("PREFETCH_COUNT", "1"))
+    PREFETCH_MIN_PROBABILITY = float(os.getenv("PREFETCH_MIN_PROBABILITY", "0.3"))
+    PREFETCH_TTL_SECONDS = float(os.getenv("PREFETCH_TTL", "120"))
+    PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "4"))
+    QUIZ_ENABLED = os.getenv("QUIZ", "1") == "1"
+    QUIZ_QUESTIONS = int(os.getenv("QUIZ_QUESTIONS", "5"))
+    QUIZ_PARALLEL = int(os.getenv("QUIZ_PARALLEL", "3"))
+    QUIZ_TOKENS_PER_QUESTION = int(os.getenv("QUIZ_TOKENS_PER_QUESTION", "120"))
+    QUIZ_FUZZY_THRESHOLD = float(os.getenv("QUIZ_FUZZY_THRESHOLD", "0.8"))
+    QUIZ_BANK_TOPICS = int(os.getenv("QUIZ_BANK_TOPICS", "1000"))
+    QUIZ_BANK_PER_TOPIC = int(os.getenv("QUIZ_BANK_PER_TOPIC", "50"))
+    SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+    SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+    SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", str(os.cpu_count() or 2)))
+    SERVER_WORKER_THREADS = int(os.getenv("SERVER_WORKER_THREADS", "16"))
+    SERVER_QUEUE_LIMIT = int(os.getenv("SERVER_QUEUE_LIMIT", "32"))
+    SERVER_SESSION_TTL = float(os.getenv("SERVER_SESSION_TTL", "1800"))
+    SERVER_MAX_SESSIONS = int(os.getenv("SERVER_MAX_SESSIONS", "10000"))
+    SERVER_MAX_UPSTREAM_QUEUE = int(os.getenv("SERVER_MAX_UPSTREAM_QUEUE", "64"))
+    TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH")
+    TRAFFIC_RECORD_PATH = os.getenv("TRAFFIC_RECORD_PATH")
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+    METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
@@ -0,0 +1,614 @@
+"""Serve the study buddy to many students over an HTTP/JSON API.
+
+Sessions are sharded over worker processes by session id: each student's
+`StudyBuddyAgent` (and its `StateTracker`) lives in exactly one worker and
+every request for that session is routed there. The front process is a
+single asyncio event loop that only parses HTTP and relays messages, so it
+never blocks on the model; workers run queries on a thread pool.
+
+    POST   /sessions                   {"difficulty": "beginner"}  -> {"session_id": ...}
+    GET    /sessions/<id>              session summary
+    DELETE /sessions/<id>
+    POST   /sessions/<id>/difficulty   {"level": "advanced"}
+    POST   /sessions/<id>/query        {"text": "Explain photosynthesis", "stream": true}
+    GET    /health
+    GET    /stats
+
+With METRICS_PORT set, the front process serves `GET /metrics` on
+METRICS_HOST:METRICS_PORT, gathering every worker's metrics with a
+`worker` label; the workers themselves don't bind the port.
+
+A streamed query answers with newline-delimited JSON: one {"delta": ...} line
+per piece of text, then {"done": true, ...}. Without streaming the final
+object is returned on its own. A query over its QUERY_TIMEOUT budget ends
+with the partial answer and "truncated": "timeout".
+
+Sessions idle for SERVER_SESSION_TTL seconds are evicted. When a worker
+already has as many queries as it can run plus SERVER_QUEUE_LIMIT waiting,
+or the upstream rate limiter is backed up, queries are refused with 503 and
+a Retry-After header instead of piling up.
+
+    python server.py --workers 4 --port 8000
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from config import Config
+
+MAX_BODY_BYTES = 1024 * 1024
+MAX_HEADERS = 100
+SWEEP_INTERVAL = 30.0
+# How often a connection waiting for a non-streamed answer is checked for a client that went away
+DISCONNECT_POLL_INTERVAL = 0.25
+
+REASONS = {
+    200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+
+# --- Worker processes ------------------------------------------------------
+
+class SessionWorker:
+    """Hosts the sessions of one shard and answers the front process's requests.
+
+    Replies go to `outbox` as (request_id, kind, payload) tuples, where kind is
+    "delta" (streamed text), "done" or "error".
+    """
+
+    def __init__(self, index: int, outbox, threads: int, session_ttl: float, max_sessions: int):
+        from agent.cancellation import CancelToken
+        from agent.rate_limiter import rate_limiter_stats
+        from agent.tracing import get_tracer
+        from app import StudyBuddyAgent
+
+        self.index = index
+        self.outbox = outbox
+        self.session_ttl = session_ttl
+        self.max_sessions = max_sessions
+        self.agent_class = StudyBuddyAgent
+        self.token_class = CancelToken
+        self.limiter_stats = rate_limiter_stats
+        self.tracer = get_tracer()
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix=f"worker-{index}")
+        self.lock = threading.Lock()
+        # Least recently used first
+        self.sessions: "OrderedDict[str, Dict]" = OrderedDict()
+        # Cancel tokens of the queries still running, and the streamed ones whose client has gone
+        self.active = {}
+        self.cancelled = set()
+        self.counters = {"created": 0, "evicted": 0, "queries": 0, "errors": 0, "rejected": 0}
+
+    def submit(self, request_id: int, op: str, session_id: Optional[str], payload: Dict):
+        if op == "cancel":
+            with self.lock:
+                token = self.active.get(payload["request_id"])
+                if token is not None:
+                    self.cancelled.add(payload["request_id"])
+            if token is not None:
+                # Stops the query even while it waits for the model, freeing its upstream connection
+                token.cancel("stopped")
+            return
+        self.executor.submit(self.handle, request_id, op, session_id, payload)
+
+    def handle(self, request_id: int, op: str, session_id: Optional[str], payload: Dict):
+        try:
+            if op == "create":
+                self._reply(request_id, "done", self._create(session_id, payload))
+            elif op == "stats":
+                self._reply(request_id, "done", self.stats())
+            elif op == "metrics":
+                self._reply(request_id, "done", {"text": self.tracer.render_metrics()})
+            elif op == "query":
+                self._query(request_id, session_id, payload)
+            else:
+                self._reply(request_id, "done", self._session_op(op, session_id, payload))
+        except HTTPError as e:
+            self._error(request_id, e.status, e.message, e.retry_after)
+        except Exception as e:
+            with self.lock:
+                self.counters["errors"] += 1
+            self._error(request_id, 500, f"{type(e).__name__}: {e}")
+
+    def sweep(self):
+        """Evict sessions idle for longer than the TTL."""
+        cutoff = time.monotonic() - self.session_ttl
+        with self.lock:
+            idle = [
+                session_id for session_id, session in self.sessions.items()
+                if session["last_used"] < cutoff and not session["busy"]
+            ]
+            for session_id in idle:
+                del self.sessions[session_id]
+            self.counters["evicted"] += len(idle)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            stats = dict(self.counters)
+            stats["sessions"] = len(self.sessions)
+            stats["busy"] = sum(1 for session in self.sessions.values() if session["busy"])
+        limits = self.limiter_stats()
+        stats["worker"] = self.index
+        stats["upstream_queue"] = limits["queue_depth"]
+        stats["upstream_timeouts"] = limits["timeouts"]
+        return stats
+
+    def _create(self, session_id: str, payload: Dict) -> Dict:
+        agent = self.agent_class()
+        if payload.get("difficulty"):
+            agent.set_difficulty(str(payload["difficulty"]))
+        with self.lock:
+            self.sessions[session_id] = {"agent": agent, "last_used": time.monotonic(), "busy": False}
+            self.counters["created"] += 1
+            while len(self.sessions) > self.max_sessions:
+                # Full shard: drop the least recently used idle session
+                victim = next((key for key, session in self.sessions.items() if not session["busy"]), None)
+                if victim is None:
+                    break
+                del self.sessions[victim]
+                self.counters["evicted"] += 1
+        return {"session_id": session_id, "difficulty": agent.state.difficulty_level}
+
+    def _session(self, session_id: str) -> Dict:
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise HTTPError(404, "unknown or expired session")
+        self.sessions.move_to_end(session_id)
+        session["last_used"] = time.monotonic()
+        return session
+
+    def _session_op(self, op: str, session_id: str, payload: Dict) -> Dict:
+        with self.lock:
+            session = self._session(session_id)
+            if op == "delete":
+                del self.sessions[session_id]
+                return {"deleted": session_id}
+        agent = session["agent"]
+        if op == "difficulty":
+            level = str(payload.get("level") or "").lower()
+            if level not in ("beginner", "intermediate", "advanced"):
+                raise HTTPError(400, "level must be beginner, intermediate or advanced")
+            agent.set_difficulty(level)
+        return agent.get_session_info()
+
+    def _query(self, request_id: int, session_id: str, payload: Dict):
+        from agent.rate_limiter import RateLimitTimeout
+
+        text = str(payload.get("text") or "").strip()
+        if not text:
+            raise HTTPError(400, "text is required")
+        with self.lock:
+            session = self._session(session_id)
+            if session["busy"]:
+                raise HTTPError(409, "this session is already answering a query")
+            if self.limiter_stats()["queue_depth"] >= Config.SERVER_MAX_UPSTREAM_QUEUE:
+                # Upstream capacity is used up; queueing more would only time out later
+                self.counters["rejected"] += 1
+                raise HTTPError(503, "upstream capacity exhausted", retry_after=1)
+            session["busy"] = True
+            token = self.active[request_id] = self.token_class.for_query()
+            self.counters["queries"] += 1
+        try:
+            agent = session["agent"]
+            if payload.get("stream"):
+                stream = agent.stream_query(text, token)
+                deltas = iter(stream)
+                for delta in deltas:
+                    if request_id in self.cancelled:
+                        # The client went away; closing the stream abandons the upstream call
+                        deltas.close()
+                        return
+                    self._reply(request_id, "delta", delta)
+                result = stream.result
+            else:
+                result = agent.pipeline.run(text, token)
+            self._reply(request_id, "done", {
+                "done": True,
+                "response": result["response"],
+                "intent": result["intent"],
+                "answer_source": result["answer_source"],
+                "model": result["model"],
+                "truncated": result["truncated"],
+                "timings": result["timings"],
+                "usage": {key: value for key, value in result["usage"].items() if key != "calls"},
+                "trace_id": result["trace_id"]
+            })
+        except RateLimitTimeout:
+            raise HTTPError(503, "upstream capacity exhausted", retry_after=Config.REQUEST_QUEUE_TIMEOUT / 4)
+        finally:
+            with self.lock:
+                session["busy"] = False
+                session["last_used"] = time.monotonic()
+                self.active.pop(request_id, None)
+                self.cancelled.discard(request_id)
+
+    def _reply(self, request_id: int, kind: str, payload):
+        self.outbox.put((request_id, kind, payload))
+
+    def _error(self, request_id: int, status: int, message: str, retry_after: Optional[float] = None):
+        self._reply(request_id, "error", {"status": status, "error": message, "retry_after": retry_after})
+
+
+def worker_main(
+    index: int, workers: int, inbox, outbox, threads: int, session_ttl: float, max_sessions: int, traffic_salt: bytes
+):
+    """Entry point of a worker process."""
+    from agent.traffic import set_traffic_salt
+
+    # Ctrl-C reaches the whole process group; the front process shuts workers down in order
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # The front process serves every worker's metrics on METRICS_PORT
+    Config.METRICS_PORT = 0
+    # Every worker appends to the same recording, so they hash topics alike
+    set_traffic_salt(traffic_salt)
+    # Each process has its own rate limiter, so give each its share of the account's limits
+    if Config.RATE_LIMIT_RPM > 0:
+        Config.RATE_LIMIT_RPM = max(1, Config.RATE_LIMIT_RPM // workers)
+    if Config.RATE_LIMIT_TPM > 0:
+        Config.RATE_LIMIT_TPM = max(1, Config.RATE_LIMIT_TPM // workers)
+    for backend in Config.BACKENDS:
+        for limit in ("rpm", "tpm"):
+            if backend.get(limit):
+                backend[limit] = max(1, int(backend[limit]) // workers)
+    worker = SessionWorker(index, outbox, threads, session_ttl, max_sessions)
+    last_sweep = time.monotonic()
+    while True:
+        try:
+            message = inbox.get(timeout=SWEEP_INTERVAL)
+        except queue.Empty:
+            message = ()
+        if message is None:
+            break
+        if message:
+            worker.submit(*message)
+        if time.monotonic() - last_sweep >= SWEEP_INTERVAL:
+            worker.sweep()
+            last_sweep = time.monotonic()
+    worker.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# --- Front process ---------------------------------------------------------
+
+class StudyBuddyServer:
+    """Accepts HTTP connections and relays requests to the worker owning each session."""
+
+    def __init__(
+        self,
+        workers: int,
+        threads: int,
+        queue_limit: int,
+        session_ttl: float,
+        max_sessions: int
+    ):
+        context = multiprocessing.get_context("spawn")
+        self.outbox = context.Queue()
+        self.inboxes = [context.Queue() for _ in range(workers)]
+        traffic_salt = os.urandom(16)
+        self.processes = [
+            context.Process(
+                target=worker_main,
+                args=(index, workers, inbox, self.outbox, threads, session_ttl, max_sessions, traffic_salt),
+                name=f"study-buddy-worker-{index}",
+                daemon=True
+            )
+            for index, inbox in enumerate(self.inboxes)
+        ]
+        # Queries a worker may hold before new ones are refused: those running plus those waiting
+        self.capacity = threads + queue_limit
+        self.in_flight = [0] * workers
+        self.rejected = 0
+        self.request_ids = itertools.count(1)
+        self.pending: Dict[int, asyncio.Queue] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+
+    def stop(self):
+        for inbox in self.inboxes:
+            inbox.put(None)
+        self.outbox.put(None)
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+    async def serve(self, host: str, port: int):
+        self.loop = asyncio.get_running_loop()
+        threading.Thread(target=self._pump_replies, name="replies", daemon=True).start()
+        if Config.METRICS_PORT:
+            from agent.tracing import start_metrics_server
+
+            start_metrics_server(Config.METRICS_PORT, render=self.render_metrics)
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+    def render_metrics(self) -> str:
+        """Every worker's metrics, labelled by worker; called from the metrics server's threads."""
+        from agent.tracing import merge_metrics
+
+        async def gather():
+            return await asyncio.gather(*(self.call(shard, "metrics") for shard in range(len(self.inboxes))))
+
+        replies = asyncio.run_coroutine_threadsafe(gather(), self.loop).result(timeout=10)
+        return merge_metrics([reply["text"] for reply in replies])
+
+    def shard(self, session_id: str) -> int:
+        # crc32 rather than hash(): stable across processes and restarts
+        return zlib.crc32(session_id.encode("utf-8")) % len(self.inboxes)
+
+    def _pump_replies(self):
+        while True:
+            message = self.outbox.get()
+            if message is None:
+                return
+            self.loop.call_soon_threadsafe(self._dispatch, message)
+
+    def _dispatch(self, message: Tuple):
+        replies = self.pending.get(message[0])
+        if replies is not None:
+            replies.put_nowait(message)
+
+    def _send(self, shard: int, op: str, session_id: Optional[str], payload: Dict) -> Tuple[int, asyncio.Queue]:
+        request_id = next(self.request_ids)
+        replies: asyncio.Queue = asyncio.Queue()
+        self.pending[request_id] = replies
+        self.inboxes[shard].put((request_id, op, session_id, payload))
+        return request_id, replies
+
+    async def call(self, shard: int, op: str, session_id: Optional[str] = None, payload: Optional[Dict] = None) -> Dict:
+        """Send one request to a worker and wait for its final reply."""
+        request_id, replies = self._send(shard, op, session_id, payload or {})
+        try:
+            _, kind, body = await replies.get()
+        finally:
+            self.pending.pop(request_id, None)
+        if kind == "error":
+            raise HTTPError(body["status"], body["error"], body["retry_after"])
+        return body
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except HTTPError as e:
+                    await send_json(writer, e.status, {"error": e.message}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    await self.route(method, path, body, reader, writer, keep_alive)
+                except HTTPError as e:
+                    extra = {"Retry-After": str(max(1, round(e.retry_after)))} if e.retry_after else None
+                    await send_json(writer, e.status, {"error": e.message}, keep_alive, extra)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(
+        self,
+        method: str,
+        path: str,
+        body: Dict,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        keep_alive: bool
+    ):
+        parts = [part for part in path.split("?", 1)[0].split("/") if part]
+        if parts == ["health"] and method == "GET":
+            alive = sum(1 for process in self.processes if process.is_alive())
+            await send_json(writer, 200, {"status": "ok" if alive else "down", "workers": alive}, keep_alive)
+        elif parts == ["stats"] and method == "GET":
+            workers = await asyncio.gather(*(self.call(shard, "stats") for shard in range(len(self.inboxes))))
+            await send_json(writer, 200, {
+                "in_flight": self.in_flight,
+                "capacity_per_worker": self.capacity,
+                "rejected": self.rejected,
+                "workers": workers
+            }, keep_alive)
+        elif parts == ["sessions"] and method == "POST":
+            session_id = uuid.uuid4().hex
+            created = await self.call(self.shard(session_id), "create", session_id, body)
+            await send_json(writer, 201, created, keep_alive)
+        elif len(parts) == 2 and parts[0] == "sessions" and method in ("GET", "DELETE"):
+            op = "info" if method == "GET" else "delete"
+            await send_json(writer, 200, await self.call(self.shard(parts[1]), op, parts[1]), keep_alive)
+        elif len(parts) == 3 and parts[0] == "sessions" and parts[2] == "difficulty" and method == "POST":
+            await send_json(writer, 200, await self.call(self.shard(parts[1]), "difficulty", parts[1], body), keep_alive)
+        elif len(parts) == 3 and parts[0] == "sessions" and parts[2] == "query" and method == "POST":
+            await self.query(parts[1], body, reader, writer, keep_alive)
+        elif parts and parts[0] in ("health", "stats", "sessions"):
+            raise HTTPError(405, f"{method} is not allowed here")
+        else:
+            raise HTTPError(404, "not found")
+
+    async def query(
+        self,
+        session_id: str,
+        body: Dict,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        keep_alive: bool
+    ):
+        shard = self.shard(session_id)
+        if self.in_flight[shard] >= self.capacity:
+            self.rejected += 1
+            raise HTTPError(503, "server busy", retry_after=1)
+        self.in_flight[shard] += 1
+        request_id, replies = self._send(shard, "query", session_id, body)
+        try:
+            if not body.get("stream"):
+                message = await self._reply_unless_disconnected(replies, reader)
+                if message is None:
+                    # The student closed the connection; stop generating for them, as for a stream
+                    self.inboxes[shard].put((0, "cancel", None, {"request_id": request_id}))
+                    raise ConnectionResetError("client disconnected")
+                _, kind, reply = message
+                if kind == "error":
+                    raise HTTPError(reply["status"], reply["error"], reply["retry_after"])
+                await send_json(writer, 200, reply, keep_alive)
+                return
+            await self._stream(shard, request_id, replies, writer, keep_alive)
+        finally:
+            self.pending.pop(request_id, None)
+            self.in_flight[shard] -= 1
+
+    @staticmethod
+    async def _reply_unless_disconnected(replies: asyncio.Queue, reader: asyncio.StreamReader) -> Optional[Tuple]:
+        """Wait for the next reply; return None if the client closes its end first."""
+        reply = asyncio.ensure_future(replies.get())
+        try:
+            while not reply.done():
+                await asyncio.wait({reply}, timeout=DISCONNECT_POLL_INTERVAL)
+                if not reply.done() and reader.at_eof():
+                    return None
+            return reply.result()
+        finally:
+            reply.cancel()
+
+    async def _stream(
+        self, shard: int, request_id: int, replies: asyncio.Queue, writer: asyncio.StreamWriter, keep_alive: bool
+    ):
+        _, kind, reply = await replies.get()
+        if kind == "error":
+            # Nothing sent yet, so the error can still get a proper status line
+            raise HTTPError(reply["status"], reply["error"], reply["retry_after"])
+        writer.write(response_head(200, "application/x-ndjson", keep_alive, {"Transfer-Encoding": "chunked"}))
+        try:
+            while True:
+                if kind == "delta":
+                    line = {"delta": reply}
+                elif kind == "done":
+                    line = reply
+                else:
+                    line = {"error": reply["error"], "status": reply["status"]}
+                await write_chunk(writer, json.dumps(line, ensure_ascii=False) + "\n")
+                if kind != "delta":
+                    break
+                _, kind, reply = await replies.get()
+            await write_chunk(writer, "")
+        except ConnectionError:
+            # The student closed the connection; stop generating for them
+            self.inboxes[shard].put((0, "cancel", None, {"request_id": request_id}))
+            raise
+
+
+async def read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], Dict]]:
+    """Read one HTTP/1.1 request; returns None when the client closed the connection."""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, path, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "malformed request line")
+    headers: Dict[str, str] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        if len(headers) >= MAX_HEADERS:
+            raise HTTPError(400, "too many headers")
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    content_length = headers.get("content-length") or "0"
+    if not content_length.isdecimal():
+        raise HTTPError(400, "invalid Content-Length")
+    length = int(content_length)
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, "request body too large")
+    body: Dict = {}
+    if length:
+        try:
+            body = json.loads(await reader.readexactly(length))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise HTTPError(400, "body must be UTF-8 JSON")
+        if not isinstance(body, dict):
+            raise HTTPError(400, "body must be a JSON object")
+    return method.upper(), path, headers, body
+
+
+def response_head(status: int, content_type: str, keep_alive: bool, extra: Optional[Dict[str, str]] = None) -> bytes:
+    lines = [
+        f"HTTP/1.1 {status} {REASONS.get(status, 'Unknown')}",
+        f"Content-Type: {content_type}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}"
+    ]
+    lines += [f"{name}: {value}" for name, value in (extra or {}).items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def send_json(
+    writer: asyncio.StreamWriter, status: int, payload, keep_alive: bool, extra: Optional[Dict[str, str]] = None
+):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    writer.write(response_head(status, "application/json", keep_alive, {"Content-Length": str(len(body)), **(extra or {})}))
+    writer.write(body)
+    await writer.drain()
+
+
+async def write_chunk(writer: asyncio.StreamWriter, text: str):
+    data = text.encode("utf-8")
+    writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+    # Waits while the client reads slowly, so a stalled reader can't buffer a whole answer in memory
+    await writer.drain()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--host", default=Config.SERVER_HOST)
+    arg_parser.add_argument("--port", type=int, default=Config.SERVER_PORT)
+    arg_parser.add_argument("--workers", type=int, default=Config.SERVER_WORKERS, help="worker processes")
+    arg_parser.add_argument("--threads", type=int, default=Config.SERVER_WORKER_THREADS, help="queries run at once per worker")
+    arg_parser.add_argument("--queue-limit", type=int, default=Config.SERVER_QUEUE_LIMIT,
+                            help="queries waiting per worker before 503s")
+    arg_parser.add_argument("--session-ttl", type=float, default=Config.SERVER_SESSION_TTL)
+    arg_parser.add_argument("--max-sessions", type=int, default=Config.SERVER_MAX_SESSIONS, help="sessions per worker")
+    args = arg_parser.parse_args()
+
+    server = StudyBuddyServer(
+        max(1, args.workers), max(1, args.threads), max(0, args.queue_limit), args.session_ttl, args.max_sessions
+    )
+    server.start()
+    # Treat a service manager's SIGTERM like Ctrl-C, so workers are stopped rather than orphaned
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f"🎓 Study Buddy API on http://{args.host}:{args.port} with {len(server.processes)} workers", flush=True)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
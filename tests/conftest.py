@@ -0,0 +1,10 @@
+import os
+
+# Config reads the environment once, on import: no key, network, caches or background work in tests
+os.environ["GROQ_API_KEY"] = "test-key"
+os.environ["GROQ_BASE_URL"] = "http://127.0.0.1:9"
+os.environ["RESPONSE_CACHE"] = "0"
+os.environ["SIMILARITY_CACHE"] = "0"
+os.environ["PREFETCH"] = "0"
+os.environ["TRAFFIC_RECORD_PATH"] = ""
+os.environ["METRICS_PORT"] = "0"
@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+import groq
+import httpx
+import pytest
+
+from agent.backend_pool import Backend, BackendPool
+from config import Config
+
+REQUEST = httpx.Request("POST", "http://groq.test/chat/completions")
+
+
+def failing_client(error: Exception):
+    def create(**request):
+        raise error
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(
+        with_raw_response=SimpleNamespace(create=create)
+    )))
+
+
+def make_pool(error: Exception) -> BackendPool:
+    return BackendPool(
+        [Backend("a", failing_client(error)), Backend("b", failing_client(error))],
+        hedge=False, failure_threshold=1, cooldown=60
+    )
+
+
+@pytest.mark.parametrize("error", [
+    groq.BadRequestError("bad", response=httpx.Response(400, request=REQUEST), body=None),
+    groq.NotFoundError("missing", response=httpx.Response(404, request=REQUEST), body=None),
+])
+def test_rejected_requests_keep_the_backend_healthy(error):
+    pool = make_pool(error)
+    with pytest.raises(type(error)):
+        pool.complete(model="m", messages=[])
+    backends = pool.stats()["backends"]
+    assert all(backend["healthy"] for backend in backends)
+    # The same request would be rejected anywhere, so it isn't tried on the other backend
+    assert sum(backend["errors"] for backend in backends) == 1 and pool.stats()["failovers"] == 0
+
+
+@pytest.mark.parametrize("error", [
+    groq.InternalServerError("down", response=httpx.Response(503, request=REQUEST), body=None),
+    groq.RateLimitError("slow down", response=httpx.Response(429, request=REQUEST), body=None),
+    groq.APIConnectionError(request=REQUEST),
+    groq.APITimeoutError(request=REQUEST),
+])
+def test_upstream_failures_take_the_backend_out(error, monkeypatch):
+    monkeypatch.setattr(Config, "RETRY_MAX_ATTEMPTS", 1)
+    pool = make_pool(error)
+    with pytest.raises(type(error)):
+        pool.complete(model="m", messages=[])
+    assert not any(backend["healthy"] for backend in pool.stats()["backends"])
+    assert pool.stats()["failovers"] == 1
@@ -0,0 +1,19 @@
+import config
+
+
+def test_single_key_in_groq_api_keys_is_a_backend(monkeypatch):
+    monkeypatch.delenv("BACKENDS", raising=False)
+    monkeypatch.setenv("GROQ_API_KEYS", "only-key")
+    assert config._backends(None, None) == [{"name": "groq-1", "api_key": "only-key", "base_url": None}]
+
+
+def test_several_keys_are_one_backend_each(monkeypatch):
+    monkeypatch.delenv("BACKENDS", raising=False)
+    monkeypatch.setenv("GROQ_API_KEYS", "a, b")
+    assert [backend["api_key"] for backend in config._backends(None, None)] == ["a", "b"]
+
+
+def test_groq_api_key_alone(monkeypatch):
+    monkeypatch.delenv("BACKENDS", raising=False)
+    monkeypatch.delenv("GROQ_API_KEYS", raising=False)
+    assert config._backends("key", "http://x") == [{"name": "groq", "api_key": "key", "base_url": "http://x"}]
@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+
+import groq
+import httpx
+import pytest
+
+from agent.cancellation import CancelToken, activate_token
+from agent.model_router import ModelRouter
+from agent.output_generator import OutputGenerator
+from agent.response_cache import ResponseCache
+from agent.singleflight import SingleFlight
+from agent.task_planner import TaskPlanner
+
+REQUEST = httpx.Request("POST", "http://groq.test/chat/completions")
+
+
+def status_error(cls, status: int):
+    return cls("error", response=httpx.Response(status, request=REQUEST), body=None)
+
+
+def make_router() -> ModelRouter:
+    return ModelRouter(tiers={"large": "big-model", "small": "small-model"}, cooldown=60, fallback=True)
+
+
+PLAN = {"task_type": "explanation", "model_tier": "large"}
+
+
+@pytest.mark.parametrize("error", [
+    status_error(groq.InternalServerError, 503),
+    status_error(groq.RateLimitError, 429),
+    groq.APIConnectionError(request=REQUEST),
+    groq.APITimeoutError(request=REQUEST),
+])
+def test_unhealthy_model_is_taken_out_of_rotation(error):
+    router = make_router()
+    router.record(PLAN, "large", 1.0, error=error)
+    assert router.choose(PLAN) == ["small", "large"]
+
+
+def test_bad_request_keeps_the_tier():
+    router = make_router()
+    router.record(PLAN, "large", 0.1, error=status_error(groq.BadRequestError, 400))
+    assert router.choose(PLAN) == ["large", "small"]
+    assert router.stats()["routes"][0]["errors"] == 1
+
+
+def test_timeout_of_an_expired_query_keeps_the_tier():
+    router = make_router()
+    token = CancelToken(timeout=0.001)
+    token.cancel("timeout")
+    with activate_token(token):
+        router.record(PLAN, "large", 0.1, error=groq.APITimeoutError(request=REQUEST))
+    assert router.choose(PLAN) == ["large", "small"]
+
+
+class Backends:
+    """Backends where the large model may be down; the small one always answers."""
+
+    def __init__(self, large_down: bool):
+        self.large_down = large_down
+
+    def complete(self, priority, **request):
+        if self.large_down and request["model"] == "big-model":
+            raise status_error(groq.InternalServerError, 500)
+        message = SimpleNamespace(content=f"answer from {request['model']}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+@pytest.mark.parametrize("large_down, answer, cached", [
+    (False, "answer from big-model", 1),
+    (True, "answer from small-model", 0),
+])
+def test_only_answers_from_the_planned_model_are_cached(large_down, answer, cached):
+    cache = ResponseCache(path=":memory:", max_entries=10, max_bytes=1 << 20, max_disk_entries=10, ttl=60)
+    generator = OutputGenerator(
+        cache=cache, flights=SingleFlight(), router=make_router(), backends=Backends(large_down)
+    )
+    plan = TaskPlanner().create_plan(intent="explain", topic="Explain photosynthesis", difficulty="beginner")
+    assert generator.generate_response(plan) == answer
+    assert cache.stats()["memory_entries"] == cached
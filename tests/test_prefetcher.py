@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+
+import agent.prefetcher as prefetcher
+from agent.prefetcher import Prefetcher, prefetch_stats
+from agent.state_tracker import StateTracker
+from agent.task_planner import TaskPlanner
+
+
+def test_prefetch_is_off_by_default():
+    env = {name: value for name, value in os.environ.items() if name != "PREFETCH"}
+    enabled = subprocess.run(
+        [sys.executable, "-c", "from config import Config; print(Config.PREFETCH_ENABLED)"],
+        capture_output=True, text=True, check=True, env=env
+    ).stdout.strip()
+    assert enabled == "False"
+
+
+def test_nothing_is_prefetched_while_queries_wait_for_the_rate_limiter(monkeypatch):
+    monkeypatch.setattr(prefetcher, "rate_limiter_stats", lambda: {"queue_depth": 2})
+    monkeypatch.setattr(prefetcher._transitions, "predict", lambda intent, count, probability: [("summarize", 0.9)])
+    submitted = []
+    monkeypatch.setattr(prefetcher, "_get_executor", lambda: submitted.append)
+    before = prefetch_stats()
+
+    Prefetcher(TaskPlanner(), generator=None, state=StateTracker()).schedule("explain", "Explain photosynthesis")
+
+    after = prefetch_stats()
+    assert not submitted
+    assert after["skipped_busy"] == before["skipped_busy"] + 1
+    assert after["scheduled"] == before["scheduled"]
@@ -0,0 +1,71 @@
+import pytest
+
+from agent.query_parser import LocalQueryParser
+
+
+parser = LocalQueryParser()
+
+
+@pytest.mark.parametrize("query, topic", [
+    ("Explain technical debt", "technical debt"),
+    ("What are expert systems?", "expert systems"),
+    ("Summarize universal basic income", "universal basic income"),
+    ("Explain simple harmonic motion", "simple harmonic motion"),
+    ("Explain how to make a cake", "how to make a cake"),
+    ("Quiz me on the 5 pillars of Islam", "5 pillars of Islam"),
+    ("What is 3+2", "3+2"),
+    ("Define 2+2", "2+2"),
+])
+def test_topic_keeps_qualifiers_digits_and_verbs(query, topic):
+    result = parser.parse(query)
+    assert result["topic"] == topic
+    assert result["difficulty"] is None
+
+
+@pytest.mark.parametrize("query, topic, difficulty", [
+    ("Explain simple harmonic motion at an advanced level", "simple harmonic motion", "advanced"),
+    ("Give me a basic explanation of gravity", "gravity", "beginner"),
+    ("Explain game theory in simple terms", "game theory", "beginner"),
+    ("Explain quantum tunneling for beginners", "quantum tunneling", "beginner"),
+])
+def test_difficulty_comes_from_outside_the_topic(query, topic, difficulty):
+    result = parser.parse(query)
+    assert (result["topic"], result["difficulty"]) == (topic, difficulty)
+
+
+@pytest.mark.parametrize("query", ["How are you?", "how is it going", "How are you doing today?"])
+def test_small_talk_is_not_an_explanation(query):
+    result = parser.parse(query)
+    assert (result["intent"], result["topic"]) == ("general", "")
+    assert result["confidence"] < 0.5
+
+
+def test_request_phrasing_is_still_stripped():
+    assert parser.parse("Give me 5 practice problems for calculus")["topic"] == "calculus"
+    assert parser.parse("Make a study plan for chemistry")["topic"] == "study plan for chemistry"
+    assert parser.parse("Explain it")["topic"] == "it"
+
+
+@pytest.mark.parametrize("query, intent, topic", [
+    ("Explain how exercise affects the heart", "explain", "exercise affects the heart"),
+    ("What is the difference quotient", "define", "difference quotient"),
+    ("what is a practice effect in psychology", "define", "practice effect in psychology"),
+    ("What is the summary judgment in law", "define", "summary judgment in law"),
+    ("Explain photosynthesis briefly", "explain", "photosynthesis"),
+])
+def test_trigger_words_inside_the_topic_do_not_decide_the_intent(query, intent, topic):
+    result = parser.parse(query)
+    assert (result["intent"], result["topic"]) == (intent, topic)
+    assert parser.classify_intent(query) == intent
+
+
+@pytest.mark.parametrize("query, intent, topic", [
+    ("What is the difference between mitosis and meiosis", "compare", "mitosis and meiosis"),
+    ("How do viruses differ from bacteria", "compare", "viruses differ from bacteria"),
+    ("Give me a summary of the Cold War", "summarize", "Cold War"),
+    ("Exercises on vectors", "practice", "vectors"),
+    ("Practice calculus", "practice", "calculus"),
+])
+def test_trigger_nouns_still_ask_for_an_intent(query, intent, topic):
+    result = parser.parse(query)
+    assert (result["intent"], result["topic"]) == (intent, topic)
@@ -0,0 +1,91 @@
+import pytest
+
+from agent.quiz import Question, Quiz, QuizEngine, QuestionBank
+
+
+def make_quiz(count: int = 5) -> Quiz:
+    quiz = Quiz("photosynthesis", "intermediate")
+    for i in range(count):
+        if i % 2:
+            quiz.questions.append(Question(f"Question {i + 1}?", "oxygen"))
+        else:
+            quiz.questions.append(Question(f"Question {i + 1}?", "B", ["one", "two", "three", "four"]))
+    return quiz
+
+
+@pytest.mark.parametrize("text", [
+    "2 examples of mitosis please",
+    "3 laws of motion explained",
+    "1 more question about photosynthesis",
+    "5 pillars of Islam",
+])
+def test_numbered_questions_are_not_answers(text):
+    assert make_quiz().parse_answers(text) is None
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1 A, 2 oxygen, 3 B, 4 C, 5 A", {1: "A", 2: "oxygen", 3: "B", 4: "C", 5: "A"}),
+    ("1) b 2) carbon dioxide 3) c", {1: "b", 2: "carbon dioxide", 3: "c"}),
+    ("Answers: 2 oxygen", {2: "oxygen"}),
+    ("my answer - 4 glucose", {4: "glucose"}),
+    ("Answers:\n1: B\n3: three", {1: "B", 3: "three"}),
+])
+def test_answers_are_parsed(text, expected):
+    assert make_quiz().parse_answers(text) == expected
+
+
+def test_remaining_questions_can_be_answered_without_prefix():
+    quiz = make_quiz()
+    quiz.grade({1: "B", 2: "oxygen", 3: "B"})
+    assert quiz.parse_answers("4 glucose, 5 A") == {4: "glucose", 5: "A"}
+    assert quiz.parse_answers("5 pillars of Islam explained in depth please") is None
+
+
+@pytest.mark.parametrize("reply, correct", [
+    ("oxygen", True),
+    ("Oxygen!", True),
+    ("it releases oxygen", True),
+    ("oxyegn", True),
+    ("not oxygen", False),
+    ("it isn't oxygen", False),
+    ("no oxygen", False),
+    ("oxygen-rich air", True),
+    ("hydrogen peroxide", False),
+    ("carbon dioxide", False),
+])
+def test_short_answer_grading(reply, correct):
+    assert Question("What do plants release?", "oxygen").grade(reply) is correct
+
+
+def test_negated_answer_is_accepted_when_it_is_the_answer():
+    assert Question("Is water polar?", "not nonpolar").grade("not nonpolar")
+
+
+def test_multiple_choice_grading():
+    question = Question("Which?", "B", ["one", "two", "three", "four"])
+    assert question.grade("b")
+    assert question.grade("two")
+    assert not question.grade("A")
+
+
+class RecordingEngine(QuizEngine):
+    def __init__(self):
+        super().__init__(generator=None, bank=QuestionBank())
+        self.prompts = []
+
+    def _generate(self, plan, topic, key, count, exclude, context, summary, priority):
+        self.prompts.append(self._messages(plan, topic, count, "key facts", [], None, None)[-1]["content"])
+        self.keys = getattr(self, "keys", []) + [key]
+        return iter([Question("What do plants release?", "oxygen")])
+
+
+@pytest.mark.parametrize("query, phrase, key", [
+    ("Quiz me on technical debt", "about technical debt,", "technical debt"),
+    ("Quiz me on the 5 pillars of Islam", "about 5 pillars of Islam,", "5 pillars of islam"),
+])
+def test_quiz_prompt_keeps_the_topic_phrase(query, phrase, key):
+    engine = RecordingEngine()
+    list(engine.stream({"topic": query, "difficulty": "beginner"}))
+    assert phrase in engine.prompts[0]
+    assert engine.keys == [(key, "beginner")]
+    assert engine.active.topic == phrase[len("about "):-1]
@@ -0,0 +1,43 @@
+from agent import rate_limiter
+from agent.client import get_account_limiter, get_client
+from agent.rate_limiter import RateLimiter, parse_duration, rate_limiter_stats
+
+
+def test_parse_duration():
+    assert parse_duration("7.66s") == 7.66
+    assert parse_duration("2m59.56s") == 179.56
+    assert parse_duration("250ms") == 0.25
+    assert parse_duration("soon") is None
+
+
+def test_headers_only_resize_their_own_account(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "_shared_limiters", {})
+    groq_limiter = get_account_limiter(get_client("key-a", "http://groq.test"))
+    other_limiter = get_account_limiter(get_client("key-b", "http://groq.test"))
+    assert groq_limiter is not other_limiter
+    assert get_account_limiter(get_client("key-a", "http://groq.test")) is groq_limiter
+
+    before = other_limiter.stats()["tokens_per_minute"]
+    groq_limiter.update_from_headers({"x-ratelimit-limit-tokens": "500", "x-ratelimit-remaining-tokens": "100"})
+    assert groq_limiter.stats()["tokens_per_minute"] == 500
+    assert other_limiter.stats()["tokens_per_minute"] == before
+
+
+def test_backend_limits_apply_to_its_account(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "_shared_limiters", {})
+    local = get_account_limiter(get_client("x", "http://127.0.0.1:8001"), rpm=0, tpm=0)
+    assert "requests_per_minute" not in local.stats()
+    assert local.acquire(10 ** 6, deadline=0) < 0.1
+
+
+def test_stats_add_up_over_accounts(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "_shared_limiters", {
+        "a": RateLimiter(rpm=10, tpm=1000),
+        "b": RateLimiter(rpm=20, tpm=2000)
+    })
+    rate_limiter._shared_limiters["a"].acquire(100)
+    stats = rate_limiter_stats()
+    assert stats["requests_per_minute"] == 30
+    assert stats["tokens_per_minute"] == 3000
+    assert stats["granted"] == 1
+    assert set(stats["accounts"]) == {"a", "b"}
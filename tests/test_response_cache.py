@@ -0,0 +1,90 @@
+import time
+
+from agent import response_cache
+from agent.response_cache import ResponseCache
+
+
+def make_cache(**kwargs) -> ResponseCache:
+    options = {"max_entries": 100, "max_bytes": 1 << 20, "max_disk_entries": 100, "ttl": 60}
+    return ResponseCache(path=":memory:", **{**options, **kwargs})
+
+
+def test_round_trip():
+    cache = make_cache()
+    cache.set("k", "answer")
+    assert cache.get("k") == "answer"
+    assert cache.get("missing") is None
+
+
+def test_zero_ttl_is_honoured():
+    cache = make_cache(ttl=0)
+    assert cache.ttl == 0
+    cache.set("k", "answer")
+    assert cache.get("k") is None
+
+
+def test_expires_at_is_indexed():
+    cache = make_cache()
+    indexes = {row[1] for row in cache._db.execute("PRAGMA index_list(responses)")}
+    assert "responses_expires" in indexes
+
+
+def test_disk_is_trimmed_every_interval_not_every_write(monkeypatch):
+    monkeypatch.setattr(response_cache, "DISK_EVICT_INTERVAL", 4)
+    cache = make_cache(max_entries=1, max_disk_entries=2)
+    for n in range(3):
+        cache.set(f"k{n}", "x")
+    assert cache.stats()["disk_entries"] == 3
+    cache.set("k3", "x")
+    assert cache.stats()["disk_entries"] == 2
+
+
+def test_memory_hits_protect_entries_from_disk_eviction(monkeypatch):
+    monkeypatch.setattr(response_cache, "DISK_EVICT_INTERVAL", 4)
+    cache = make_cache(max_entries=10, max_disk_entries=3)
+    for n in range(3):
+        cache.set(f"k{n}", "x")
+        time.sleep(0.01)
+    # k0 is the oldest on disk, but in use from memory
+    time.sleep(0.01)
+    assert cache.get("k0") == "x"
+    cache.set("k3", "x")
+    cache._memory.clear()
+    cache._memory_bytes = 0
+    assert cache.get("k0") == "x"
+    assert cache.get("k1") is None
+
+
+def test_key_covers_every_generation_parameter():
+    params = {"model": "m", "temperature": 0.7, "max_tokens": 300}
+    key = ResponseCache.make_key("Explain photosynthesis", [], params)
+    assert key == ResponseCache.make_key("explain  photosynthesis", [], dict(params))
+    for name, value in (("model", "n"), ("temperature", 0.2), ("max_tokens", 1200)):
+        assert key != ResponseCache.make_key("Explain photosynthesis", [], {**params, name: value})
+
+
+def test_answer_cut_short_by_a_small_budget_is_not_reused_for_a_larger_one():
+    from types import SimpleNamespace
+
+    from agent.model_router import ModelRouter
+    from agent.output_generator import OutputGenerator
+    from agent.singleflight import SingleFlight
+    from agent.task_planner import TaskPlanner
+
+    calls = []
+
+    class Backends:
+        def complete(self, priority, **request):
+            calls.append(request["max_tokens"])
+            message = SimpleNamespace(content=f"answer in {request['max_tokens']} tokens")
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+    generator = OutputGenerator(
+        cache=make_cache(), flights=SingleFlight(),
+        router=ModelRouter(tiers={"large": "big-model", "small": "small-model"}), backends=Backends()
+    )
+    plan = TaskPlanner().create_plan(intent="explain", topic="Explain photosynthesis", difficulty="beginner")
+    assert generator.generate_response({**plan, "max_tokens": 100}) == "answer in 100 tokens"
+    assert generator.generate_response({**plan, "max_tokens": 1000}) == "answer in 1000 tokens"
+    assert generator.generate_response({**plan, "max_tokens": 100}) == "answer in 100 tokens"
+    assert calls == [100, 1000]
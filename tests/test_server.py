@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+import server
+from server import HTTPError, StudyBuddyServer, read_request
+
+
+def parse(raw: bytes):
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        reader.feed_eof()
+        return await read_request(reader)
+    return asyncio.run(run())
+
+
+def test_reads_a_json_request():
+    raw = b'POST /sessions HTTP/1.1\r\nContent-Length: 21\r\n\r\n{"difficulty": "any"}'
+    assert parse(raw) == ("POST", "/sessions", {"content-length": "21"}, {"difficulty": "any"})
+
+
+def test_closed_connection_is_no_request():
+    assert parse(b"") is None
+
+
+@pytest.mark.parametrize("raw, status", [
+    (b"GARBAGE\r\n\r\n", 400),
+    (b"POST / HTTP/1.1\r\nContent-Length: ten\r\n\r\n", 400),
+    (b"POST / HTTP/1.1\r\nContent-Length: -1\r\n\r\n", 400),
+    (b"POST / HTTP/1.1\r\nContent-Length: \xb2\r\n\r\n", 400),
+    (b"POST / HTTP/1.1\r\nContent-Length: 4\r\n\r\n\xff\xfe{}", 400),
+    (b"POST / HTTP/1.1\r\nContent-Length: 5\r\n\r\nnope!", 400),
+    (b"POST / HTTP/1.1\r\nContent-Length: 2\r\n\r\n[]", 400),
+    (b"POST / HTTP/1.1\r\nContent-Length: 99999999\r\n\r\n", 413),
+])
+def test_bad_requests_are_http_errors(raw, status):
+    with pytest.raises(HTTPError) as error:
+        parse(raw)
+    assert error.value.status == status
+
+
+def test_waiting_for_a_reply_notices_a_disconnect(monkeypatch):
+    monkeypatch.setattr(server, "DISCONNECT_POLL_INTERVAL", 0.01)
+
+    async def run():
+        replies: asyncio.Queue = asyncio.Queue()
+        reader = asyncio.StreamReader()
+        reader.feed_eof()
+        return await StudyBuddyServer._reply_unless_disconnected(replies, reader)
+
+    assert asyncio.run(run()) is None
+
+
+def test_waiting_for_a_reply_returns_it(monkeypatch):
+    monkeypatch.setattr(server, "DISCONNECT_POLL_INTERVAL", 0.01)
+
+    async def run():
+        replies: asyncio.Queue = asyncio.Queue()
+        reader = asyncio.StreamReader()
+        asyncio.get_running_loop().call_later(0.05, replies.put_nowait, (1, "done", {"done": True}))
+        return await StudyBuddyServer._reply_unless_disconnected(replies, reader)
+
+    assert asyncio.run(run()) == (1, "done", {"done": True})
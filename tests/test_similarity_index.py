@@ -0,0 +1,64 @@
+import sqlite3
+
+import pytest
+
+from agent.similarity_index import SimilarityIndex, normalize_query
+
+
+def make_index(**kwargs) -> SimilarityIndex:
+    return SimilarityIndex(path=":memory:", **{"threshold": 0.9, "ttl": 60, **kwargs})
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("Explain photosynthesis", "How does photosynthesis work"),
+    ("Summarize World War 2", "Give me a summary of World War 2"),
+])
+def test_paraphrases_reuse_the_answer(stored, asked):
+    index = make_index()
+    index.add("explanation", "beginner", stored, "answer")
+    assert index.lookup("explanation", "beginner", asked) == "answer"
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("Explain debt", "Explain technical debt"),
+    ("What is 2+2", "What is 3+2"),
+    ("Explain the 3 pillars of Islam", "Explain the 5 pillars of Islam"),
+    ("Summarize World War 2", "Summarize World War 1"),
+    ("Explain why vaccines are safe", "Explain why vaccines are not safe"),
+    ("Explain plant cells", "Explain animal cells"),
+    ("Explain the causes of World War 1", "Explain the effects of World War 1"),
+])
+def test_different_questions_miss(stored, asked):
+    index = make_index()
+    index.add("explanation", "beginner", stored, "answer")
+    assert index.lookup("explanation", "beginner", asked) is None
+
+
+def test_normalized_query_keeps_numbers_qualifiers_and_negations():
+    assert normalize_query("What is 3+2?") == "3 2"
+    assert normalize_query("Explain why vaccines are not safe") == "why vaccines not safe"
+    assert normalize_query("Can you explain technical debt please") == "technical debt"
+
+
+def test_expired_answers_are_not_reused():
+    index = make_index(ttl=0)
+    index.add("explanation", "beginner", "Explain photosynthesis", "answer")
+    assert index.lookup("explanation", "beginner", "Explain photosynthesis") is None
+    assert index.stats()["expired"] == 1
+    assert index.stats()["entries"] == 0
+
+
+def test_answers_from_before_expiry_are_dropped(tmp_path):
+    path = str(tmp_path / "similar.sqlite3")
+    db = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE answers (id INTEGER PRIMARY KEY, task_type TEXT NOT NULL, difficulty TEXT NOT NULL, "
+        "topic TEXT NOT NULL, answer TEXT NOT NULL, vector BLOB NOT NULL, accessed_at REAL NOT NULL)"
+    )
+    db.execute("INSERT INTO answers VALUES (1, 'explanation', '', '+2', 'four', x'00', 0)")
+    db.commit()
+    db.close()
+    index = SimilarityIndex(path=path, threshold=0.9, ttl=60)
+    assert index.stats()["entries"] == 0
+    index.add("explanation", "", "What is 3+2", "five")
+    assert index.lookup("explanation", "", "What is 3+2") == "five"
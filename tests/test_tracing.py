@@ -0,0 +1,37 @@
+import urllib.request
+
+from agent.tracing import MetricsRegistry, merge_metrics, start_metrics_server
+
+
+def registry(queries: int) -> MetricsRegistry:
+    metrics = MetricsRegistry()
+    metrics.describe("queries_total", "counter", "Queries.")
+    metrics.describe("latency_seconds", "histogram", "Latency.")
+    metrics.inc("queries_total", queries, intent="explain")
+    metrics.observe("latency_seconds", 0.2)
+    return metrics
+
+
+def test_merged_samples_are_labelled_and_grouped_by_metric():
+    merged = merge_metrics([registry(1).render(), registry(2).render()]).splitlines()
+    assert merged.count("# TYPE queries_total counter") == 1
+    assert 'queries_total{worker="0",intent="explain"} 1' in merged
+    assert 'queries_total{worker="1",intent="explain"} 2' in merged
+    assert 'latency_seconds_count{worker="1"} 1' in merged
+    # Every sample of a metric follows its own header, before the next metric's
+    families = [line.split()[2] for line in merged if line.startswith("# TYPE")]
+    assert families == ["queries_total", "latency_seconds"]
+    first_histogram_line = merged.index("# HELP latency_seconds Latency.")
+    assert all(line.startswith("queries_total") or line.startswith("#") for line in merged[:first_histogram_line])
+
+
+def test_metrics_server_binds_loopback_by_default():
+    server = start_metrics_server(0, render=lambda: "up 1\n")
+    try:
+        host, port = server.server_address
+        assert host == "127.0.0.1"
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            assert response.read() == b"up 1\n"
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,38 @@
+import agent.traffic as traffic
+from agent.traffic import TrafficRecorder, read_traffic, set_traffic_salt
+from config import Config
+
+
+def test_recorders_sharing_a_salt_agree_on_topic_ids(tmp_path):
+    salt = b"s" * 16
+    first = TrafficRecorder(str(tmp_path / "traffic.jsonl"), salt)
+    second = TrafficRecorder(str(tmp_path / "traffic.jsonl"), salt)
+    assert first.topic_id("photosynthesis") == second.topic_id("photosynthesis")
+    assert first.topic_id("photosynthesis") != TrafficRecorder(str(tmp_path / "other.jsonl")).topic_id("photosynthesis")
+    assert first.topic_id(None) is None
+
+
+def test_process_wide_recorder_uses_the_shared_salt(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "TRAFFIC_RECORD_PATH", str(tmp_path / "traffic.jsonl"))
+    monkeypatch.setattr(traffic, "_shared_recorder", None)
+    monkeypatch.setattr(traffic, "_shared_salt", None)
+    salt = b"k" * 16
+    set_traffic_salt(salt)
+    recorder = traffic.get_traffic_recorder()
+    assert recorder.topic_id("cell division") == TrafficRecorder("unused", salt).topic_id("cell division")
+
+
+def test_records_read_back(tmp_path):
+    path = str(tmp_path / "traffic.jsonl")
+    recorder = TrafficRecorder(path)
+    trace = {
+        "started_at": 1718000000.123,
+        "attributes": {"intent": "explain", "stream": True, "answer_source": "llm"},
+        "timings": {"total": 12.5},
+        "usage": {"calls": [{"stage": "output_generator", "prompt_tokens": 10, "completion_tokens": 20}]}
+    }
+    recorder.record(trace, "3f2a9c01", "Explain osmosis", topic="osmosis", response="Osmosis is ...")
+    recorder.close()
+    [entry] = list(read_traffic(path))
+    assert entry["i"] == "explain" and entry["st"] == 1 and entry["k"] == recorder.topic_id("osmosis")
+    assert entry["c"] == [["output_generator", 10, 20, None]]
@@ -0,0 +1,36 @@
+import agent.traffic as traffic
+import ui
+from agent.traffic import read_traffic
+from config import Config
+
+
+class FakeSession(dict):
+    """Stand-in for `st.session_state`: a mapping with attribute access."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+def test_queries_of_one_browser_session_record_one_session_id(tmp_path, monkeypatch):
+    path = str(tmp_path / "traffic.jsonl")
+    monkeypatch.setattr(Config, "TRAFFIC_RECORD_PATH", path)
+    monkeypatch.setattr(Config, "PARSE_MODE", "skip")
+    monkeypatch.setattr(traffic, "_shared_recorder", None)
+    session, other = FakeSession(), FakeSession()
+    ui.init_session_state(session)
+    ui.init_session_state(other)
+
+    ui.process_query("What have I studied so far?", session)
+    ui.process_query("What have I studied so far?", session)
+    ui.process_query("What have I studied so far?", other)
+    traffic.get_traffic_recorder().close()
+
+    first, second, third = (record["s"] for record in read_traffic(path))
+    assert first == second == session.traffic_session_id
+    assert third == other.traffic_session_id != first
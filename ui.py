@@ -1,73 +1,262 @@
 import streamlit as st
 import json
-from agent import InputUnderstanding, StateTracker, TaskPlanner, OutputGenerator
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from agent import (
+    CancelToken, StateTracker, TaskPlanner, Prefetcher, QueryPipeline, QueryStream, QuizEngine, get_backend_pool,
+    get_input_understanding, get_model_router, get_output_generator, get_question_bank, get_response_cache,
+    get_similarity_index, get_single_flight, get_task_planner, pool_stats, prefetch_stats
+)
+from agent.quiz import LETTERS
+from agent.rate_limiter import rate_limiter_stats
+from agent.tracing import get_tracer
+from agent.traffic import new_session_id
+from config import Config
+
+
+@st.cache_resource
+def shared_input_handler():
+    """Input understanding (over the pooled Groq client) shared by every browser session in this process."""
+    return get_input_understanding()
+
+
+@st.cache_resource
+def shared_planner():
+    """Task planner shared by every browser session in this process."""
+    return get_task_planner()
+
+
+@st.cache_resource
+def shared_generator():
+    """Output generator shared by every browser session in this process; the conversation comes with each call."""
+    return get_output_generator()
+
+
+@st.cache_resource
+def shared_backend_pool():
+    """Upstream backends (with their health and hedging state) shared by every browser session in this process."""
+    return get_backend_pool()
+
+
+@st.cache_resource
+def shared_response_cache():
+    """Response cache shared by every browser session in this process."""
+    return get_response_cache()
+
+
+@st.cache_resource
+def shared_similarity_index():
+    """Near-duplicate answer index shared by every browser session in this process."""
+    return get_similarity_index()
 
 
 # Initialize session state
-def init_session_state():
-    if "agent_state" not in st.session_state:
-        st.session_state.agent_state = StateTracker()
-    if "input_handler" not in st.session_state:
-        st.session_state.input_handler = InputUnderstanding()
-    if "planner" not in st.session_state:
-        st.session_state.planner = TaskPlanner()
-    if "generator" not in st.session_state:
-        st.session_state.generator = OutputGenerator()
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
-    if "last_debug_info" not in st.session_state:
-        st.session_state.last_debug_info = {}
-
-
-def process_query(user_input: str) -> dict:
+def init_session_state(session=None):
+    """Create the agent components for a browser session.
+    
+    Only the conversation state, quiz and prefetcher belong to the session;
+    the stateless components are built once per process and shared.
+    `session` defaults to `st.session_state`; benchmarks pass their own mapping.
+    """
+    session = st.session_state if session is None else session
+    if "agent_state" not in session:
+        session.agent_state = StateTracker()
+    if "traffic_session_id" not in session:
+        # Every query's pipeline records under this browser session's id
+        session.traffic_session_id = new_session_id()
+    if "input_handler" not in session:
+        session.input_handler = shared_input_handler()
+    if "planner" not in session:
+        session.planner = shared_planner()
+    if "generator" not in session:
+        session.generator = shared_generator()
+    if "quiz" not in session:
+        session.quiz = QuizEngine(session.generator) if Config.QUIZ_ENABLED else None
+    if "prefetcher" not in session:
+        session.prefetcher = (
+            Prefetcher(session.planner, session.generator, session.agent_state, quiz=session.quiz)
+            if Config.PREFETCH_ENABLED else None
+        )
+    if "chat_older_pages" not in session:
+        session.chat_older_pages = 1
+    if "chat_page_cache" not in session:
+        session.chat_page_cache = {}
+    if "last_debug_info" not in session:
+        session.last_debug_info = {}
+
+
+def build_pipeline(session=None) -> QueryPipeline:
+    """Build a query pipeline over this session's agent components."""
+    session = st.session_state if session is None else session
+    return QueryPipeline(
+        session.input_handler,
+        session.agent_state,
+        session.planner,
+        session.generator,
+        prefetcher=session.prefetcher,
+        quiz=session.quiz,
+        session_id=session.traffic_session_id
+    )
+
+
+def render_turns(turns) -> List[Dict]:
+    """Chat messages for a run of history turns."""
+    messages = []
+    for turn in turns:
+        messages.append({"role": "user", "content": turn.user_input})
+        messages.append({"role": "assistant", "content": turn.response})
+    return messages
+
+
+def chat_window(session=None) -> Tuple[List[Dict], bool]:
+    """Return the chat messages to show and whether older ones are hidden.
+    
+    The session history is the only copy of the conversation. Pages of
+    `CHAT_PAGE_TURNS` turns count from the start of the session, so every page
+    but the newest is complete and never changes; those are read (from the
+    spill file, for long sessions) once and kept in `chat_page_cache`. The
+    newest page plus `chat_older_pages` before it are shown.
+    """
+    session = st.session_state if session is None else session
+    state = session.agent_state
+    size = Config.CHAT_PAGE_TURNS
+    if size <= 0:
+        return render_turns(state.iter_history()), False
+    newest = max(0, state.interaction_count - 1) // size
+    first = max(0, newest - session.chat_older_pages)
+    messages = []
+    for page in range(first, newest):
+        if page not in session.chat_page_cache:
+            session.chat_page_cache[page] = render_turns(state.history_slice(page * size, (page + 1) * size))
+        messages.extend(session.chat_page_cache[page])
+    messages.extend(render_turns(state.history_slice(newest * size)))
+    return messages, first > 0
+
+
+def show_older_messages():
+    st.session_state.chat_older_pages += 1
+
+
+@st.fragment
+def chat_history():
+    """Render the chat window; paging in older messages reruns only this fragment."""
+    messages, more = chat_window()
+    if more:
+        st.button("⬆️ Show older messages", use_container_width=True, on_click=show_older_messages)
+    for message in messages:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+
+def quiz_form(session=None) -> Optional[str]:
+    """Answer widgets for the unanswered questions of the active quiz.
+    
+    Returns the answers as the numbered reply the pipeline grades, once submitted.
+    """
+    session = st.session_state if session is None else session
+    quiz = session.quiz.active if session.quiz is not None else None
+    if quiz is None or quiz.finished:
+        return None
+    with st.form(f"quiz-{quiz.id}"):
+        st.markdown(f"**📝 Quiz on {quiz.topic}**")
+        replies = {}
+        for number, question in enumerate(quiz.questions, 1):
+            if number in quiz.results:
+                continue
+            label = f"{number}. {question.text}"
+            if question.options:
+                choices = [f"{LETTERS[i]}) {option}" for i, option in enumerate(question.options)]
+                choice = st.radio(label, choices, index=None, key=f"quiz-{quiz.id}-{number}")
+                replies[number] = choice.split(")", 1)[0] if choice else ""
+            else:
+                replies[number] = st.text_input(label, key=f"quiz-{quiz.id}-{number}")
+        if not st.form_submit_button("Check answers"):
+            return None
+    answers = "\n".join(f"{number}: {reply.strip()}" for number, reply in replies.items() if reply.strip())
+    # The prefix marks the reply as answers however few questions it covers
+    return f"Answers:\n{answers}" if answers else None
+
+
+def process_query(user_input: str, session=None) -> dict:
     """Process query and return all intermediate steps."""
+    return build_result(user_input, build_pipeline(session).run(user_input), session)
+
+
+def stream_query(user_input: str, session=None, token: Optional[CancelToken] = None) -> QueryStream:
+    """Process query, yielding the response as it is generated.
+    
+    Pass the exhausted stream's `result` to `build_result` for the intermediate steps.
+    """
+    return build_pipeline(session).stream(user_input, token)
+
+
+def waiting_status(placeholder) -> Callable[[], None]:
+    """Idle callback for a query's `CancelToken`: show how long the model has kept us waiting.
+    
+    Every update is also a point where Streamlit can stop the script, so a
+    click on Stop takes effect while nothing is arriving.
+    """
+    started = time.monotonic()
+    
+    def show():
+        placeholder.caption(f"⏳ Waiting for the model… {time.monotonic() - started:.0f}s")
+    return show
+
+
+def build_result(user_input: str, result: dict, session=None) -> dict:
+    """Collect the intermediate steps of a pipeline run for the pipeline viewer."""
+    session = st.session_state if session is None else session
+    parsed = result["parsed"]
+    plan = result["plan"]
     debug_info = {}
     
     # Step 1: Input Understanding
-    parsed = st.session_state.input_handler.parse_input(user_input)
-    intent = st.session_state.input_handler.classify_intent(user_input)
     debug_info["input_understanding"] = {
         "raw_input": user_input,
-        "classified_intent": intent,
-        "parsed_analysis": parsed.get("parsed", "")
+        "classified_intent": result["intent"],
+        "parsed_analysis": parsed.get("parsed", "") if parsed else f"({result['parse_mode']})",
+        "parse_source": parsed.get("source", "N/A") if parsed else "pending"
     }
     
     # Step 2: State Tracking
-    st.session_state.agent_state.set_topic(user_input)
     debug_info["state_tracker"] = {
-        "current_topic": st.session_state.agent_state.current_topic,
-        "difficulty_level": st.session_state.agent_state.difficulty_level,
-        "topics_covered": st.session_state.agent_state.topics_covered.copy(),
-        "interaction_count": len(st.session_state.agent_state.conversation_history)
+        "current_topic": session.agent_state.current_topic,
+        "difficulty_level": session.agent_state.difficulty_level,
+        "topics_covered": session.agent_state.topics_covered.copy(),
+        "interaction_count": session.agent_state.interaction_count
     }
     
     # Step 3: Task Planning
-    plan = st.session_state.planner.create_plan(
-        intent=intent,
-        topic=user_input,
-        difficulty=st.session_state.agent_state.difficulty_level
-    )
     debug_info["task_planner"] = {
         "task_type": plan["task_type"],
+        "model_tier": plan["model_tier"],
+        "max_tokens": plan["max_tokens"],
+        "latency_target": plan["latency_target"],
         "steps": plan["steps"],
         "prompt_template": plan["prompt_template"]
     }
     
     # Step 4: Output Generation
-    context = st.session_state.agent_state.get_context()
-    response = st.session_state.generator.generate_response(plan, context)
-    formatted = st.session_state.generator.format_response(response, plan["task_type"])
     debug_info["output_generator"] = {
-        "context_used": len(context),
-        "response_length": len(response)
+        "context_used": result["prompt"]["turns_sent"],
+        "response_length": len(result["raw_response"]),
+        "answer_source": result["answer_source"],
+        "truncated": result["truncated"],
+        "model": result["model"],
+        "prompt": result["prompt"]
     }
     
-    # Step 5: Update State
-    st.session_state.agent_state.update_state(user_input, parsed, response)
+    debug_info["timings"] = {
+        "parse_mode": result["parse_mode"],
+        "trace_id": result["trace_id"],
+        "stages": result["timings"]
+    }
+    
+    debug_info["usage"] = result["usage"]
     
     return {
-        "response": formatted,
-        "raw_response": response,
+        "response": result["response"],
+        "raw_response": result["raw_response"],
         "debug_info": debug_info
     }
 
@@ -105,22 +294,32 @@ def main():
         
         # Session Info
         st.header("📊 Session Info")
-        session_info = st.session_state.agent_state.get_session_summary()
-        st.metric("Total Interactions", session_info["total_interactions"])
-        st.metric("Topics Covered", len(session_info["topics_covered"]))
-        st.text(f"Duration: {str(session_info['session_duration']).split('.')[0]}")
+        state = st.session_state.agent_state
+        st.metric("Total Interactions", state.interaction_count)
+        st.metric("Topics Covered", len(state.topics))
+        st.text(f"Duration: {str(state.get_session_summary()['session_duration']).split('.')[0]}")
         
-        if session_info["topics_covered"]:
+        # Straight from the topic index, however long the session
+        if len(state.topics):
             with st.expander("📚 Topics Covered"):
-                for topic in session_info["topics_covered"][-5:]:
-                    st.markdown(f"• {topic[:50]}...")
+                for entry in state.topics.recent(5):
+                    label = entry.label if len(entry.label) <= 50 else f"{entry.label[:50]}..."
+                    st.markdown(f"• {label} ({len(entry.turns)})")
+                search = st.text_input("🔎 What have I studied on...", key="topic_search")
+                if search:
+                    st.markdown(state.study_report(search))
         
         st.divider()
         
         # Reset button
         if st.button("🔄 Reset Session", use_container_width=True):
+            if st.session_state.prefetcher is not None:
+                st.session_state.prefetcher.cancel_all()
             st.session_state.agent_state.reset()
-            st.session_state.messages = []
+            if st.session_state.quiz is not None:
+                st.session_state.quiz.active = None
+            st.session_state.chat_older_pages = 1
+            st.session_state.chat_page_cache = {}
             st.session_state.last_debug_info = {}
             st.rerun()
     
@@ -134,24 +333,29 @@ def main():
         chat_container = st.container(height=400)
         
         with chat_container:
-            for message in st.session_state.messages:
-                with st.chat_message(message["role"]):
-                    st.markdown(message["content"])
+            chat_history()
+        
+        # Answers submitted through the quiz form go through the pipeline like typed ones
+        quiz_reply = quiz_form()
         
         # Chat input
-        if prompt := st.chat_input("Ask me anything about your studies..."):
-            # Add user message
-            st.session_state.messages.append({"role": "user", "content": prompt})
-            
-            # Process and get response
-            with st.spinner("🤔 Thinking..."):
-                result = process_query(prompt)
-            
-            # Add assistant message
-            st.session_state.messages.append({
-                "role": "assistant",
-                "content": result["raw_response"]
-            })
+        if prompt := (st.chat_input("Ask me anything about your studies...") or quiz_reply):
+            # Process and stream the response; both messages reach the history once it finishes
+            with chat_container:
+                with st.chat_message("user"):
+                    st.markdown(prompt)
+                with st.chat_message("assistant"):
+                    # Clicking Stop reruns the script, which interrupts the stream; the partial answer is kept
+                    st.button("⏹️ Stop", key="stop_query")
+                    status = st.empty()
+                    stream = stream_query(prompt, token=CancelToken.for_query(on_idle=waiting_status(status)))
+                    deltas = iter(stream)
+                    try:
+                        st.write_stream(deltas)
+                    finally:
+                        deltas.close()
+                    status.empty()
+            result = build_result(prompt, stream.result)
             
             # Store debug info
             st.session_state.last_debug_info = result["debug_info"]
@@ -175,7 +379,8 @@ def main():
                 st.markdown(f"{intent_colors.get(intent, '⚪')} **{intent.upper()}**")
                 
                 with st.container():
-                    st.markdown("**Parsed Analysis:**")
+                    source = debug.get("input_understanding", {}).get("parse_source", "N/A")
+                    st.markdown(f"**Parsed Analysis** ({source}):")
                     try:
                         parsed = debug.get("input_understanding", {}).get("parsed_analysis", "")
                         st.code(parsed, language="json")
@@ -202,6 +407,157 @@ def main():
                 output = debug.get("output_generator", {})
                 st.markdown(f"**Context Messages:** {output.get('context_used', 0)}")
                 st.markdown(f"**Response Length:** {output.get('response_length', 0)} chars")
+                st.markdown(f"**Answered From:** {output.get('answer_source') or 'N/A'}")
+                if output.get("truncated"):
+                    st.markdown(f"**Cut Short:** {output['truncated']}")
+                prompt_report = output.get("prompt", {})
+                if prompt_report:
+                    st.markdown(
+                        f"**Prompt Tokens:** ~{prompt_report['prompt_tokens']} / {prompt_report['budget']} "
+                        f"(summary {prompt_report['summary_tokens']}, context {prompt_report['context_tokens']})"
+                    )
+            
+            # Timings
+            with st.expander("⏱️ Timings", expanded=True):
+                timings = debug.get("timings", {})
+                st.markdown(f"**Parse Mode:** `{timings.get('parse_mode', 'N/A')}`")
+                st.markdown(f"**Trace:** `{timings.get('trace_id', 'N/A')}`")
+                for stage, ms in timings.get("stages", {}).items():
+                    st.markdown(f"**{stage}:** {ms:.0f} ms")
+            
+            # Token Usage
+            with st.expander("🪙 Token Usage", expanded=True):
+                usage = debug.get("usage", {})
+                prompt_col, completion_col, queue_col = st.columns(3)
+                prompt_col.metric("Prompt", usage.get("prompt_tokens", 0))
+                completion_col.metric("Completion", usage.get("completion_tokens", 0))
+                queue_col.metric("Queued", f"{usage.get('queue_ms', 0):.0f} ms")
+                for call in usage.get("calls", []):
+                    st.markdown(
+                        f"**{call['stage']}:** {call['prompt_tokens'] or '?'} + {call['completion_tokens'] or '?'} tokens, "
+                        f"queued {call['queue_ms']:.0f} ms, {call['retries']} retries"
+                    )
+                if not usage.get("upstream_calls"):
+                    st.markdown("No Groq calls (answered locally or from cache)")
+            
+            # Response Cache
+            cache = shared_response_cache()
+            if cache is not None:
+                with st.expander("🗄️ Response Cache", expanded=False):
+                    stats = cache.stats()
+                    hit_col, miss_col, evict_col = st.columns(3)
+                    hit_col.metric("Hits", stats["memory_hits"] + stats["disk_hits"])
+                    miss_col.metric("Misses", stats["misses"])
+                    evict_col.metric("Evictions", stats["memory_evictions"] + stats["disk_evictions"])
+                    st.markdown(f"**Hit Rate:** {stats['hit_rate']:.0%}")
+                    st.markdown(f"**Memory:** {stats['memory_entries']} entries, {stats['memory_bytes']} bytes")
+                    st.markdown(f"**Disk:** {stats['disk_entries']} entries")
+                    st.markdown(f"**Expired:** {stats['expired']}")
+            
+            # Similar Answers
+            index = shared_similarity_index()
+            if index is not None:
+                with st.expander("🧭 Similar Answers", expanded=False):
+                    stats = index.stats()
+                    hit_col, miss_col, entry_col = st.columns(3)
+                    hit_col.metric("Reused", stats["hits"])
+                    miss_col.metric("Misses", stats["misses"])
+                    entry_col.metric("Answers", stats["entries"])
+                    st.markdown(f"**Hit Rate:** {stats['hit_rate']:.0%}")
+                    st.markdown(f"**Avg Lookup:** {stats['lookup_us_avg']:.0f} µs")
+                    st.markdown(f"**Evictions:** {stats['evictions']}")
+            
+            # Prefetch
+            if Config.PREFETCH_ENABLED:
+                with st.expander("🔮 Prefetch", expanded=False):
+                    stats = prefetch_stats()
+                    served_col, scheduled_col, dropped_col = st.columns(3)
+                    served_col.metric("Served", stats["served"])
+                    scheduled_col.metric("Scheduled", stats["scheduled"])
+                    dropped_col.metric("Dropped", stats["cancelled"] + stats["expired"])
+                    st.markdown(f"**Hit Rate:** {stats['hit_rate']:.0%}")
+                    st.markdown(f"**Tokens Used:** {stats['used_tokens']}  |  **Wasted:** {stats['wasted_tokens']}")
+                    st.markdown(
+                        f"**Wasted Share:** {stats['wasted_share']:.0%}  |  **Failed:** {stats['failed']}  |  "
+                        f"**Skipped (busy):** {stats['skipped_busy']}"
+                    )
+                    if Config.QUIZ_ENABLED:
+                        st.markdown(
+                            f"**Quizzes Prefetched:** {stats['scheduled_quizzes']} "
+                            f"({stats['quiz_questions']} questions, {stats['quiz_tokens']} tokens)"
+                        )
+            
+            # Quiz Bank
+            if Config.QUIZ_ENABLED:
+                with st.expander("📝 Quiz Bank", expanded=False):
+                    stats = get_question_bank().stats()
+                    hit_col, question_col, topic_col = st.columns(3)
+                    hit_col.metric("Hit Rate", f"{stats['hit_rate']:.0%}")
+                    question_col.metric("Questions", stats["questions"])
+                    topic_col.metric("Topics", stats["topics"])
+                    st.markdown(f"**Served from Bank:** {stats['served']}  |  **Generated:** {stats['generated']}")
+                    st.markdown(f"**Partial Hits:** {stats['partial_hits']}  |  **Misses:** {stats['misses']}")
+            
+            # Connection Pool
+            with st.expander("🔌 Connection Pool", expanded=False):
+                pool = pool_stats()
+                active_col, idle_col, flight_col = st.columns(3)
+                active_col.metric("Active", pool["active_connections"])
+                idle_col.metric("Idle", pool["idle_connections"])
+                flight_col.metric("In Flight", pool["in_flight"])
+                st.markdown(f"**Requests:** {pool['requests']}")
+                st.markdown(f"**Max Connections:** {pool['max_connections']}")
+            
+            # Request Coalescing
+            with st.expander("🔁 Request Coalescing", expanded=False):
+                flights = get_single_flight().stats()
+                upstream_col, saved_col = st.columns(2)
+                upstream_col.metric("Upstream Calls", flights["upstream_calls"] + flights["upstream_streams"])
+                saved_col.metric("Calls Saved", flights["saved_calls"])
+                st.markdown(f"**In Flight:** {flights['in_flight']}")
+            
+            # Model Routing
+            with st.expander("🛣️ Model Routing", expanded=False):
+                routing = get_model_router().stats()
+                for tier, health in routing["tiers"].items():
+                    status = "✅" if health["available"] else "⏸️ cooling down"
+                    st.markdown(f"**{tier}** `{health['model']}` {status}")
+                if routing["routes"]:
+                    st.dataframe(routing["routes"], hide_index=True, use_container_width=True)
+            
+            # Backends
+            with st.expander("🛰️ Backends", expanded=False):
+                backends = shared_backend_pool().stats()
+                hedge_col, won_col, delay_col = st.columns(3)
+                hedge_col.metric("Hedged", f"{backends['hedge_rate']:.0%}")
+                won_col.metric("Hedges Won", backends["hedges_won"])
+                delay_col.metric("Hedge After", f"{backends['hedge_delay_ms']:.0f} ms")
+                st.markdown(f"**Failovers:** {backends['failovers']}")
+                st.dataframe(backends["backends"], hide_index=True, use_container_width=True)
+            
+            # Rate Limiter
+            with st.expander("🚦 Rate Limiter", expanded=False):
+                limits = rate_limiter_stats()
+                queue_col, wait_col, retry_col = st.columns(3)
+                queue_col.metric("Queued", limits["queue_depth"])
+                wait_col.metric("Avg Wait", f"{limits['wait_ms_avg']:.0f} ms")
+                retry_col.metric("Retries", limits["retries"])
+                if "requests_available" in limits:
+                    st.markdown(f"**Requests:** {limits['requests_available']} / {limits['requests_per_minute']} per min")
+                if "tokens_available" in limits:
+                    st.markdown(f"**Tokens:** {limits['tokens_available']} / {limits['tokens_per_minute']} per min")
+                st.markdown(f"**Throttled by Server:** {limits['server_throttles']}  |  **Timeouts:** {limits['timeouts']}")
+                if len(limits["accounts"]) > 1:
+                    st.dataframe(
+                        [{"account": account, **stats} for account, stats in limits["accounts"].items()],
+                        hide_index=True, use_container_width=True
+                    )
+            
+            # Metrics export
+            with st.expander("📈 Metrics", expanded=False):
+                metrics = get_tracer().render_metrics()
+                st.download_button("Download metrics", metrics, file_name="metrics.txt", mime="text/plain")
+                st.code(metrics, language="text")
         else:
             st.info("💡 Send a message to see the agent pipeline in action!")
     
@@ -210,14 +566,16 @@ def main():
     st.subheader("⚡ Quick Actions")
     
     quick_cols = st.columns(6)
-    quick_prompts = [
-        ("📚 Explain", "Explain the concept of"),
-        ("📝 Summarize", "Summarize the topic of"),
-        ("❓ Quiz Me", "Quiz me on"),
-        ("📖 Define", "Define"),
-        ("⚖️ Compare", "Compare and contrast"),
-        ("✏️ Practice", "Give me practice problems for")
+    quick_labels = [
+        ("📚 Explain", "explain"),
+        ("📝 Summarize", "summarize"),
+        ("❓ Quiz Me", "quiz"),
+        ("📖 Define", "define"),
+        ("⚖️ Compare", "compare"),
+        ("✏️ Practice", "practice")
     ]
+    # Same phrasing the prefetcher speculates with, so a quick action can hit a prefetch
+    quick_prompts = [(label, TaskPlanner.FOLLOW_UP_PROMPTS[intent]) for label, intent in quick_labels]
     
     for col, (label, prefix) in zip(quick_cols, quick_prompts):
         with col: